@@ -0,0 +1,108 @@
+# alert_system/alert_event_writer.py
+# 预警事件写缓冲: 触发时只把事件追加到内存列表，由后台协程在积累到 batch_size 条或每隔 flush_interval 秒时
+# 换出整个列表，在线程池中用一个事务批量写入 alert_events 表，数据库写入不占用行情处理路径。
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+from app_models import AlertEvent
+from db_manager import add_alert_events
+from config import ALERT_EVENT_BATCH_SIZE, ALERT_EVENT_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class AlertEventWriter:
+    """
+    预警事件的批量写入器。writer(events) 返回写入的条数，写入失败的批次记录错误后丢弃 (不阻塞后续事件)。
+    未在事件循环中运行时 (脚本等) 缓冲区满时直接同步写入，stop 或 flush 写入剩余事件。
+    """
+
+    def __init__(self,
+                 batch_size: int = ALERT_EVENT_BATCH_SIZE,
+                 flush_interval: float = ALERT_EVENT_FLUSH_INTERVAL,
+                 writer: Callable[[List[AlertEvent]], int] = add_alert_events):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.writer = writer
+        self._buffer: List[AlertEvent] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 计数器
+        self.recorded = 0
+        self.written = 0
+        self.failed = 0  # 写入失败被丢弃的事件数
+        self.batches = 0
+
+    def record(self, event: AlertEvent):
+        self._buffer.append(event)
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            if self._task is not None:
+                self._wakeup.set()
+            else:
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    self.flush()
+
+    def _take(self) -> List[AlertEvent]:
+        batch, self._buffer = self._buffer, []
+        return batch
+
+    def _write(self, batch: List[AlertEvent]):
+        try:
+            written = self.writer(batch)
+        except Exception as e:
+            logger.error(f"写入预警事件时出错 ({len(batch)} 条): {e}")
+            written = 0
+        self.batches += 1
+        self.written += written
+        self.failed += len(batch) - written
+
+    def flush(self):
+        """同步写入缓冲区中的全部事件。"""
+        batch = self._take()
+        if batch:
+            self._write(batch)
+
+    async def _flush_async(self):
+        batch = self._take()
+        if batch:
+            await asyncio.to_thread(self._write, batch)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._flush_async()
+            except Exception as e:
+                logger.error(f"预警事件写入协程出错: {e}", exc_info=True)
+
+    def start(self):
+        """启动后台写入协程 (需在事件循环中调用，可重复调用)。"""
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """停止后台写入协程并写入剩余事件。"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush_async()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
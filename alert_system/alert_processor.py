@@ -1,43 +1,153 @@
 # alert_system/alert_processor.py
+import asyncio
 import logging
 import time  # 确保导入 time
-from typing import List, Dict, Optional, Any  # 确保导入 Any
-from app_models import AlertRule, TradingPair
+from typing import List, Dict, Optional, Any, Callable  # 确保导入 Any
+from app_models import AlertRule, TradingPair, AlertEvent
 from db_manager import get_alert_rules_for_pair, get_trading_pair_by_id  # 用于获取规则和交易对信息
 from alert_system.rules.price_alert_evaluator import PriceAlertEvaluator
-# 未来可以扩展到K线评估器: from alert_system.rules.kline_alert_evaluator import KlineAlertEvaluator
-from alert_system.notification_sender import send_dingtalk_notification
+from alert_system.rules.threshold_index import PriceThresholdIndex
+from alert_system.rules.compiled_rule import CompiledPriceRule
+from alert_system.rules.batch_price_evaluator import BatchPriceEvaluator, NUMPY_AVAILABLE, np
+from alert_system.rules.kline_alert_evaluator import KlineAlertEvaluator, describe_kline_rule
+from alert_system.rules.indicator_alert_evaluator import (
+    AtrAlertEvaluator, BollingerAlertEvaluator, IndicatorAlertEvaluator, MovingAverageCrossEvaluator,
+    RsiAlertEvaluator, describe_indicator_rule)
+from alert_system.rules.pct_change_alert_evaluator import PctChangeAlertEvaluator, describe_pct_change_rule
+from alert_system.rules.expression_alert_evaluator import ExpressionAlertEvaluator
+from alert_system.rules.expression import ExpressionCompiler
+from alert_system.kline_engine import KlineEngine
+from alert_system.price_window import PriceWindowStore
+from alert_system.indicators import IndicatorRegistry
+from alert_system.notification_dispatcher import NotificationDispatcher
+from alert_system.notification_router import NotificationRouter
+from alert_system.alert_event_writer import AlertEventWriter
+from config import ALERT_BATCH_INTERVAL, ALERT_EVENT_HISTORY
 
 logger = logging.getLogger(__name__)
 
+# 通知标题 (按规则类型)
+ALERT_TITLES = {
+    "price_alert": "价格预警",
+    "kline_pattern": "K线预警",
+    "ma_cross": "均线交叉预警",
+    "rsi": "RSI预警",
+    "bollinger": "布林带预警",
+    "atr": "ATR预警",
+    "pct_change": "涨跌幅预警",
+    "expression": "组合条件预警",
+}
+
 
 class AlertProcessor:
-    def __init__(self):
+    def __init__(self, notifier: Optional[Callable[..., Any]] = None,
+                 batch_interval: Optional[float] = ALERT_BATCH_INTERVAL,
+                 record_events: bool = ALERT_EVENT_HISTORY):
+        # notifier(title=, message=, inst_id=, rule_name=[, sinks=])，默认按 config.NOTIFY_SINKS 路由到各通知渠道
+        # (只入队，由各渠道的后台协程发送)；压测等场景可替换
+        self.notifier = notifier if notifier is not None else NotificationRouter.from_config()
+        # 触发的预警写入 alert_events 表 (先进入写缓冲区，由后台协程批量写入)
+        self.event_writer = AlertEventWriter() if record_events else None
+        self.kline_engine = KlineEngine()  # 由价格合成多周期K线，只为有规则使用的 instId/周期维护
+        self.price_windows = PriceWindowStore()  # 各 instId 的滑动时间窗口 (涨跌幅等)
+        self.indicator_registry = IndicatorRegistry(self.kline_engine)  # 相同 instId/周期/指标/参数的规则共用一个指标实例
         self.evaluators = {
             "price_alert": PriceAlertEvaluator(),
-            # "kline_pattern": KlineAlertEvaluator(), # 未来扩展
+            "kline_pattern": KlineAlertEvaluator(self.kline_engine),
+            "pct_change": PctChangeAlertEvaluator(self.price_windows),
+            "expression": ExpressionAlertEvaluator(ExpressionCompiler(self.price_windows, self.indicator_registry)),
         }
+        for evaluator_class in (MovingAverageCrossEvaluator, RsiAlertEvaluator, BollingerAlertEvaluator,
+                                AtrAlertEvaluator):
+            self.evaluators[evaluator_class.rule_type] = evaluator_class(self.indicator_registry)
         self._active_rules_by_pair_id: Dict[int, List[AlertRule]] = {}
         self._instId_map: Dict[int, str] = {}
+        # 每个交易对的价格阈值索引，规则缓存变化时丢弃，下次收到价格时重建
+        self._threshold_indexes: Dict[int, PriceThresholdIndex] = {}
+        # 与规则缓存位置一一对应的编译后价格预警 (其他规则为 None)，与阈值索引一起重建
+        self._compiled_rules: Dict[int, List[Optional[CompiledPriceRule]]] = {}
+        # 批量评估模式: 价格只记录为各交易对的最新值，由后台任务每 batch_interval 秒统一向量化评估
+        if batch_interval and not NUMPY_AVAILABLE:
+            logger.warning("未安装 numpy，批量评估模式不可用，改为逐价格评估。")
+            batch_interval = None
+        self.batch_interval = batch_interval
+        self._batch_prices: Dict[int, float] = {}
+        self._batch_state: Optional[tuple] = None  # BatchPriceEvaluator.from_rules 的结果，规则缓存变化时重建
+        self._batch_task: Optional[asyncio.Task] = None
+        # 从运行时快照恢复、尚未加载的规则状态: 规则ID -> (最后触发时间, 是否已越过阈值)，规则加载时应用
+        self._restored_rule_state: Dict[int, tuple] = {}
+
+    def _invalidate_pair(self, pair_id: int):
+        """交易对的规则缓存变化后丢弃相应的索引，下次评估时重建。"""
+        self._threshold_indexes.pop(pair_id, None)
+        self._compiled_rules.pop(pair_id, None)
+        self._batch_state = None
+
+    def _replace_rules(self, pair_id: int, inst_id: str, rules: List[AlertRule]):
+        """替换交易对的规则缓存，并通知评估器规则的加载与移除 (先加载新规则，以免共用的行情状态被提前释放)。"""
+        old_rules = self._active_rules_by_pair_id.get(pair_id, [])
+        old_inst_id = self._instId_map.get(pair_id, inst_id)
+        if self._restored_rule_state:
+            self._apply_restored_state(rules)
+        for rule in rules:
+            evaluator = self.evaluators.get(rule.rule_type)
+            if evaluator:
+                evaluator.on_rule_loaded(rule, inst_id)
+        kept = {id(rule) for rule in rules}
+        for rule in old_rules:
+            evaluator = self.evaluators.get(rule.rule_type)
+            if evaluator and id(rule) not in kept:
+                evaluator.on_rule_removed(rule, old_inst_id)
+        self._active_rules_by_pair_id[pair_id] = rules
+        self._instId_map[pair_id] = inst_id
+        self._invalidate_pair(pair_id)
+
+    def _apply_restored_state(self, rules: List[AlertRule]):
+        for rule in rules:
+            state = self._restored_rule_state.pop(rule.id, None)
+            if state is not None:
+                rule.last_triggered_timestamp, rule.is_threshold_breached = state
+
+    def export_rule_state(self) -> Dict[int, tuple]:
+        """所有缓存规则中非默认的内存状态: 规则ID -> (最后触发时间, 是否已越过阈值)，包括尚未加载的已恢复状态。"""
+        state = dict(self._restored_rule_state)
+        for rules in self._active_rules_by_pair_id.values():
+            for rule in rules:
+                if rule.id is not None and (rule.last_triggered_timestamp is not None or rule.is_threshold_breached):
+                    state[rule.id] = (rule.last_triggered_timestamp, rule.is_threshold_breached)
+        return state
+
+    def restore_rule_state(self, state: Dict[int, tuple]):
+        """恢复规则的内存状态: 已缓存的规则立即应用，其余在规则加载时应用。"""
+        self._restored_rule_state.update(state)
+        for pair_id, rules in self._active_rules_by_pair_id.items():
+            self._apply_restored_state(rules)
+            self._invalidate_pair(pair_id)
 
     def load_rules_for_pair(self, pair_id: int, inst_id: str):
         """为指定的交易对加载并缓存其启用的预警规则。"""
         rules_from_db = get_alert_rules_for_pair(pair_id)
         # 确保从数据库加载的规则是 AlertRule 实例，并且具有 last_triggered_timestamp 属性
         # Pydantic 模型在从数据库（通常是字典）创建时，如果 default=None，则该字段存在。
-        self._active_rules_by_pair_id[pair_id] = [
-            rule for rule in rules_from_db if rule.is_enabled
-        ]
-        self._instId_map[pair_id] = inst_id
+        self._replace_rules(pair_id, inst_id, [rule for rule in rules_from_db if rule.is_enabled])
         logger.info(
             f"为交易对 {inst_id} (ID: {pair_id}) 加载了 {len(self._active_rules_by_pair_id[pair_id])} 条启用规则。")
 
+    def set_rules_for_pair(self, pair_id: int, inst_id: str, rules: List[AlertRule]):
+        """直接设置交易对的规则缓存 (不读取数据库)，只保留启用的规则。"""
+        self._replace_rules(pair_id, inst_id, [rule for rule in rules if rule.is_enabled])
+
     def remove_rules_for_pair(self, pair_id: int):
         """移除指定交易对的缓存规则。"""
         if pair_id in self._active_rules_by_pair_id:
-            del self._active_rules_by_pair_id[pair_id]
+            inst_id = self._instId_map.get(pair_id, "")
+            for rule in self._active_rules_by_pair_id.pop(pair_id):
+                evaluator = self.evaluators.get(rule.rule_type)
+                if evaluator:
+                    evaluator.on_rule_removed(rule, inst_id)
         if pair_id in self._instId_map:
             del self._instId_map[pair_id]
+        self._invalidate_pair(pair_id)
         logger.info(f"移除了交易对ID {pair_id} 的缓存规则。")
 
     def update_rule_in_cache(self, rule: AlertRule):
@@ -59,20 +169,24 @@ class AlertProcessor:
         # 但这里假设传入的 rule 已经是 AlertRule 实例
 
         # 移除旧规则 (如果存在) 并添加新规则 (如果启用)
-        self._active_rules_by_pair_id[pair_id] = [r for r in self._active_rules_by_pair_id[pair_id] if r.id != rule.id]
+        new_rules = [r for r in self._active_rules_by_pair_id[pair_id] if r.id != rule.id]
         if rule.is_enabled:
             # 在添加到缓存前，如果 last_triggered_timestamp 是 None 且规则是从DB新加载的，
             # 它会保持 None 直到第一次触发。
             # 如果是已存在的规则被更新，其内存中的 last_triggered_timestamp 会被保留（如果适用）。
             # 我们的 AlertRule 模型定义中 last_triggered_timestamp default=None，这是正确的。
-            self._active_rules_by_pair_id[pair_id].append(rule)
+            new_rules.append(rule)
+        self._replace_rules(pair_id, self._instId_map[pair_id], new_rules)
 
         logger.info(
             f"更新了交易对 {self._instId_map.get(pair_id, '未知')} (ID: {pair_id}) 的规则 (ID: {rule.id}) 缓存。")
 
-    def process_price_data(self, pair_id: int, current_price_str: str):
+    def process_price_data(self, pair_id: int, current_price_str: str, ts_ms: Optional[int] = None):
         """
         处理接收到的标记价格数据，并对照相关规则进行检查。
+
+        参数:
+            ts_ms (Optional[int]): 价格的交易所时间戳 (毫秒)，用于合成K线；缺省时使用本地时间。
         """
         if pair_id not in self._active_rules_by_pair_id or pair_id not in self._instId_map:
             trading_pair = get_trading_pair_by_id(pair_id)
@@ -94,41 +208,167 @@ class AlertProcessor:
             logger.error(f"无法将价格 '{current_price_str}' 转换为浮点数，交易对: {inst_id}")
             return
 
-        for rule in rules_for_pair:
-            if not rule.is_enabled:
-                continue
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+        # 行情状态 (K线等) 每个价格只更新一次，与规则数量无关
+        self.kline_engine.on_tick(inst_id, current_price_float, ts_ms)
+        self.price_windows.on_tick(inst_id, current_price_float, ts_ms)
+        for evaluator in self.evaluators.values():
+            evaluator.on_tick(inst_id, current_price_float, ts_ms)
 
-            evaluator = self.evaluators.get(rule.rule_type)
-            if not evaluator:
-                logger.warning(f"找不到规则类型 '{rule.rule_type}' 的评估器 (规则: {rule.name})")
-                continue
+        if self.batch_interval:
+            self._batch_prices[pair_id] = current_price_float  # 同一周期内只保留最新价格
+            return
 
-            if rule.is_in_cooldown():  # 调用 AlertRule 实例的方法
-                logger.debug(f"规则 '{rule.name}' (交易对: {inst_id}) 仍在冷却中，跳过。")
-                continue
+        index = self._threshold_indexes.get(pair_id)
+        if index is None:
+            index = PriceThresholdIndex(rules_for_pair)
+            self._threshold_indexes[pair_id] = index
+            self._compiled_rules[pair_id] = [CompiledPriceRule.compile(rule) for rule in rules_for_pair]
+        compiled_rules = self._compiled_rules[pair_id]
+        # 只评估阈值落在上一个价格与当前价格之间的规则，以及尚未按最新价格评估过的规则
+        candidates = index.candidates(current_price_float)
+        if candidates:
+            now = time.time()  # 同一价格的所有规则共用一个当前时间
+            for position in candidates:
+                compiled = compiled_rules[position]
+                if compiled is None:  # 非价格预警由对应的评估器逐条评估
+                    index.settle(position, self._evaluate_rule(rules_for_pair[position], inst_id,
+                                                               current_price_float, ts_ms))
+                    continue
+                triggered = compiled.evaluate(current_price_float, now)
+                if triggered:
+                    self._notify_triggered(compiled.rule, inst_id, current_price_float)
+                index.settle(position, triggered is not None)
+        index.advance(current_price_float)
 
-            market_data_for_evaluator: Dict[str, Any] = {}
-            if rule.rule_type == "price_alert":
-                market_data_for_evaluator["price"] = current_price_float
-            # elif rule.rule_type == "kline_pattern":
-            # market_data_for_evaluator["kline_data"] = self.get_kline_data_for_pair(pair_id) # 示例
+    def _evaluate_rule(self, rule: AlertRule, inst_id: str, current_price_float: float,
+                       ts_ms: Optional[int] = None) -> bool:
+        """评估单条规则并在触发时发送通知，返回规则是否按当前价格完成了评估 (被跳过或出错时为 False)。"""
+        if not rule.is_enabled:
+            return False
 
+        evaluator = self.evaluators.get(rule.rule_type)
+        if not evaluator:
+            logger.warning(f"找不到规则类型 '{rule.rule_type}' 的评估器 (规则: {rule.name})")
+            return False
+
+        if rule.is_in_cooldown():  # 调用 AlertRule 实例的方法
+            logger.debug(f"规则 '{rule.name}' (交易对: {inst_id}) 仍在冷却中，跳过。")
+            return False
+
+        market_data_for_evaluator: Dict[str, Any] = {"price": current_price_float}
+        if rule.rule_type != "price_alert":  # K线等评估器按 instId 查找自己维护的行情状态
+            market_data_for_evaluator["inst_id"] = inst_id
+            market_data_for_evaluator["ts_ms"] = ts_ms
+
+        try:
+            triggered = evaluator.check(market_data_for_evaluator, rule)
+        except Exception as e:
+            logger.error(f"评估规则 '{rule.name}' (交易对: {inst_id}) 时出错: {e}")
+            return False
+
+        if triggered:
+            self._notify_triggered(rule, inst_id, current_price_float)
+            rule.update_last_triggered()  # 调用 AlertRule 实例的方法
+        return True
+
+    def _notify_triggered(self, rule: AlertRule, inst_id: str, current_price_float: float):
+        logger.info(f"预警触发! 规则: '{rule.name}', 交易对: {inst_id}, 当前价格: {current_price_float}")
+
+        condition_text = rule.human_readable_condition
+        if not condition_text:
+            if rule.rule_type == "kline_pattern":
+                condition_text = describe_kline_rule(rule.params)
+            elif rule.rule_type == "expression":
+                condition_text = f"满足 {rule.params.get('expression')}"
+            elif rule.rule_type == "pct_change":
+                condition_text = describe_pct_change_rule(rule.params)
+            elif isinstance(self.evaluators.get(rule.rule_type), IndicatorAlertEvaluator):
+                condition_text = describe_indicator_rule(rule.rule_type, rule.params)
+            else:
+                condition_text = f"{rule.params.get('condition')} {rule.params.get('threshold_price')}"
+        alert_message = f"当前价格 {current_price_float} {condition_text}."
+
+        notify_kwargs: Dict[str, Any] = {}
+        if rule.params.get("sinks"):  # 规则单独指定的通知渠道
+            notify_kwargs["sinks"] = rule.params["sinks"]
+        self.notifier(
+            title=f"{ALERT_TITLES.get(rule.rule_type, '预警')}: {inst_id}",
+            message=alert_message,
+            inst_id=inst_id,
+            rule_name=rule.name,
+            **notify_kwargs
+        )
+        if self.event_writer is not None:
+            self.event_writer.record(AlertEvent(
+                ts=time.time(), rule_id=rule.id, pair_id=rule.pair_id, instId=inst_id, rule_name=rule.name,
+                rule_type=rule.rule_type, price=current_price_float, message=alert_message))
+
+    def evaluate_batch(self) -> int:
+        """批量评估本周期内收到新价格的所有交易对，返回触发的预警数。"""
+        if not self._batch_prices:
+            return 0
+        prices_by_pair, self._batch_prices = self._batch_prices, {}
+        if self._batch_state is None:
+            self._batch_state = BatchPriceEvaluator.from_rules(self._active_rules_by_pair_id)
+        evaluator, rules, slot_of, fallback = self._batch_state
+
+        prices = np.zeros(evaluator.pair_count, dtype=np.float64)
+        updated = np.zeros(evaluator.pair_count, dtype=bool)
+        for pair_id, price in prices_by_pair.items():
+            slot = slot_of.get(pair_id)
+            if slot is not None:
+                prices[slot] = price
+                updated[slot] = True
+
+        now = time.time()
+        triggered, changed = evaluator.evaluate(prices, updated, now)
+        # 把状态写回规则对象，规则缓存重建时从规则对象恢复
+        for position in changed.tolist():
+            rules[position].is_threshold_breached = bool(evaluator.breached[position])
+        for position in triggered.tolist():
+            rule = rules[position]
+            rule.last_triggered_timestamp = now
+            self._notify_triggered(rule, self._instId_map.get(rule.pair_id, ""), prices_by_pair[rule.pair_id])
+
+        triggered_count = len(triggered)
+        for pair_id, fallback_rules in fallback.items():  # 无法向量化的规则逐条评估
+            price = prices_by_pair.get(pair_id)
+            inst_id = self._instId_map.get(pair_id)
+            if price is None or not inst_id:
+                continue
+            for rule in fallback_rules:
+                last_triggered = rule.last_triggered_timestamp
+                self._evaluate_rule(rule, inst_id, price)
+                if rule.last_triggered_timestamp != last_triggered:
+                    triggered_count += 1
+        return triggered_count
+
+    async def _batch_loop(self):
+        while True:
+            await asyncio.sleep(self.batch_interval)
             try:
-                triggered = evaluator.check(market_data_for_evaluator, rule)
+                self.evaluate_batch()
             except Exception as e:
-                logger.error(f"评估规则 '{rule.name}' (交易对: {inst_id}) 时出错: {e}")
-                triggered = False
-
-            if triggered:
-                logger.info(f"预警触发! 规则: '{rule.name}', 交易对: {inst_id}, 当前价格: {current_price_float}")
-
-                condition_text = rule.human_readable_condition or f"{rule.params.get('condition')} {rule.params.get('threshold_price')}"
-                alert_message = f"当前价格 {current_price_float} {condition_text}."
-
-                send_dingtalk_notification(
-                    title=f"价格预警: {inst_id}",
-                    message=alert_message,
-                    inst_id=inst_id,
-                    rule_name=rule.name
-                )
-                rule.update_last_triggered()  # 调用 AlertRule 实例的方法
\ No newline at end of file
+                logger.error(f"批量评估预警时出错: {e}", exc_info=True)
+
+    def start(self):
+        """启动通知分发协程和预警事件写入协程，批量评估模式下同时启动后台评估任务 (需在事件循环中调用)。"""
+        if isinstance(self.notifier, (NotificationDispatcher, NotificationRouter)):
+            self.notifier.start()
+        if self.event_writer is not None:
+            self.event_writer.start()
+        if self.batch_interval and (self._batch_task is None or self._batch_task.done()):
+            self._batch_task = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if self._batch_task:
+            self._batch_task.cancel()
+            self._batch_task = None
+        if self.batch_interval:
+            self.evaluate_batch()  # 评估最后一个周期内收到的价格
+        if isinstance(self.notifier, (NotificationDispatcher, NotificationRouter)):
+            await self.notifier.stop()  # 尽量发送完队列中的通知
+        if self.event_writer is not None:
+            await self.event_writer.stop()  # 写入缓冲区中剩余的事件
@@ -0,0 +1,243 @@
+# alert_system/indicators.py
+# 增量技术指标: 每根收盘K线 O(1) 更新 (SMA/EMA/RSI/布林带/ATR)，不回溯历史窗口重算。
+# 相同 (instId, 周期, 指标, 参数) 的指标由 IndicatorRegistry 引用计数共享，多条规则只计算一次。
+import logging
+import math
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+from alert_system.kline_engine import Candle, KlineEngine, KlineSeries
+
+logger = logging.getLogger(__name__)
+
+
+class SMA:
+    """简单移动平均 (收盘价)，维护窗口内的累计和。"""
+
+    __slots__ = ("period", "_window", "_sum", "value", "previous")
+
+    def __init__(self, period: int):
+        if period < 1:
+            raise ValueError(f"SMA 周期必须大于0: {period}")
+        self.period = period
+        self._window: deque = deque(maxlen=period)
+        self._sum = 0.0
+        self.value: Optional[float] = None
+        self.previous: Optional[float] = None
+
+    def update(self, candle: Candle):
+        if len(self._window) == self.period:
+            self._sum -= self._window[0]
+        self._window.append(candle.close)
+        self._sum += candle.close
+        self.previous = self.value
+        if len(self._window) == self.period:
+            self.value = self._sum / self.period
+
+
+class EMA:
+    """指数移动平均 (收盘价)，以前 period 根的简单平均作为初值。"""
+
+    __slots__ = ("period", "_alpha", "_seed_sum", "_seen", "value", "previous")
+
+    def __init__(self, period: int):
+        if period < 1:
+            raise ValueError(f"EMA 周期必须大于0: {period}")
+        self.period = period
+        self._alpha = 2.0 / (period + 1)
+        self._seed_sum = 0.0
+        self._seen = 0
+        self.value: Optional[float] = None
+        self.previous: Optional[float] = None
+
+    def update(self, candle: Candle):
+        self.previous = self.value
+        if self.value is None:
+            self._seen += 1
+            self._seed_sum += candle.close
+            if self._seen == self.period:
+                self.value = self._seed_sum / self.period
+            return
+        self.value += self._alpha * (candle.close - self.value)
+
+
+class RSI:
+    """相对强弱指数 (Wilder 平滑)。"""
+
+    __slots__ = ("period", "_prev_close", "_avg_gain", "_avg_loss", "_seen", "value", "previous")
+
+    def __init__(self, period: int = 14):
+        if period < 1:
+            raise ValueError(f"RSI 周期必须大于0: {period}")
+        self.period = period
+        self._prev_close: Optional[float] = None
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+        self._seen = 0  # 已累计的价格变化数
+        self.value: Optional[float] = None
+        self.previous: Optional[float] = None
+
+    def update(self, candle: Candle):
+        prev_close, self._prev_close = self._prev_close, candle.close
+        if prev_close is None:
+            return
+        change = candle.close - prev_close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        period = self.period
+        self._seen += 1
+        if self._seen <= period:  # 前 period 个变化取简单平均
+            self._avg_gain += gain / period
+            self._avg_loss += loss / period
+            if self._seen < period:
+                return
+        else:
+            self._avg_gain = (self._avg_gain * (period - 1) + gain) / period
+            self._avg_loss = (self._avg_loss * (period - 1) + loss) / period
+        self.previous = self.value
+        if self._avg_loss == 0:
+            self.value = 100.0 if self._avg_gain > 0 else 50.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + self._avg_gain / self._avg_loss)
+
+
+class BollingerBands:
+    """布林带: 中轨为收盘价 SMA，上下轨为中轨 ± std_dev 倍总体标准差；维护窗口内的和与平方和。"""
+
+    __slots__ = ("period", "std_dev", "_window", "_sum", "_sum_sq",
+                 "value", "upper", "lower", "previous", "prev_upper", "prev_lower")
+
+    def __init__(self, period: int = 20, std_dev: float = 2.0):
+        if period < 1:
+            raise ValueError(f"布林带周期必须大于0: {period}")
+        self.period = period
+        self.std_dev = std_dev
+        self._window: deque = deque(maxlen=period)
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self.value: Optional[float] = None  # 中轨
+        self.upper: Optional[float] = None
+        self.lower: Optional[float] = None
+        self.previous: Optional[float] = None
+        self.prev_upper: Optional[float] = None
+        self.prev_lower: Optional[float] = None
+
+    def update(self, candle: Candle):
+        close = candle.close
+        if len(self._window) == self.period:
+            oldest = self._window[0]
+            self._sum -= oldest
+            self._sum_sq -= oldest * oldest
+        self._window.append(close)
+        self._sum += close
+        self._sum_sq += close * close
+        self.previous, self.prev_upper, self.prev_lower = self.value, self.upper, self.lower
+        if len(self._window) < self.period:
+            return
+        mean = self._sum / self.period
+        variance = max(self._sum_sq / self.period - mean * mean, 0.0)  # 浮点误差可能得到极小的负数
+        width = self.std_dev * math.sqrt(variance)
+        self.value, self.upper, self.lower = mean, mean + width, mean - width
+
+
+class ATR:
+    """平均真实波幅 (Wilder 平滑)。"""
+
+    __slots__ = ("period", "_prev_close", "_seed_sum", "_seen", "value", "previous")
+
+    def __init__(self, period: int = 14):
+        if period < 1:
+            raise ValueError(f"ATR 周期必须大于0: {period}")
+        self.period = period
+        self._prev_close: Optional[float] = None
+        self._seed_sum = 0.0
+        self._seen = 0
+        self.value: Optional[float] = None
+        self.previous: Optional[float] = None
+
+    def update(self, candle: Candle):
+        prev_close, self._prev_close = self._prev_close, candle.close
+        if prev_close is None:
+            true_range = candle.high - candle.low
+        else:
+            true_range = max(candle.high - candle.low, abs(candle.high - prev_close), abs(candle.low - prev_close))
+        self.previous = self.value
+        if self.value is None:
+            self._seen += 1
+            self._seed_sum += true_range
+            if self._seen == self.period:
+                self.value = self._seed_sum / self.period
+            return
+        self.value = (self.value * (self.period - 1) + true_range) / self.period
+
+
+# 指标名 -> 构造函数 (参数按位置传入)
+INDICATOR_TYPES: Dict[str, Callable[..., object]] = {
+    "sma": SMA,
+    "ema": EMA,
+    "rsi": RSI,
+    "bollinger": BollingerBands,
+    "atr": ATR,
+}
+
+# (instId, 周期, 指标名, 参数)
+IndicatorKey = Tuple[str, str, str, tuple]
+
+
+class IndicatorRegistry:
+    """
+    指标实例注册表。
+    按 IndicatorKey 引用计数共享指标实例；首次申请时从K线序列中已收盘的K线预热，
+    之后由 KlineEngine 的收盘回调逐根更新。持有指标期间同时持有对应的K线序列。
+    """
+
+    def __init__(self, engine: KlineEngine):
+        self.engine = engine
+        self._indicators: Dict[IndicatorKey, object] = {}
+        self._refcounts: Dict[IndicatorKey, int] = {}
+        self._by_series: Dict[Tuple[str, str], List[object]] = {}
+        engine.add_close_listener(self._on_candles_closed)
+
+    def acquire(self, inst_id: str, timeframe: str, name: str, params: tuple) -> Tuple[IndicatorKey, object]:
+        if name not in INDICATOR_TYPES:
+            raise ValueError(f"未知指标: {name}")
+        key = (inst_id, timeframe, name, params)
+        indicator = self._indicators.get(key)
+        if indicator is None:
+            indicator = INDICATOR_TYPES[name](*params)
+            series = self.engine.acquire(inst_id, timeframe)
+            for candle in series.closed_candles(len(series.buffer)):
+                indicator.update(candle)
+            self._indicators[key] = indicator
+            self._by_series.setdefault((inst_id, timeframe), []).append(indicator)
+        self._refcounts[key] = self._refcounts.get(key, 0) + 1
+        return key, indicator
+
+    def release(self, key: IndicatorKey):
+        count = self._refcounts.get(key, 0) - 1
+        if count > 0:
+            self._refcounts[key] = count
+            return
+        self._refcounts.pop(key, None)
+        indicator = self._indicators.pop(key, None)
+        if indicator is None:
+            return
+        inst_id, timeframe = key[0], key[1]
+        series_indicators = self._by_series.get((inst_id, timeframe), [])
+        series_indicators.remove(indicator)
+        if not series_indicators:
+            self._by_series.pop((inst_id, timeframe), None)
+        self.engine.release(inst_id, timeframe)
+
+    def series(self, inst_id: str, timeframe: str) -> Optional[KlineSeries]:
+        return self.engine.series(inst_id, timeframe)
+
+    def _on_candles_closed(self, series: KlineSeries, closed: int):
+        indicators = self._by_series.get((series.inst_id, series.timeframe))
+        if not indicators:
+            return
+        for candle in series.closed_candles(closed):
+            for indicator in indicators:
+                indicator.update(candle)
+
+    def stats(self) -> Dict[str, int]:
+        return {"indicators": len(self._indicators), "references": sum(self._refcounts.values())}
@@ -0,0 +1,218 @@
+# alert_system/kline_engine.py
+# K线引擎: 由标记价格增量合成多周期 OHLC K线，
+# 每个 instId/周期一个预分配的 array 环形缓冲区 (容量 KLINE_BUFFER_SIZE)，追加时不分配内存。
+import logging
+from array import array
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from config import KLINE_BUFFER_SIZE
+
+logger = logging.getLogger(__name__)
+
+# 支持的K线周期 (与 OKX candle 频道后缀一致) -> 毫秒
+TIMEFRAME_MS: Dict[str, int] = {
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+    "1H": 3_600_000,
+    "4H": 14_400_000,
+    "1D": 86_400_000,
+}
+
+
+class Candle(NamedTuple):
+    ts: int  # K线开始时间 (毫秒)
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+class CandleRingBuffer:
+    """固定容量的K线环形缓冲区，各字段分别存放在预分配的 array('d') 中，写满后覆盖最旧的K线。"""
+
+    __slots__ = ("capacity", "_ts", "_open", "_high", "_low", "_close", "_volume", "_head", "_count")
+
+    def __init__(self, capacity: int = KLINE_BUFFER_SIZE):
+        self.capacity = capacity
+        self._ts = array("d", bytes(8 * capacity))
+        self._open = array("d", bytes(8 * capacity))
+        self._high = array("d", bytes(8 * capacity))
+        self._low = array("d", bytes(8 * capacity))
+        self._close = array("d", bytes(8 * capacity))
+        self._volume = array("d", bytes(8 * capacity))
+        self._head = 0  # 下一次写入的位置
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _slot(self, index: int) -> int:
+        """逻辑下标 (0 为最旧，-1 为最新) -> 物理下标。"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("K线下标越界")
+        return (self._head - self._count + index) % self.capacity
+
+    def append(self, ts: float, open_: float, high: float, low: float, close: float, volume: float = 0.0):
+        slot = self._head
+        self._ts[slot] = ts
+        self._open[slot] = open_
+        self._high[slot] = high
+        self._low[slot] = low
+        self._close[slot] = close
+        self._volume[slot] = volume
+        self._head = (slot + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def update_last(self, high: float, low: float, close: float, volume: Optional[float] = None):
+        slot = (self._head - 1) % self.capacity
+        if high > self._high[slot]:
+            self._high[slot] = high
+        if low < self._low[slot]:
+            self._low[slot] = low
+        self._close[slot] = close
+        if volume is not None:
+            self._volume[slot] = volume
+
+    def last_ts(self) -> Optional[float]:
+        return self._ts[(self._head - 1) % self.capacity] if self._count else None
+
+    def last_close(self) -> Optional[float]:
+        return self._close[(self._head - 1) % self.capacity] if self._count else None
+
+    def close_at(self, index: int) -> float:
+        return self._close[self._slot(index)]
+
+    def __getitem__(self, index: int) -> Candle:
+        slot = self._slot(index)
+        return Candle(int(self._ts[slot]), self._open[slot], self._high[slot], self._low[slot],
+                      self._close[slot], self._volume[slot])
+
+
+class KlineSeries:
+    """
+    单个 instId、单个周期的K线序列。
+    最后一根K线在收到下一周期的数据前处于未收盘状态；closed_count 为累计收盘的K线数，
+    评估器和指标通过比较它判断是否有新K线收盘。
+    """
+
+    def __init__(self, inst_id: str, timeframe: str, capacity: int = KLINE_BUFFER_SIZE):
+        if timeframe not in TIMEFRAME_MS:
+            raise ValueError(f"不支持的K线周期: {timeframe}")
+        self.inst_id = inst_id
+        self.timeframe = timeframe
+        self.interval_ms = TIMEFRAME_MS[timeframe]
+        self.buffer = CandleRingBuffer(capacity)
+        self.forming = False  # 最后一根K线是否未收盘
+        self.closed_count = 0
+
+    def on_tick(self, price: float, ts_ms: int) -> int:
+        """用一个价格更新K线，返回因此收盘的K线数量 (中间无成交的周期以前收盘价补齐)。"""
+        bucket = ts_ms - ts_ms % self.interval_ms
+        buffer = self.buffer
+        last_ts = buffer.last_ts()
+        if last_ts is None:
+            buffer.append(bucket, price, price, price, price)
+            self.forming = True
+            return 0
+        if bucket == last_ts:
+            buffer.update_last(price, price, price)
+            return 0
+        if bucket < last_ts:  # 乱序的旧价格，忽略
+            return 0
+
+        closed = 1 if self.forming else 0
+        previous_close = buffer.last_close()
+        gap_ts = last_ts + self.interval_ms
+        missing = int((bucket - gap_ts) // self.interval_ms)
+        if missing > buffer.capacity:  # 缺口超过缓冲区容量时只需补齐最后 capacity 根
+            gap_ts = bucket - buffer.capacity * self.interval_ms
+            missing = buffer.capacity
+        for _ in range(missing):
+            buffer.append(gap_ts, previous_close, previous_close, previous_close, previous_close)
+            gap_ts += self.interval_ms
+        buffer.append(bucket, price, price, price, price)
+        self.forming = True
+        closed += missing
+        self.closed_count += closed
+        return closed
+
+    def closed_candles(self, count: int) -> List[Candle]:
+        """最近 count 根已收盘的K线，按时间从旧到新排列 (不足时返回现有的)。"""
+        available = len(self.buffer) - (1 if self.forming else 0)
+        count = min(count, available)
+        end = available
+        return [self.buffer[i] for i in range(end - count, end)]
+
+    def last_closed(self) -> Optional[Candle]:
+        candles = self.closed_candles(1)
+        return candles[0] if candles else None
+
+
+CloseListener = Callable[[KlineSeries, int], None]
+
+
+class KlineEngine:
+    """
+    多 instId、多周期的K线引擎。
+    序列按 (instId, 周期) 引用计数，最后一个使用者释放后丢弃；每个价格只更新该 instId 正在使用的序列。
+    """
+
+    def __init__(self, capacity: int = KLINE_BUFFER_SIZE):
+        self.capacity = capacity
+        self._series: Dict[Tuple[str, str], KlineSeries] = {}
+        self._refcounts: Dict[Tuple[str, str], int] = {}
+        self._by_inst: Dict[str, List[KlineSeries]] = {}
+        self._close_listeners: List[CloseListener] = []
+
+    def acquire(self, inst_id: str, timeframe: str) -> KlineSeries:
+        key = (inst_id, timeframe)
+        series = self._series.get(key)
+        if series is None:
+            series = KlineSeries(inst_id, timeframe, self.capacity)
+            self._series[key] = series
+            self._by_inst.setdefault(inst_id, []).append(series)
+        self._refcounts[key] = self._refcounts.get(key, 0) + 1
+        return series
+
+    def release(self, inst_id: str, timeframe: str):
+        key = (inst_id, timeframe)
+        count = self._refcounts.get(key, 0) - 1
+        if count > 0:
+            self._refcounts[key] = count
+            return
+        self._refcounts.pop(key, None)
+        series = self._series.pop(key, None)
+        if series is not None:
+            inst_series = self._by_inst.get(inst_id, [])
+            inst_series.remove(series)
+            if not inst_series:
+                self._by_inst.pop(inst_id, None)
+
+    def series(self, inst_id: str, timeframe: str) -> Optional[KlineSeries]:
+        return self._series.get((inst_id, timeframe))
+
+    def add_close_listener(self, listener: CloseListener):
+        """注册K线收盘回调 listener(series, 收盘数量)，用于按K线更新的指标等。"""
+        self._close_listeners.append(listener)
+
+    def _notify_closed(self, series: KlineSeries, closed: int):
+        for listener in self._close_listeners:
+            try:
+                listener(series, closed)
+            except Exception as e:
+                logger.error(f"K线收盘回调出错 ({series.inst_id} {series.timeframe}): {e}", exc_info=True)
+
+    def on_tick(self, inst_id: str, price: float, ts_ms: int):
+        inst_series = self._by_inst.get(inst_id)
+        if not inst_series:
+            return
+        for series in inst_series:
+            closed = series.on_tick(price, ts_ms)
+            if closed:
+                self._notify_closed(series, closed)
@@ -0,0 +1,301 @@
+# alert_system/notification_dispatcher.py
+# 异步通知分发: 预警触发时只把通知放入内存队列，由固定数量的发送协程在线程池中调用发送函数
+# (发送函数复用带连接池的 HTTP 会话)，失败按指数退避重试，并统计入队到送达的延迟。
+# 可选的滑动窗口限流 (任意 60 秒内最多 N 次): 发送额度用尽时，等待下一个额度期间到达的通知合并为一条按 instId 分组的汇总消息。
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+from alert_system.notification_sender import send_dingtalk_notification
+from ws_util.backoff import ExponentialBackoff
+from config import (NOTIFY_QUEUE_SIZE, NOTIFY_WORKERS, NOTIFY_MAX_RETRIES,
+                    NOTIFY_RETRY_INITIAL_DELAY, NOTIFY_RETRY_MAX_DELAY,
+                    DINGTALK_RATE_LIMIT_PER_MINUTE, NOTIFY_DIGEST_MAX_ITEMS)
+
+logger = logging.getLogger(__name__)
+
+# 保留最近多少条送达延迟用于计算分位数
+LATENCY_SAMPLES = 1000
+
+
+class Notification(NamedTuple):
+    title: str
+    message: str
+    inst_id: str
+    rule_name: str
+    enqueued_at: float  # time.monotonic()
+
+
+class SlidingWindowLimiter:
+    """滑动窗口限流: 任意 window 秒内最多 limit 次 (记录最近 limit 次的时间)。"""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._sent: Deque[float] = deque()
+
+    def _expire(self, now: float):
+        sent = self._sent
+        while sent and sent[0] <= now - self.window:
+            sent.popleft()
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self._expire(now)
+        if len(self._sent) < self.limit:
+            self._sent.append(now)
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """距离下一次可以发送的秒数。"""
+        now = time.monotonic()
+        self._expire(now)
+        return 0.0 if len(self._sent) < self.limit else self._sent[0] + self.window - now
+
+    @classmethod
+    def per_minute(cls, limit: Optional[int]) -> Optional["SlidingWindowLimiter"]:
+        return cls(limit, 60.0) if limit else None
+
+
+def build_digest(notifications: List[Notification]) -> Notification:
+    """把多条通知合并为一条汇总通知，详情按 instId 分组 (markdown)。"""
+    by_inst: Dict[str, List[Notification]] = {}
+    for notification in notifications:
+        by_inst.setdefault(notification.inst_id, []).append(notification)
+    lines = []
+    for inst_id, items in by_inst.items():
+        lines.append(f"\n\n**{inst_id}** ({len(items)} 条)\n")
+        lines.extend(f"\n- {item.rule_name}: {item.message}" for item in items)
+    return Notification(
+        title=f"预警汇总: {len(notifications)} 条",
+        message="".join(lines),
+        inst_id=", ".join(by_inst),
+        rule_name=f"{len(notifications)} 条规则",
+        enqueued_at=min(item.enqueued_at for item in notifications),
+    )
+
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class NotificationDispatcher:
+    """
+    通知分发器，可直接作为 AlertProcessor 的 notifier 使用: 调用只入队，不阻塞事件循环。
+
+    sender(title=, message=, inst_id=, rule_name=) 返回 True 表示送达，返回 False 或抛出异常表示失败并重试；
+    同步函数在分发器自己的线程池 (workers 个线程) 中执行，不占用默认线程池；协程函数直接 await。
+    workers 个发送协程同时也是进行中请求数的上限。
+    队列满时丢弃新通知并记录警告。
+
+    rate_limit_per_minute 设置后任意 60 秒内的发送 (包括重试) 不超过该次数；额度用尽时，取到通知的发送协程
+    一边等待下一个额度一边收集队列中的通知 (最多 digest_max_items 条)，合并为一条汇总消息发送。
+    """
+
+    def __init__(self,
+                 sender: Callable[..., Any] = send_dingtalk_notification,
+                 queue_size: int = NOTIFY_QUEUE_SIZE,
+                 workers: int = NOTIFY_WORKERS,
+                 max_retries: int = NOTIFY_MAX_RETRIES,
+                 retry_initial_delay: float = NOTIFY_RETRY_INITIAL_DELAY,
+                 retry_max_delay: float = NOTIFY_RETRY_MAX_DELAY,
+                 rate_limit_per_minute: Optional[int] = DINGTALK_RATE_LIMIT_PER_MINUTE,
+                 digest_max_items: int = NOTIFY_DIGEST_MAX_ITEMS):
+        self.sender = sender
+        self.queue_size = queue_size
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.retry_initial_delay = retry_initial_delay
+        self.retry_max_delay = retry_max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._stopped = False  # stop() 之后到达的通知不再自动重启发送协程
+        self._executor: Optional[ThreadPoolExecutor] = None  # 同步发送函数的专用线程池，start() 时创建
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._limiter = SlidingWindowLimiter.per_minute(rate_limit_per_minute)
+        self.digest_max_items = max(1, digest_max_items)
+        self._rate_lock: Optional[asyncio.Lock] = None  # 同一时间只有一个发送协程等待额度并收集通知
+
+        # 计数器
+        self.enqueued = 0
+        self.delivered = 0
+        self.failed = 0  # 重试用尽仍失败
+        self.dropped = 0  # 队列满被丢弃
+        self.retries = 0
+        self.in_flight = 0
+        self.requests = 0  # 实际调用发送函数的次数
+        self.digests = 0  # 发送的汇总消息数
+        self.coalesced = 0  # 被合并进汇总消息的通知数
+
+    @property
+    def running(self) -> bool:
+        return bool(self._worker_tasks)
+
+    def start(self):
+        """启动发送协程 (需在事件循环中调用，可重复调用)。"""
+        if self._worker_tasks:
+            return
+        self._stopped = False
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._rate_lock = asyncio.Lock()
+        if self._executor is None and not asyncio.iscoroutinefunction(self.sender):
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="notify")
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"通知分发器已启动: {self.workers} 个发送协程, 队列容量 {self.queue_size}")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """停止发送协程；先在 drain_timeout 秒内尽量发送完队列中的通知。之后的通知被丢弃，直到再次调用 start()。"""
+        self._stopped = True
+        if self._queue is not None and self._worker_tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"通知分发器停止时仍有 {self._queue.qsize()} 条通知未发送。")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)  # 不等待卡住的 HTTP 请求，超时后线程自行结束
+            self._executor = None
+
+    def __call__(self, title: str, message: str, inst_id: str, rule_name: str, sinks: Optional[List[str]] = None):
+        # sinks 为规则指定的通知渠道，由 NotificationRouter 使用；单个分发器忽略
+        self.enqueue(title=title, message=message, inst_id=inst_id, rule_name=rule_name)
+
+    def enqueue(self, title: str, message: str, inst_id: str, rule_name: str) -> bool:
+        """放入一条通知，返回是否入队成功。未在事件循环中运行时 (脚本等) 直接同步发送。"""
+        if self._stopped:
+            self.dropped += 1
+            logger.warning(f"通知分发器已停止，丢弃通知: {title} (规则: {rule_name})")
+            return False
+        if not self._worker_tasks:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self._send_now(title, message, inst_id, rule_name)
+                return True
+            self.start()
+        try:
+            self._queue.put_nowait(Notification(title, message, inst_id, rule_name, time.monotonic()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"通知队列已满 ({self.queue_size})，丢弃通知: {title} (规则: {rule_name})")
+            return False
+        self.enqueued += 1
+        return True
+
+    def _send_now(self, title: str, message: str, inst_id: str, rule_name: str):
+        try:
+            delivered = self.sender(title=title, message=message, inst_id=inst_id, rule_name=rule_name)
+        except Exception as e:
+            logger.error(f"发送通知时出错: {e}")
+            delivered = False
+        if delivered is False:
+            self.failed += 1
+        else:
+            self.delivered += 1
+
+    async def _send(self, notification: Notification) -> bool:
+        self.requests += 1
+        kwargs = {"title": notification.title, "message": notification.message,
+                  "inst_id": notification.inst_id, "rule_name": notification.rule_name}
+        if asyncio.iscoroutinefunction(self.sender):
+            result = await self.sender(**kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, functools.partial(self.sender, **kwargs))
+        return result is not False  # 不返回值的发送函数视为成功
+
+    async def _acquire_slot(self):
+        while not self._limiter.try_acquire():
+            await asyncio.sleep(self._limiter.wait_time())
+
+    async def _next_batch(self) -> List[Notification]:
+        """取出下一批要发送的通知并占用一个发送额度；额度用尽时等待期间到达的通知合并到同一批。"""
+        queue = self._queue
+        if self._limiter is None:
+            return [await queue.get()]
+        async with self._rate_lock:
+            batch = [await queue.get()]
+            while not self._limiter.try_acquire():
+                deadline = time.monotonic() + self._limiter.wait_time()
+                while len(batch) < self.digest_max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+                if len(batch) >= self.digest_max_items:
+                    await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+            return batch
+
+    async def _deliver(self, batch: List[Notification]):
+        notification = batch[0] if len(batch) == 1 else build_digest(batch)
+        if len(batch) > 1:
+            self.digests += 1
+            self.coalesced += len(batch)
+        backoff = ExponentialBackoff(initial=self.retry_initial_delay, maximum=self.retry_max_delay)
+        backoff.next_delay()  # 第一次发送不等待
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(backoff.next_delay())
+                if self._limiter is not None:
+                    await self._acquire_slot()
+            try:
+                delivered = await self._send(notification)
+            except Exception as e:
+                logger.error(f"发送通知 '{notification.title}' 时出错 (第 {attempt + 1} 次): {e}")
+                delivered = False
+            if delivered:
+                delivered_at = time.monotonic()
+                self.delivered += len(batch)
+                self._latencies.extend(delivered_at - item.enqueued_at for item in batch)
+                return
+        self.failed += len(batch)
+        logger.error(f"通知 '{notification.title}' (规则: {notification.rule_name}) 重试 {self.max_retries} 次后仍发送失败。")
+
+    async def _worker(self):
+        queue = self._queue
+        while True:
+            batch = await self._next_batch()
+            self.in_flight += 1
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                logger.error(f"通知分发协程出错: {e}", exc_info=True)
+            finally:
+                self.in_flight -= 1
+                for _ in batch:
+                    queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._latencies)
+        latency_ms = {name: (None if value is None else round(value * 1000, 1))
+                      for name, value in (("p50", _percentile(ordered, 50)), ("p90", _percentile(ordered, 90)),
+                                          ("p99", _percentile(ordered, 99)),
+                                          ("max", ordered[-1] if ordered else None))}
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "requests": self.requests,
+            "digests": self.digests,
+            "coalesced": self.coalesced,
+            "latency_ms": latency_ms,
+        }
@@ -0,0 +1,77 @@
+# alert_system/notification_router.py
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from alert_system.notification_dispatcher import NotificationDispatcher
+from alert_system.notification_sinks import build_sink
+from config import NOTIFY_SINKS, NOTIFY_DEFAULT_SINKS, NOTIFY_ROUTES_BY_INST
+
+logger = logging.getLogger(__name__)
+
+# 渠道配置中交给 NotificationDispatcher 的键
+DISPATCHER_OPTIONS = ("workers", "queue_size", "max_retries", "retry_initial_delay", "retry_max_delay",
+                      "rate_limit_per_minute", "digest_max_items")
+
+
+class NotificationRouter:
+    """
+    多渠道通知路由，可直接作为 AlertProcessor 的 notifier 使用。
+
+    每个渠道有自己的 NotificationDispatcher (独立的队列、并发数、重试与限流)，
+    一个渠道变慢或失败不会影响其他渠道的投递。
+    渠道选择优先级: 规则 params["sinks"] > 按 instId 的路由 > 默认渠道。
+    """
+
+    def __init__(self, dispatchers: Dict[str, NotificationDispatcher], default_sinks: List[str],
+                 routes_by_inst: Optional[Dict[str, List[str]]] = None):
+        self.dispatchers = dispatchers
+        self.default_sinks = list(default_sinks)
+        self.routes_by_inst = dict(routes_by_inst or {})
+        self.unrouted = 0  # 指定的渠道都不存在而未发送的通知数
+
+    @classmethod
+    def from_config(cls,
+                    sinks_config: Dict[str, Dict[str, Any]] = NOTIFY_SINKS,
+                    default_sinks: List[str] = NOTIFY_DEFAULT_SINKS,
+                    routes_by_inst: Dict[str, List[str]] = NOTIFY_ROUTES_BY_INST) -> "NotificationRouter":
+        dispatchers: Dict[str, NotificationDispatcher] = {}
+        for name, sink_config in sinks_config.items():
+            options = dict(sink_config)
+            sink_type = options.pop("type", name)
+            dispatcher_options = {key: options.pop(key) for key in DISPATCHER_OPTIONS if key in options}
+            if sink_type != "dingtalk":  # 限流与汇总是为钉钉机器人准备的，其他渠道需显式配置
+                dispatcher_options.setdefault("rate_limit_per_minute", None)
+            try:
+                sink = build_sink(sink_type, **options)
+            except (TypeError, ValueError) as e:
+                logger.error(f"通知渠道 '{name}' 配置无效，已忽略: {e}")
+                continue
+            dispatchers[name] = NotificationDispatcher(sender=sink, **dispatcher_options)
+        return cls(dispatchers, default_sinks, routes_by_inst)
+
+    def resolve(self, inst_id: str, sinks: Optional[List[str]] = None) -> List[str]:
+        """返回通知应发送到的渠道名。"""
+        return list(sinks or self.routes_by_inst.get(inst_id) or self.default_sinks)
+
+    def __call__(self, title: str, message: str, inst_id: str, rule_name: str, sinks: Optional[List[str]] = None):
+        delivered_to = 0
+        for name in self.resolve(inst_id, sinks):
+            dispatcher = self.dispatchers.get(name)
+            if dispatcher is None:
+                logger.warning(f"通知渠道 '{name}' 不存在 (规则: {rule_name})")
+                continue
+            dispatcher.enqueue(title=title, message=message, inst_id=inst_id, rule_name=rule_name)
+            delivered_to += 1
+        if not delivered_to:
+            self.unrouted += 1
+
+    def start(self):
+        for dispatcher in self.dispatchers.values():
+            dispatcher.start()
+
+    async def stop(self):
+        await asyncio.gather(*(dispatcher.stop() for dispatcher in self.dispatchers.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"unrouted": self.unrouted,
+                "sinks": {name: dispatcher.stats() for name, dispatcher in self.dispatchers.items()}}
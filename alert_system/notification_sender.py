@@ -1,27 +1,60 @@
 import json
+import threading
 import requests # 注意：项目中需要安装此库 `pip install requests`
+from requests.adapters import HTTPAdapter
 import logging
-from config import DINGTALK_WEBHOOK_URL, DINGTALK_KEYWORD # 从config.py导入
+from typing import Optional
+from config import DINGTALK_WEBHOOK_URL, DINGTALK_KEYWORD, NOTIFY_WORKERS, NOTIFY_SINKS, NOTIFY_HTTP_TIMEOUT # 从config.py导入
 
 logger = logging.getLogger(__name__)
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
 
-def send_dingtalk_notification(title: str, message: str, inst_id: str, rule_name: str):
+
+def _http_pool_size() -> int:
+    """每个主机的连接池大小: 各通知渠道发送线程数的最大值 (渠道可在 NOTIFY_SINKS 中单独设置 workers)。"""
+    sizes = [NOTIFY_WORKERS]
+    sizes.extend(int(options.get("workers", NOTIFY_WORKERS)) for options in NOTIFY_SINKS.values())
+    return max(1, *sizes)
+
+
+def get_http_session() -> requests.Session:
+    """进程内共用的 HTTP 会话 (keep-alive 连接池，每个主机的连接数不少于任一渠道的发送线程数)，发送函数在线程池中并发使用。"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_http_pool_size())
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def send_dingtalk_notification(title: str, message: str, inst_id: str, rule_name: str,
+                               webhook_url: Optional[str] = DINGTALK_WEBHOOK_URL,
+                               keyword: str = DINGTALK_KEYWORD) -> bool:
     """
-    通过钉钉Webhook发送通知。
+    通过钉钉Webhook发送通知 (阻塞调用，由 NotificationDispatcher 在线程池中执行)。
 
     参数:
         title (str): 通知标题。
         message (str): 通知消息体。
         inst_id (str): 触发预警的交易对ID。
         rule_name (str): 触发的预警规则名称。
+        webhook_url / keyword: 机器人 Webhook 地址与安全关键词，默认取自 config.py。
+
+    返回:
+        bool: 是否发送成功 (未配置 Webhook 时模拟发送，视为成功)。
     """
-    if not DINGTALK_WEBHOOK_URL:
+    if not webhook_url:
         logger.warning("钉钉Webhook URL未配置，无法发送通知。")
         print(f"模拟钉钉通知: {title} - {message} (交易对: {inst_id}, 规则: {rule_name})") # 模拟发送
-        return
+        return True
 
-    full_title = f"{DINGTALK_KEYWORD} {title}" # 添加关键词到标题，钉钉机器人安全设置需要
+    full_title = f"{keyword} {title}" # 添加关键词到标题，钉钉机器人安全设置需要
     markdown_text = f"#### {full_title}\n\n**交易对**: {inst_id}\n\n**规则**: {rule_name}\n\n**详情**: {message}\n"
 
     payload = {
@@ -37,14 +70,16 @@ def send_dingtalk_notification(title: str, message: str, inst_id: str, rule_name
     headers = {'Content-Type': 'application/json'}
 
     try:
-        response = requests.post(DINGTALK_WEBHOOK_URL, data=json.dumps(payload), headers=headers, timeout=10)
+        response = get_http_session().post(webhook_url, data=json.dumps(payload), headers=headers,
+                                           timeout=NOTIFY_HTTP_TIMEOUT)
         response.raise_for_status() # 如果请求失败 (状态码 4xx or 5xx), 会抛出HTTPError
         result = response.json()
         if result.get("errcode") == 0:
             logger.info(f"钉钉通知发送成功: {title}")
-        else:
-            logger.error(f"钉钉通知发送失败: {result.get('errmsg')} (错误码: {result.get('errcode')})")
+            return True
+        logger.error(f"钉钉通知发送失败: {result.get('errmsg')} (错误码: {result.get('errcode')})")
     except requests.exceptions.RequestException as e:
         logger.error(f"发送钉钉通知时发生网络错误: {e}")
     except Exception as e:
         logger.error(f"发送钉钉通知时发生未知错误: {e}")
+    return False
@@ -0,0 +1,127 @@
+# alert_system/notification_sinks.py
+# 通知渠道: 钉钉、通用 HTTP Webhook、本地 JSONL 文件、标准输出、SMTP 邮件。
+# 每个渠道都是可调用对象 sink(title=, message=, inst_id=, rule_name=) -> bool (阻塞调用)，
+# 由 NotificationRouter 为每个渠道单独创建 NotificationDispatcher (独立队列、并发数与重试)。
+import json
+import logging
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional
+import requests
+from alert_system.notification_sender import get_http_session, send_dingtalk_notification
+from config import DINGTALK_WEBHOOK_URL, DINGTALK_KEYWORD, NOTIFY_HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def _payload(title: str, message: str, inst_id: str, rule_name: str) -> Dict[str, Any]:
+    return {"ts": time.time(), "title": title, "message": message, "inst_id": inst_id, "rule_name": rule_name}
+
+
+class DingTalkSink:
+    """钉钉机器人 Webhook。"""
+
+    def __init__(self, webhook_url: Optional[str] = DINGTALK_WEBHOOK_URL, keyword: str = DINGTALK_KEYWORD):
+        self.webhook_url = webhook_url
+        self.keyword = keyword
+
+    def __call__(self, title: str, message: str, inst_id: str, rule_name: str) -> bool:
+        return send_dingtalk_notification(title, message, inst_id, rule_name,
+                                          webhook_url=self.webhook_url, keyword=self.keyword)
+
+
+class WebhookSink:
+    """通用 HTTP Webhook: POST JSON {ts, title, message, inst_id, rule_name}，2xx 视为成功。"""
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = NOTIFY_HTTP_TIMEOUT):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    def __call__(self, title: str, message: str, inst_id: str, rule_name: str) -> bool:
+        try:
+            response = get_http_session().post(self.url, json=_payload(title, message, inst_id, rule_name),
+                                               headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"发送 Webhook 通知到 {self.url} 失败: {e}")
+            return False
+
+
+class JsonlFileSink:
+    """追加写入本地 JSONL 文件，每条通知一行。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()  # 发送在线程池中并发执行
+
+    def __call__(self, title: str, message: str, inst_id: str, rule_name: str) -> bool:
+        line = json.dumps(_payload(title, message, inst_id, rule_name), ensure_ascii=False)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            return True
+        except OSError as e:
+            logger.error(f"写入通知文件 {self.path} 失败: {e}")
+            return False
+
+
+class StdoutSink:
+    """打印到标准输出。"""
+
+    def __call__(self, title: str, message: str, inst_id: str, rule_name: str) -> bool:
+        print(f"[预警通知] {title} - {message} (交易对: {inst_id}, 规则: {rule_name})", flush=True)
+        return True
+
+
+class SmtpSink:
+    """SMTP 邮件。use_tls 时在连接后执行 STARTTLS；提供 username 时登录。"""
+
+    def __init__(self, host: str, port: int, from_addr: str, to_addrs: List[str],
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = False, timeout: float = NOTIFY_HTTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.from_addr = from_addr
+        self.to_addrs = list(to_addrs)
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def __call__(self, title: str, message: str, inst_id: str, rule_name: str) -> bool:
+        email = EmailMessage()
+        email["Subject"] = title
+        email["From"] = self.from_addr
+        email["To"] = ", ".join(self.to_addrs)
+        email.set_content(f"交易对: {inst_id}\n规则: {rule_name}\n详情: {message}\n")
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.use_tls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password or "")
+                smtp.send_message(email)
+            return True
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error(f"发送邮件通知到 {self.host}:{self.port} 失败: {e}")
+            return False
+
+
+# 渠道类型 -> 构造函数 (config.NOTIFY_SINKS 中 type 以外的键作为构造参数)
+SINK_TYPES: Dict[str, Callable[..., Callable[..., bool]]] = {
+    "dingtalk": DingTalkSink,
+    "webhook": WebhookSink,
+    "jsonl": JsonlFileSink,
+    "stdout": StdoutSink,
+    "smtp": SmtpSink,
+}
+
+
+def build_sink(sink_type: str, **kwargs) -> Callable[..., bool]:
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"未知的通知渠道类型: {sink_type}，可选: {list(SINK_TYPES)}")
+    return SINK_TYPES[sink_type](**kwargs)
@@ -0,0 +1,162 @@
+# alert_system/price_window.py
+# 滑动时间窗口内的价格极值与窗口起点价格: 每个 instId 一个价格缓冲区 (原始价格只保存一份，长度为最长的窗口)，
+# 其中每个窗口长度维护一对单调队列和自己在缓冲区中的起点，每个价格的更新为均摊 O(1)，与窗口长度无关。
+from collections import deque
+from typing import Dict, List, Optional
+
+# 缓冲区头部已过期的价格超过这个数量且超过一半时才整体删除，删除的代价均摊到每个价格
+_COMPACT_MIN = 1024
+
+
+class MonotonicWindow:
+    """
+    最近 window_ms 毫秒内价格的最小值/最大值，由单调递增 (最小值) 与单调递减 (最大值) 队列维护；
+    原始价格保存在所属的 PriceWindowBuffer 中，窗口只记录自己的起点 (绝对序号)，用于窗口起点价格 (first)。
+    """
+
+    __slots__ = ("window_ms", "_buffer", "_start", "_min", "_max")
+
+    def __init__(self, window_ms: int, buffer: "PriceWindowBuffer"):
+        self.window_ms = window_ms
+        self._buffer = buffer
+        self._start = buffer.end  # 窗口内最早价格在缓冲区中的绝对序号
+        self._min: deque = deque()  # (ts, price)，价格单调递增，队首为窗口最小值
+        self._max: deque = deque()  # (ts, price)，价格单调递减，队首为窗口最大值
+
+    def push(self, ts_ms: int, price: float):
+        """缓冲区追加价格后调用。"""
+        low, high = self._min, self._max
+        while low and low[-1][1] >= price:
+            low.pop()
+        low.append((ts_ms, price))
+        while high and high[-1][1] <= price:
+            high.pop()
+        high.append((ts_ms, price))
+        expire_before = ts_ms - self.window_ms
+        self._start = self._buffer.first_after(self._start, expire_before)
+        while low[0][0] <= expire_before:
+            low.popleft()
+        while high[0][0] <= expire_before:
+            high.popleft()
+
+    @property
+    def min(self) -> Optional[float]:
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self._max[0][1] if self._max else None
+
+    @property
+    def first(self) -> Optional[float]:
+        """窗口内最早的价格。"""
+        return self._buffer.price_at(self._start)
+
+
+class PriceWindowBuffer:
+    """
+    单个 instId 的价格缓冲区，该 instId 的所有窗口长度共用一份原始价格 (保留到最长窗口的起点)。
+    新增窗口时由缓冲区中的价格预热，不必等待一个完整窗口。
+    """
+
+    def __init__(self, inst_id: str):
+        self.inst_id = inst_id
+        self._ts: List[int] = []
+        self._prices: List[float] = []
+        self._offset = 0  # _ts[0] 的绝对序号
+        self._windows: Dict[int, MonotonicWindow] = {}
+        self._refcounts: Dict[int, int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._windows)
+
+    @property
+    def end(self) -> int:
+        """下一个价格的绝对序号。"""
+        return self._offset + len(self._ts)
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return self._ts[-1] if self._ts else None
+
+    def price_at(self, index: int) -> Optional[float]:
+        position = index - self._offset
+        return self._prices[position] if 0 <= position < len(self._prices) else None
+
+    def first_after(self, index: int, expire_before: int) -> int:
+        """从绝对序号 index 开始，第一个时间戳晚于 expire_before 的价格的绝对序号。"""
+        ts, offset, end = self._ts, self._offset, self.end
+        while index < end and ts[index - offset] <= expire_before:
+            index += 1
+        return index
+
+    def acquire(self, window_ms: int) -> MonotonicWindow:
+        window = self._windows.get(window_ms)
+        if window is None:
+            window = MonotonicWindow(window_ms, self)
+            window._start = self._offset
+            for ts_ms, price in zip(self._ts, self._prices):
+                window.push(ts_ms, price)
+            self._windows[window_ms] = window
+        self._refcounts[window_ms] = self._refcounts.get(window_ms, 0) + 1
+        return window
+
+    def release(self, window_ms: int):
+        count = self._refcounts.get(window_ms, 0) - 1
+        if count > 0:
+            self._refcounts[window_ms] = count
+            return
+        self._refcounts.pop(window_ms, None)
+        self._windows.pop(window_ms, None)
+
+    def on_tick(self, price: float, ts_ms: int):
+        if not self._windows:
+            return
+        last_ts = self.last_ts
+        if last_ts is not None and ts_ms < last_ts:  # 乱序的价格按最新时间处理，保持队列有序
+            ts_ms = last_ts
+        self._ts.append(ts_ms)
+        self._prices.append(price)
+        start = self.end
+        for window in self._windows.values():
+            window.push(ts_ms, price)
+            if window._start < start:
+                start = window._start
+        # 丢弃所有窗口都已不再包含的价格 (即最长窗口起点之前的部分)
+        expired = start - self._offset
+        if expired >= _COMPACT_MIN and expired * 2 >= len(self._ts):
+            del self._ts[:expired]
+            del self._prices[:expired]
+            self._offset = start
+
+
+class PriceWindowStore:
+    """按 instId 管理价格缓冲区，窗口按 (instId, 窗口长度) 引用计数，最后一个使用者释放后丢弃。"""
+
+    def __init__(self):
+        self._buffers: Dict[str, PriceWindowBuffer] = {}
+
+    def acquire(self, inst_id: str, window_ms: int) -> MonotonicWindow:
+        buffer = self._buffers.get(inst_id)
+        if buffer is None:
+            buffer = PriceWindowBuffer(inst_id)
+            self._buffers[inst_id] = buffer
+        return buffer.acquire(window_ms)
+
+    def release(self, inst_id: str, window_ms: int):
+        buffer = self._buffers.get(inst_id)
+        if buffer is None:
+            return
+        buffer.release(window_ms)
+        if not buffer:
+            del self._buffers[inst_id]
+
+    def on_tick(self, inst_id: str, price: float, ts_ms: int):
+        buffer = self._buffers.get(inst_id)
+        if buffer is not None:
+            buffer.on_tick(price, ts_ms)
+
+    def stats(self) -> Dict[str, int]:
+        return {"instruments": len(self._buffers),
+                "windows": sum(len(buffer._windows) for buffer in self._buffers.values()),
+                "buffered_ticks": sum(len(buffer._ts) for buffer in self._buffers.values())}
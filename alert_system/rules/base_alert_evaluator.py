@@ -7,6 +7,7 @@ class BaseAlertEvaluator(ABC):
     """
     预警评估器的抽象基类。
     所有具体的规则评估器都必须实现 check 方法。
+    需要维护行情状态 (K线、指标等) 的评估器可以覆盖 on_rule_loaded / on_rule_removed / on_tick。
     """
 
     @abstractmethod
@@ -17,10 +18,19 @@ class BaseAlertEvaluator(ABC):
         参数:
             data (Dict[str, Any]): 传入的行情数据。
                                    对于价格预警，可能包含 {'price': 70000.0}。
-                                   对于K线预警，可能包含 {'kline_data': [...]} 等。
+                                   其他类型还会包含 'inst_id' 和 'ts_ms' (价格的交易所时间戳，毫秒)。
             rule (AlertRule): 预警规则对象。
 
         返回:
             bool: 如果条件满足则返回 True，否则返回 False。
         """
-        pass
\ No newline at end of file
+        pass
+
+    def on_rule_loaded(self, rule: AlertRule, inst_id: str):
+        """规则进入缓存时调用，可在此申请规则所需的行情状态。"""
+
+    def on_rule_removed(self, rule: AlertRule, inst_id: str):
+        """规则离开缓存 (删除、禁用、被新版本替换) 时调用，释放 on_rule_loaded 申请的状态。"""
+
+    def on_tick(self, inst_id: str, price: float, ts_ms: int):
+        """每个价格到达时调用一次 (与规则数量无关)，在评估规则之前。"""
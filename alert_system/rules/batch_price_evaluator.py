@@ -0,0 +1,99 @@
+# alert_system/rules/batch_price_evaluator.py
+# 价格预警的向量化批量评估: 所有交易对的价格预警规则展开为若干 NumPy 数组，
+# 每个评估周期用一次向量运算完成所有规则的穿越/重置判断。numpy 为可选依赖。
+from typing import Dict, List, Tuple
+from app_models import AlertRule
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时批量评估模式不可用，AlertProcessor 回退到逐价格评估
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+
+class BatchPriceEvaluator:
+    """
+    向量化价格预警评估器。
+
+    每条规则占数组中的一个位置: 所属交易对槽位、阈值、方向 (above/below)、是否已越过阈值、最后触发时间、冷却秒数。
+    与 PriceAlertEvaluator 逐条评估的语义一致:
+      - 冷却中的规则跳过，状态不变 ((now - last_triggered) < cooldown_seconds)；
+      - 否则评估后 breached = (price > threshold) 或 (price < threshold)，由未越过变为越过时触发。
+    本周期内没有新价格的交易对，其规则不参与评估。
+    """
+
+    def __init__(self, pair_slots, thresholds, is_above, breached, last_triggered, cooldown_seconds, pair_count: int):
+        if np is None:
+            raise RuntimeError("批量评估需要 numpy，请先安装: pip install numpy")
+        self.pair_slots = np.asarray(pair_slots, dtype=np.int64)
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.is_above = np.asarray(is_above, dtype=bool)
+        self.breached = np.asarray(breached, dtype=bool).copy()
+        self.last_triggered = np.asarray(last_triggered, dtype=np.float64).copy()  # 从未触发为 NaN
+        self.cooldown_seconds = np.asarray(cooldown_seconds, dtype=np.float64)
+        self.pair_count = pair_count
+
+    @property
+    def rule_count(self) -> int:
+        return len(self.thresholds)
+
+    @classmethod
+    def from_rules(cls, rules_by_pair: Dict[int, List[AlertRule]]
+                   ) -> Tuple["BatchPriceEvaluator", List[AlertRule], Dict[int, int], Dict[int, List[AlertRule]]]:
+        """
+        由规则缓存构建评估器。
+
+        返回:
+            (评估器, 与数组位置一一对应的规则列表, pair_id -> 交易对槽位, 无法向量化的规则 {pair_id: [规则]})。
+            非价格预警、已禁用或参数无效的规则放入最后一项，由调用方逐条评估。
+        """
+        pair_slot_of: Dict[int, int] = {}
+        indexed: List[AlertRule] = []
+        fallback: Dict[int, List[AlertRule]] = {}
+        pair_slots, thresholds, is_above, breached, last_triggered, cooldown = [], [], [], [], [], []
+        for pair_id, rules in rules_by_pair.items():
+            slot = pair_slot_of.setdefault(pair_id, len(pair_slot_of))
+            for rule in rules:
+                condition = rule.params.get("condition")
+                try:
+                    threshold = float(rule.params.get("threshold_price"))
+                except (ValueError, TypeError):
+                    threshold = None
+                if rule.rule_type != "price_alert" or not rule.is_enabled or threshold is None \
+                        or condition not in ("above", "below"):
+                    fallback.setdefault(pair_id, []).append(rule)
+                    continue
+                indexed.append(rule)
+                pair_slots.append(slot)
+                thresholds.append(threshold)
+                is_above.append(condition == "above")
+                breached.append(rule.is_threshold_breached)
+                last_triggered.append(float("nan") if rule.last_triggered_timestamp is None
+                                      else rule.last_triggered_timestamp)
+                cooldown.append(rule.cooldown_seconds)
+        evaluator = cls(pair_slots, thresholds, is_above, breached, last_triggered, cooldown, len(pair_slot_of))
+        return evaluator, indexed, pair_slot_of, fallback
+
+    def evaluate(self, prices, updated, now: float) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        评估一个周期。
+
+        参数:
+            prices: 按交易对槽位排列的最新价格 (float64 数组)。
+            updated: 本周期内收到新价格的交易对槽位 (bool 数组)。
+            now: 本周期使用的当前时间 (time.time())。
+        返回:
+            (触发的规则位置, 状态发生变化的规则位置)。
+        """
+        rule_prices = prices[self.pair_slots]
+        with np.errstate(invalid="ignore"):  # 从未触发的规则 last_triggered 为 NaN，比较结果为 False
+            in_cooldown = (now - self.last_triggered) < self.cooldown_seconds
+        active = updated[self.pair_slots] & ~in_cooldown
+        crossed = np.where(self.is_above, rule_prices > self.thresholds, rule_prices < self.thresholds)
+        new_breached = np.where(active, crossed, self.breached)
+        triggered = np.flatnonzero(new_breached & ~self.breached)
+        changed = np.flatnonzero(new_breached != self.breached)
+        self.breached = new_breached
+        self.last_triggered[triggered] = now
+        return triggered, changed
@@ -0,0 +1,59 @@
+# alert_system/rules/compiled_rule.py
+# 价格预警规则的运行时记录: 规则加载时从 Pydantic AlertRule 编译一次 (阈值、条件、冷却截止时间、越过状态)，
+# 逐价格评估只读写这些 __slots__ 字段，不再解析 params、构造行情字典或逐条调用 time.time()。
+from typing import Optional
+from app_models import AlertRule
+
+CONDITION_ABOVE = 1
+CONDITION_BELOW = -1
+_CONDITIONS = {"above": CONDITION_ABOVE, "below": CONDITION_BELOW}
+
+
+class CompiledPriceRule:
+    """
+    价格预警的运行时记录，语义与 PriceAlertEvaluator + AlertRule.is_in_cooldown 一致。
+    状态变化 (越过/重置、触发时间) 同时写回 AlertRule，规则缓存重建时从 AlertRule 恢复。
+    """
+
+    __slots__ = ("rule", "threshold", "condition", "cooldown_seconds", "cooldown_until", "breached")
+
+    def __init__(self, rule: AlertRule, threshold: float, condition: int):
+        self.rule = rule
+        self.threshold = threshold
+        self.condition = condition
+        self.cooldown_seconds = float(rule.cooldown_seconds)
+        last_triggered = rule.last_triggered_timestamp
+        self.cooldown_until = last_triggered + self.cooldown_seconds if last_triggered is not None else 0.0
+        self.breached = rule.is_threshold_breached
+
+    @classmethod
+    def compile(cls, rule: AlertRule) -> Optional["CompiledPriceRule"]:
+        """编译启用的价格预警规则；其他类型或参数无效时返回 None，由评估器逐条评估。"""
+        if rule.rule_type != "price_alert" or not rule.is_enabled:
+            return None
+        condition = _CONDITIONS.get(rule.params.get("condition"))
+        try:
+            threshold = float(rule.params.get("threshold_price"))
+        except (ValueError, TypeError):
+            return None
+        if condition is None:
+            return None
+        return cls(rule, threshold, condition)
+
+    def evaluate(self, price: float, now: float) -> Optional[bool]:
+        """按价格评估，返回是否触发；冷却中跳过时返回 None (状态不变)。"""
+        if now < self.cooldown_until:
+            return None
+        if self.condition == CONDITION_ABOVE:
+            crossed = price > self.threshold
+        else:
+            crossed = price < self.threshold
+        if crossed == self.breached:
+            return False
+        self.breached = crossed
+        self.rule.is_threshold_breached = crossed
+        if not crossed:  # 回到阈值以内，重置
+            return False
+        self.cooldown_until = now + self.cooldown_seconds
+        self.rule.last_triggered_timestamp = now
+        return True
@@ -0,0 +1,300 @@
+# alert_system/rules/expression.py
+# 规则表达式: 例如 "price > 70000 and pct_change(5m) > 2 or rsi(14, 1m) < 30"。
+# 加载规则时用 ast 解析一次 (只允许白名单中的语法)，编译为嵌套的闭包；
+# 函数调用、比较和逻辑运算按规范化的子表达式缓存在每个价格的 memo 中，同一交易对的所有规则共用。
+# 数据不足 (指标未就绪、窗口为空) 时值为 None，按三值逻辑传递 (not None 仍为 None)，只有最终结果为真时规则才成立。
+import ast
+import re
+from typing import Any, Callable, Dict, List, Tuple
+from alert_system.indicators import IndicatorRegistry
+from alert_system.kline_engine import KlineEngine, TIMEFRAME_MS
+from alert_system.price_window import PriceWindowStore
+
+# 时长/周期字面量 (5m、1H、30s) 不是合法的 Python 记号，解析前转为字符串
+_DURATION_LITERAL = re.compile(r"(?<![\w.\"'])(\d+(?:\.\d+)?)([smhHdD])\b")
+# 表达式长度与语法树深度上限，避免解析/编译时递归过深或占用过多内存
+MAX_EXPRESSION_LENGTH = 1000
+MAX_EXPRESSION_DEPTH = 64
+_DURATION_UNITS_MS = {"s": 1_000, "m": 60_000, "h": 3_600_000, "H": 3_600_000, "d": 86_400_000, "D": 86_400_000}
+
+_COMPARE_OPS = {
+    ast.Gt: lambda a, b: a > b,
+    ast.GtE: lambda a, b: a >= b,
+    ast.Lt: lambda a, b: a < b,
+    ast.LtE: lambda a, b: a <= b,
+    ast.Eq: lambda a, b: a == b,
+    ast.NotEq: lambda a, b: a != b,
+}
+_BINARY_OPS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b if b else None,
+}
+
+# 表达式节点: fn(price, memo) -> 值；数据不足 (指标未就绪、窗口为空) 时为 None，
+# 比较与逻辑运算的结果为 True / False / None (未知)
+Node = Callable[[float, Dict[str, Any]], Any]
+
+
+class ExpressionError(ValueError):
+    """表达式语法错误或使用了不支持的函数/参数。"""
+
+
+def parse_duration_ms(value: Any) -> int:
+    """'5m' / '1H' / '30s' 或秒数 -> 毫秒。"""
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            duration_ms = int(value * 1000)
+        else:
+            match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhHdD])", str(value))
+            if not match:
+                raise ExpressionError(f"无效的时长: {value}")
+            duration_ms = int(float(match.group(1)) * _DURATION_UNITS_MS[match.group(2)])
+    except (OverflowError, ValueError):  # 过大的数值 (如 1e400) 或 nan
+        raise ExpressionError(f"无效的时长: {value}")
+    if duration_ms <= 0:
+        raise ExpressionError(f"时长必须大于0: {value}")
+    return duration_ms
+
+
+def _memoized(key: str, fn: Node) -> Node:
+    def node(price: float, memo: Dict[str, Any]) -> Any:
+        try:
+            return memo[key]
+        except KeyError:
+            value = memo[key] = fn(price, memo)
+            return value
+    return node
+
+
+class CompiledExpression:
+    """编译后的表达式及其占用的行情资源 (价格窗口、指标)，规则移除时由 ExpressionCompiler.release 释放。"""
+
+    __slots__ = ("source", "predicate", "resources")
+
+    def __init__(self, source: str, predicate: Node, resources: List[Tuple]):
+        self.source = source
+        self.predicate = predicate
+        self.resources = resources
+
+    def __call__(self, price: float, memo: Dict[str, Any]) -> bool:
+        value = self.predicate(price, memo)
+        return value is not None and bool(value)  # 未知按不成立处理
+
+
+class ExpressionCompiler:
+    """
+    把表达式编译为某个 instId 上的谓词。
+
+    支持: price、数字、+ - * /、比较 (可链式)、and / or / not、括号，以及函数:
+      pct_change(窗口)       窗口起点价格到当前价格的涨跌幅 (%)
+      high(窗口) / low(窗口)  窗口内最高/最低价
+      rsi(周期, K线周期) / sma(...) / ema(...) / atr(...)      最近收盘K线上的指标值
+      boll_upper(周期, K线周期, 标准差倍数) / boll_mid(...) / boll_lower(...)
+    窗口为 30s / 5m / 1H 等时长，K线周期为 1m / 5m / 1H 等 (默认 1m)。
+    """
+
+    def __init__(self, windows: PriceWindowStore, indicators: IndicatorRegistry):
+        self.windows = windows
+        self.indicators = indicators
+
+    def compile(self, source: str, inst_id: str) -> CompiledExpression:
+        source = source.strip()
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            raise ExpressionError(f"表达式过长 ({len(source)} 个字符)，最多 {MAX_EXPRESSION_LENGTH} 个字符")
+        try:
+            tree = ast.parse(_DURATION_LITERAL.sub(r'"\1\2"', source), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"表达式语法错误: {e.msg}") from e
+        except (RecursionError, MemoryError) as e:
+            raise ExpressionError("表达式嵌套过深") from e
+        if _tree_depth(tree) > MAX_EXPRESSION_DEPTH:
+            raise ExpressionError(f"表达式嵌套过深，语法树最多 {MAX_EXPRESSION_DEPTH} 层")
+        resources: List[Tuple] = []
+        try:
+            predicate = self._compile_node(tree.body, inst_id, resources)
+        except ExpressionError:
+            self._release_resources(resources)
+            raise
+        except (ValueError, ArithmeticError, RecursionError, MemoryError) as e:  # 指标参数错误、数值溢出等
+            self._release_resources(resources)
+            raise ExpressionError(f"表达式无效: {e}") from e
+        except Exception:
+            self._release_resources(resources)
+            raise
+        return CompiledExpression(source, predicate, resources)
+
+    def release(self, compiled: CompiledExpression):
+        self._release_resources(compiled.resources)
+        compiled.resources = []
+
+    def _release_resources(self, resources: List[Tuple]):
+        for resource in resources:
+            if resource[0] == "window":
+                self.windows.release(resource[1], resource[2])
+            else:
+                self.indicators.release(resource[1])
+
+    def _compile_node(self, node: ast.AST, inst_id: str, resources: List[Tuple]) -> Node:
+        key = ast.dump(node)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            try:
+                value = float(node.value)
+            except OverflowError:
+                raise ExpressionError(f"数值过大: {str(node.value)[:20]}...")
+            return lambda price, memo: value
+        if isinstance(node, ast.Name):
+            if node.id != "price":
+                raise ExpressionError(f"未知变量: {node.id}")
+            return lambda price, memo: price
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile_node(node.operand, inst_id, resources)
+            if isinstance(node.op, ast.Not):
+                def negation(price, memo):
+                    value = operand(price, memo)
+                    return None if value is None else not value
+                return negation
+            if isinstance(node.op, ast.USub):
+                def negate(price, memo):
+                    value = operand(price, memo)
+                    return None if value is None else -value
+                return negate
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            op = _BINARY_OPS[type(node.op)]
+            left = self._compile_node(node.left, inst_id, resources)
+            right = self._compile_node(node.right, inst_id, resources)
+
+            def binary(price, memo):
+                a, b = left(price, memo), right(price, memo)
+                return None if a is None or b is None else op(a, b)
+            return binary
+        if isinstance(node, ast.BoolOp):
+            operands = [self._compile_node(value, inst_id, resources) for value in node.values]
+            if isinstance(node.op, ast.And):
+                def all_true(price, memo):
+                    unknown = False
+                    for operand in operands:
+                        value = operand(price, memo)
+                        if value is None:
+                            unknown = True
+                        elif not value:
+                            return False
+                    return None if unknown else True
+                return _memoized(key, all_true)
+
+            def any_true(price, memo):
+                unknown = False
+                for operand in operands:
+                    value = operand(price, memo)
+                    if value is None:
+                        unknown = True
+                    elif value:
+                        return True
+                return None if unknown else False
+            return _memoized(key, any_true)
+        if isinstance(node, ast.Compare):
+            if any(type(op) not in _COMPARE_OPS for op in node.ops):
+                raise ExpressionError("只支持 > >= < <= == != 比较")
+            ops = [_COMPARE_OPS[type(op)] for op in node.ops]
+            operands = [self._compile_node(value, inst_id, resources)
+                        for value in [node.left] + node.comparators]
+
+            def compare(price, memo):
+                left = operands[0](price, memo)
+                for op, operand in zip(ops, operands[1:]):
+                    right = operand(price, memo)
+                    if left is None or right is None:
+                        return None
+                    if not op(left, right):
+                        return False
+                    left = right
+                return True
+            return _memoized(key, compare)
+        if isinstance(node, ast.Call):
+            return _memoized(key, self._compile_call(node, inst_id, resources))
+        raise ExpressionError(f"不支持的表达式语法: {type(node).__name__}")
+
+    def _compile_call(self, node: ast.Call, inst_id: str, resources: List[Tuple]) -> Node:
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise ExpressionError("只支持按位置传参的函数调用")
+        name = node.func.id
+        args = []
+        for arg in node.args:
+            if not isinstance(arg, ast.Constant) or not isinstance(arg.value, (int, float, str)):
+                raise ExpressionError(f"函数 {name} 的参数必须是常量")
+            args.append(arg.value)
+
+        if name in ("pct_change", "high", "low"):
+            if len(args) != 1:
+                raise ExpressionError(f"{name} 需要一个时间窗口参数，例如 {name}(5m)")
+            window_ms = parse_duration_ms(args[0])
+            window = self.windows.acquire(inst_id, window_ms)
+            resources.append(("window", inst_id, window_ms))
+            if name == "high":
+                return lambda price, memo: window.max
+            if name == "low":
+                return lambda price, memo: window.min
+
+            def pct_change(price, memo):
+                first = window.first
+                return (price - first) / first * 100 if first else None
+            return pct_change
+
+        if name in ("rsi", "sma", "ema", "atr"):
+            period, timeframe = self._indicator_args(name, args, 14, 2)
+            indicator = self._acquire_indicator(inst_id, timeframe, name, (period,), resources)
+            return lambda price, memo: indicator.value
+
+        if name in ("boll_upper", "boll_mid", "boll_lower"):
+            period, timeframe = self._indicator_args(name, args, 20, 3)
+            try:
+                std_dev = float(args[2]) if len(args) > 2 else 2.0
+            except ValueError:
+                raise ExpressionError(f"{name} 的标准差倍数无效: {args[2]}")
+            bands = self._acquire_indicator(inst_id, timeframe, "bollinger", (period, std_dev), resources)
+            if name == "boll_upper":
+                return lambda price, memo: bands.upper
+            if name == "boll_lower":
+                return lambda price, memo: bands.lower
+            return lambda price, memo: bands.value
+
+        raise ExpressionError(f"未知函数: {name}")
+
+    @staticmethod
+    def _indicator_args(name: str, args: List[Any], default_period: int, max_args: int) -> Tuple[int, str]:
+        if len(args) > max_args:
+            raise ExpressionError(f"{name} 参数过多")
+        try:
+            period = int(args[0]) if args else default_period
+        except (ValueError, OverflowError):
+            raise ExpressionError(f"{name} 的周期无效: {args[0]}")
+        if period < 1:
+            raise ExpressionError(f"{name} 的周期必须大于0: {period}")
+        timeframe = str(args[1]) if len(args) > 1 else "1m"
+        if timeframe not in TIMEFRAME_MS:
+            raise ExpressionError(f"{name} 的K线周期无效: {timeframe}，可选 {', '.join(TIMEFRAME_MS)}")
+        return period, timeframe
+
+    def _acquire_indicator(self, inst_id: str, timeframe: str, name: str, params: tuple,
+                           resources: List[Tuple]) -> Any:
+        key, indicator = self.indicators.acquire(inst_id, timeframe, name, params)
+        resources.append(("indicator", key))
+        return indicator
+
+
+def _tree_depth(tree: ast.AST) -> int:
+    """语法树深度 (迭代计算，不受递归深度限制)。"""
+    depth, stack = 0, [(tree, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in ast.iter_child_nodes(node))
+    return depth
+
+
+def validate_expression(source: str):
+    """用临时的行情状态编译一次表达式，无效时抛出 ExpressionError (供规则编辑界面在保存前校验)。"""
+    compiler = ExpressionCompiler(PriceWindowStore(), IndicatorRegistry(KlineEngine()))
+    compiler.release(compiler.compile(source, "validate"))
@@ -0,0 +1,74 @@
+# alert_system/rules/expression_alert_evaluator.py
+import logging
+from typing import Any, Dict, Tuple
+from app_models import AlertRule
+from alert_system.rules.base_alert_evaluator import BaseAlertEvaluator
+from alert_system.rules.expression import CompiledExpression, ExpressionCompiler
+
+logger = logging.getLogger(__name__)
+
+
+class ExpressionAlertEvaluator(BaseAlertEvaluator):
+    """
+    表达式预警评估器。
+    params: {'expression': 'price > 70000 and pct_change(5m) > 2 or rsi(14, 1m) < 30'}，语法见 ExpressionCompiler。
+    规则加载时编译一次；同一 instId 的所有表达式规则共用每个价格的子表达式缓存。
+    与价格预警一样只在表达式由假变真时触发一次 (rule.is_threshold_breached)。
+    """
+
+    def __init__(self, compiler: ExpressionCompiler):
+        self.compiler = compiler
+        # 规则对象 -> (instId, 编译后的表达式)
+        self._rule_state: Dict[int, Tuple[str, CompiledExpression]] = {}
+        # instId -> 当前价格的子表达式缓存，每个价格到达时清空
+        self._memos: Dict[str, Dict[str, Any]] = {}
+        self._memo_refcounts: Dict[str, int] = {}
+
+    def on_rule_loaded(self, rule: AlertRule, inst_id: str):
+        if id(rule) in self._rule_state:
+            return
+        try:
+            compiled = self.compiler.compile(str(rule.params.get("expression", "")), inst_id)
+        except ValueError as e:  # ExpressionError (编译时已把参数错误、嵌套过深等统一转换)
+            logger.error(f"表达式规则 '{rule.name}' (ID: {rule.id}) 无效: {e}")
+            return
+        self._rule_state[id(rule)] = (inst_id, compiled)
+        self._memos.setdefault(inst_id, {})
+        self._memo_refcounts[inst_id] = self._memo_refcounts.get(inst_id, 0) + 1
+
+    def on_rule_removed(self, rule: AlertRule, inst_id: str):
+        state = self._rule_state.pop(id(rule), None)
+        if state is None:
+            return
+        inst_id, compiled = state
+        self.compiler.release(compiled)
+        count = self._memo_refcounts.get(inst_id, 0) - 1
+        if count > 0:
+            self._memo_refcounts[inst_id] = count
+        else:
+            self._memo_refcounts.pop(inst_id, None)
+            self._memos.pop(inst_id, None)
+
+    def on_tick(self, inst_id: str, price: float, ts_ms: int):
+        memo = self._memos.get(inst_id)
+        if memo:
+            memo.clear()
+
+    def check(self, data: Dict[str, Any], rule: AlertRule) -> bool:
+        if rule.rule_type != "expression":
+            return False
+        state = self._rule_state.get(id(rule))
+        if state is None:  # 参数无效，加载时已记录错误
+            return False
+        price = data.get("price")
+        if price is None:
+            return False
+        inst_id, compiled = state
+        matched = compiled(price, self._memos[inst_id])
+        if matched and not rule.is_threshold_breached:
+            rule.is_threshold_breached = True
+            return True
+        if not matched and rule.is_threshold_breached:
+            rule.is_threshold_breached = False  # 表达式恢复为假，重置
+        return False
+
@@ -0,0 +1,217 @@
+# alert_system/rules/indicator_alert_evaluator.py
+import logging
+from abc import abstractmethod
+from typing import Any, Dict, List, Tuple
+from app_models import AlertRule
+from alert_system.rules.base_alert_evaluator import BaseAlertEvaluator
+from alert_system.indicators import IndicatorKey, IndicatorRegistry
+from alert_system.kline_engine import KlineSeries, TIMEFRAME_MS
+
+logger = logging.getLogger(__name__)
+
+CONDITION_TEXT = {"above": "上穿", "below": "下穿"}
+
+
+def _crossed(previous, current, threshold: float, condition: str) -> bool:
+    """指标由阈值一侧穿越到另一侧 (上一根K线尚未越过，本根越过)。"""
+    if previous is None or current is None:
+        return False
+    if condition == "above":
+        return previous <= threshold < current
+    if condition == "below":
+        return previous >= threshold > current
+    return False
+
+
+def _parse_threshold(params: Dict[str, Any]) -> float:
+    threshold = params.get("threshold")
+    try:
+        return float(threshold)
+    except (TypeError, ValueError):
+        raise ValueError(f"阈值无效: {threshold!r}")
+
+
+class IndicatorAlertEvaluator(BaseAlertEvaluator):
+    """
+    技术指标预警评估器的基类。
+    规则参数中的 timeframe 指定K线周期；子类声明规则使用的指标 (indicator_specs) 和触发条件 (matches)，
+    可覆盖 parse_params 在加载时校验并转换参数。
+    指标由 IndicatorRegistry 共享，规则只在有新K线收盘时判断一次。
+    """
+
+    rule_type = ""
+
+    def __init__(self, registry: IndicatorRegistry):
+        self.registry = registry
+        # 规则对象 -> (K线序列, 指标键, 指标实例, 已检查过的收盘数, parse_params 转换后的参数)
+        self._rule_state: Dict[int, Tuple[KlineSeries, List[IndicatorKey], List[object], int, Dict[str, Any]]] = {}
+
+    def parse_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """加载规则时校验并转换参数一次，结果传给 indicator_specs 和 matches；无效时抛出 ValueError/TypeError。"""
+        return params
+
+    @abstractmethod
+    def indicator_specs(self, params: Dict[str, Any]) -> List[Tuple[str, tuple]]:
+        """规则使用的指标 [(指标名, 参数), ...]，参数无效时抛出 ValueError/TypeError。"""
+
+    @abstractmethod
+    def matches(self, indicators: List[object], series: KlineSeries, params: Dict[str, Any]) -> bool:
+        """有新K线收盘时判断规则是否触发。"""
+
+    def on_rule_loaded(self, rule: AlertRule, inst_id: str):
+        if id(rule) in self._rule_state:
+            return
+        timeframe = rule.params.get("timeframe", "1m")
+        try:
+            if timeframe not in TIMEFRAME_MS:
+                raise ValueError(f"不支持的K线周期: {timeframe}")
+            params = self.parse_params(rule.params)
+            specs = self.indicator_specs(params)
+        except (ValueError, TypeError) as e:
+            logger.error(f"指标规则 '{rule.name}' (ID: {rule.id}) 参数无效: {e}")
+            return
+        keys, indicators = [], []
+        try:
+            for name, args in specs:
+                key, indicator = self.registry.acquire(inst_id, timeframe, name, args)
+                keys.append(key)
+                indicators.append(indicator)
+        except ValueError as e:
+            for key in keys:
+                self.registry.release(key)
+            logger.error(f"指标规则 '{rule.name}' (ID: {rule.id}) 参数无效: {e}")
+            return
+        series = self.registry.series(inst_id, timeframe)
+        # 只对加载之后收盘的K线判断
+        self._rule_state[id(rule)] = (series, keys, indicators, series.closed_count, params)
+
+    def on_rule_removed(self, rule: AlertRule, inst_id: str):
+        state = self._rule_state.pop(id(rule), None)
+        if state is not None:
+            for key in state[1]:
+                self.registry.release(key)
+
+    def check(self, data: Dict[str, Any], rule: AlertRule) -> bool:
+        if rule.rule_type != self.rule_type:
+            return False
+        state = self._rule_state.get(id(rule))
+        if state is None:  # 参数无效，加载时已记录错误
+            return False
+        series, keys, indicators, seen, params = state
+        if series.closed_count == seen:
+            return False
+        self._rule_state[id(rule)] = (series, keys, indicators, series.closed_count, params)
+        return self.matches(indicators, series, params)
+
+
+class MovingAverageCrossEvaluator(IndicatorAlertEvaluator):
+    """
+    均线交叉预警。
+    params: {'timeframe': '1m', 'ma_type': 'ema' | 'sma', 'fast': 9, 'slow': 21, 'direction': 'golden' | 'death'}
+    golden 为快线上穿慢线 (金叉)，death 为快线下穿慢线 (死叉)。
+    """
+
+    rule_type = "ma_cross"
+
+    def indicator_specs(self, params: Dict[str, Any]) -> List[Tuple[str, tuple]]:
+        ma_type = params.get("ma_type", "ema")
+        if ma_type not in ("ema", "sma"):
+            raise ValueError(f"未知均线类型: {ma_type}")
+        fast, slow = int(params.get("fast", 9)), int(params.get("slow", 21))
+        if fast >= slow:
+            raise ValueError(f"快线周期 ({fast}) 必须小于慢线周期 ({slow})")
+        return [(ma_type, (fast,)), (ma_type, (slow,))]
+
+    def matches(self, indicators: List[object], series: KlineSeries, params: Dict[str, Any]) -> bool:
+        fast, slow = indicators
+        if None in (fast.previous, slow.previous, fast.value, slow.value):
+            return False
+        previous_diff = fast.previous - slow.previous
+        diff = fast.value - slow.value
+        if params.get("direction", "golden") == "death":
+            return previous_diff >= 0 > diff
+        return previous_diff <= 0 < diff
+
+
+class RsiAlertEvaluator(IndicatorAlertEvaluator):
+    """
+    RSI 预警，RSI 穿越阈值时触发。
+    params: {'timeframe': '1m', 'period': 14, 'condition': 'above' | 'below', 'threshold': 70}
+    """
+
+    rule_type = "rsi"
+
+    def parse_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if params.get("condition") not in CONDITION_TEXT:
+            raise ValueError(f"未知条件: {params.get('condition')}")
+        return {**params, "threshold": _parse_threshold(params)}
+
+    def indicator_specs(self, params: Dict[str, Any]) -> List[Tuple[str, tuple]]:
+        return [("rsi", (int(params.get("period", 14)),))]
+
+    def matches(self, indicators: List[object], series: KlineSeries, params: Dict[str, Any]) -> bool:
+        rsi = indicators[0]
+        return _crossed(rsi.previous, rsi.value, params["threshold"], params["condition"])
+
+
+class BollingerAlertEvaluator(IndicatorAlertEvaluator):
+    """
+    布林带突破预警，收盘价由带内突破上轨 (upper) 或跌破下轨 (lower) 时触发。
+    params: {'timeframe': '1m', 'period': 20, 'std_dev': 2, 'band': 'upper' | 'lower'}
+    """
+
+    rule_type = "bollinger"
+
+    def indicator_specs(self, params: Dict[str, Any]) -> List[Tuple[str, tuple]]:
+        if params.get("band", "upper") not in ("upper", "lower"):
+            raise ValueError(f"未知布林带轨道: {params.get('band')}")
+        return [("bollinger", (int(params.get("period", 20)), float(params.get("std_dev", 2.0))))]
+
+    def matches(self, indicators: List[object], series: KlineSeries, params: Dict[str, Any]) -> bool:
+        bands = indicators[0]
+        candles = series.closed_candles(2)
+        if len(candles) < 2 or bands.prev_upper is None or bands.upper is None:
+            return False
+        previous_close, close = candles[0].close, candles[1].close
+        if params.get("band", "upper") == "lower":
+            return previous_close >= bands.prev_lower and close < bands.lower
+        return previous_close <= bands.prev_upper and close > bands.upper
+
+
+class AtrAlertEvaluator(IndicatorAlertEvaluator):
+    """
+    ATR 预警，平均真实波幅穿越阈值 (价格单位) 时触发。
+    params: {'timeframe': '1m', 'period': 14, 'condition': 'above' | 'below', 'threshold': 50}
+    """
+
+    rule_type = "atr"
+
+    def parse_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if params.get("condition") not in CONDITION_TEXT:
+            raise ValueError(f"未知条件: {params.get('condition')}")
+        return {**params, "threshold": _parse_threshold(params)}
+
+    def indicator_specs(self, params: Dict[str, Any]) -> List[Tuple[str, tuple]]:
+        return [("atr", (int(params.get("period", 14)),))]
+
+    def matches(self, indicators: List[object], series: KlineSeries, params: Dict[str, Any]) -> bool:
+        atr = indicators[0]
+        return _crossed(atr.previous, atr.value, params["threshold"], params["condition"])
+
+
+def describe_indicator_rule(rule_type: str, params: Dict[str, Any]) -> str:
+    timeframe = params.get("timeframe", "1m")
+    if rule_type == "ma_cross":
+        ma_type = str(params.get("ma_type", "ema")).upper()
+        cross = "死叉" if params.get("direction") == "death" else "金叉"
+        return f"{timeframe} {ma_type}({params.get('fast', 9)}) 与 {ma_type}({params.get('slow', 21)}) {cross}"
+    if rule_type == "rsi":
+        condition = CONDITION_TEXT.get(params.get("condition"), params.get("condition"))
+        return f"{timeframe} RSI({params.get('period', 14)}) {condition} {params.get('threshold')}"
+    if rule_type == "bollinger":
+        band = "跌破下轨" if params.get("band") == "lower" else "突破上轨"
+        return f"{timeframe} 收盘价{band} BOLL({params.get('period', 20)}, {params.get('std_dev', 2.0)})"
+    if rule_type == "atr":
+        condition = CONDITION_TEXT.get(params.get("condition"), params.get("condition"))
+        return f"{timeframe} ATR({params.get('period', 14)}) {condition} {params.get('threshold')}"
+    return str(params)
@@ -0,0 +1,140 @@
+# alert_system/rules/kline_alert_evaluator.py
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+from app_models import AlertRule
+from alert_system.rules.base_alert_evaluator import BaseAlertEvaluator
+from alert_system.kline_engine import Candle, KlineEngine, KlineSeries, TIMEFRAME_MS
+
+logger = logging.getLogger(__name__)
+
+
+def _is_bullish(c: Candle) -> bool:
+    return c.close > c.open
+
+
+def _is_bearish(c: Candle) -> bool:
+    return c.close < c.open
+
+
+def _bullish_engulfing(candles: List[Candle], params: Dict[str, Any]) -> bool:
+    prev, cur = candles[-2], candles[-1]
+    return _is_bearish(prev) and _is_bullish(cur) and cur.open <= prev.close and cur.close >= prev.open
+
+
+def _bearish_engulfing(candles: List[Candle], params: Dict[str, Any]) -> bool:
+    prev, cur = candles[-2], candles[-1]
+    return _is_bullish(prev) and _is_bearish(cur) and cur.open >= prev.close and cur.close <= prev.open
+
+
+def _hammer(candles: List[Candle], params: Dict[str, Any]) -> bool:
+    c = candles[-1]
+    body = abs(c.close - c.open)
+    lower_shadow = min(c.open, c.close) - c.low
+    upper_shadow = c.high - max(c.open, c.close)
+    return c.high > c.low and lower_shadow >= 2 * body and upper_shadow <= body and lower_shadow > 0
+
+
+def _shooting_star(candles: List[Candle], params: Dict[str, Any]) -> bool:
+    c = candles[-1]
+    body = abs(c.close - c.open)
+    lower_shadow = min(c.open, c.close) - c.low
+    upper_shadow = c.high - max(c.open, c.close)
+    return c.high > c.low and upper_shadow >= 2 * body and lower_shadow <= body and upper_shadow > 0
+
+
+def _consecutive_up(candles: List[Candle], params: Dict[str, Any]) -> bool:
+    return all(_is_bullish(c) for c in candles)
+
+
+def _consecutive_down(candles: List[Candle], params: Dict[str, Any]) -> bool:
+    return all(_is_bearish(c) for c in candles)
+
+
+def _big_candle(candles: List[Candle], params: Dict[str, Any]) -> bool:
+    c = candles[-1]
+    return c.open > 0 and abs(c.close - c.open) / c.open * 100 >= float(params.get("min_body_pct", 1.0))
+
+
+def _count_param(params: Dict[str, Any]) -> int:
+    return max(1, int(params.get("count", 3)))
+
+
+# 形态名 -> (描述, 需要的已收盘K线数量, 判断函数)
+KLINE_PATTERNS: Dict[str, Tuple[str, Callable[[Dict[str, Any]], int], Callable[[List[Candle], Dict[str, Any]], bool]]] = {
+    "bullish_engulfing": ("看涨吞没", lambda p: 2, _bullish_engulfing),
+    "bearish_engulfing": ("看跌吞没", lambda p: 2, _bearish_engulfing),
+    "hammer": ("锤子线", lambda p: 1, _hammer),
+    "shooting_star": ("射击之星", lambda p: 1, _shooting_star),
+    "consecutive_up": ("连续阳线", _count_param, _consecutive_up),
+    "consecutive_down": ("连续阴线", _count_param, _consecutive_down),
+    "big_candle": ("大实体K线", lambda p: 1, _big_candle),
+}
+
+
+def describe_kline_rule(params: Dict[str, Any]) -> str:
+    pattern = params.get("pattern")
+    label = KLINE_PATTERNS[pattern][0] if pattern in KLINE_PATTERNS else str(pattern)
+    if pattern in ("consecutive_up", "consecutive_down"):
+        label = f"{_count_param(params)}根{label}"
+    elif pattern == "big_candle":
+        label = f"{label} (实体 ≥ {params.get('min_body_pct', 1.0)}%)"
+    return f"{params.get('timeframe', '1m')} 收盘出现{label}"
+
+
+class KlineAlertEvaluator(BaseAlertEvaluator):
+    """
+    K线形态预警评估器。
+    params: {'timeframe': '1m', 'pattern': 'bullish_engulfing', ...}，形态见 KLINE_PATTERNS。
+    K线由 KlineEngine 从价格合成，规则只在有新K线收盘时按最近收盘的K线判断一次。
+    """
+
+    def __init__(self, engine: KlineEngine):
+        self.engine = engine
+        # 规则对象 -> (K线序列, 已检查过的收盘数)；用对象标识区分规则的不同版本
+        self._rule_state: Dict[int, Tuple[KlineSeries, int]] = {}
+
+    @staticmethod
+    def _timeframe(rule: AlertRule) -> str:
+        timeframe = rule.params.get("timeframe", "1m")
+        if timeframe not in TIMEFRAME_MS:
+            raise ValueError(f"不支持的K线周期: {timeframe}")
+        return timeframe
+
+    def on_rule_loaded(self, rule: AlertRule, inst_id: str):
+        if id(rule) in self._rule_state:
+            return
+        try:
+            series = self.engine.acquire(inst_id, self._timeframe(rule))
+        except ValueError as e:
+            logger.error(f"K线规则 '{rule.name}' (ID: {rule.id}) 参数无效: {e}")
+            return
+        # 只对加载之后收盘的K线判断，不对历史K线补发预警
+        self._rule_state[id(rule)] = (series, series.closed_count)
+
+    def on_rule_removed(self, rule: AlertRule, inst_id: str):
+        state = self._rule_state.pop(id(rule), None)
+        if state is not None:
+            self.engine.release(state[0].inst_id, state[0].timeframe)
+
+    def check(self, data: Dict[str, Any], rule: AlertRule) -> bool:
+        if rule.rule_type != "kline_pattern":
+            return False
+        state = self._rule_state.get(id(rule))
+        if state is None:  # 参数无效，加载时已记录错误
+            return False
+        series, seen = state
+        if series.closed_count == seen:
+            return False
+        self._rule_state[id(rule)] = (series, series.closed_count)
+
+        pattern = rule.params.get("pattern")
+        spec = KLINE_PATTERNS.get(pattern)
+        if spec is None:
+            logger.warning(f"规则 '{rule.name}' (ID: {rule.id}) 包含未知K线形态: {pattern}")
+            return False
+        _, needed, matcher = spec
+        count = needed(rule.params)
+        candles = series.closed_candles(count)
+        if len(candles) < count:
+            return False
+        return matcher(candles, rule.params)
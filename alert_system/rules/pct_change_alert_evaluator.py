@@ -0,0 +1,84 @@
+# alert_system/rules/pct_change_alert_evaluator.py
+import logging
+from typing import Any, Dict, Tuple
+from app_models import AlertRule
+from alert_system.rules.base_alert_evaluator import BaseAlertEvaluator
+from alert_system.price_window import MonotonicWindow, PriceWindowStore
+
+logger = logging.getLogger(__name__)
+
+# 涨跌方向选项
+DIRECTION_TEXT = {"up": "上涨", "down": "下跌", "any": "涨跌"}
+
+
+def describe_pct_change_rule(params: Dict[str, Any]) -> str:
+    direction = DIRECTION_TEXT.get(params.get("direction", "any"), params.get("direction"))
+    return f"{params.get('window_seconds')} 秒内{direction}超过 {params.get('pct')}%"
+
+
+class PctChangeAlertEvaluator(BaseAlertEvaluator):
+    """
+    时间窗口涨跌幅预警。
+    params: {'window_seconds': 60, 'pct': 1.5, 'direction': 'up' | 'down' | 'any'}
+    up: 当前价格相对窗口内最低价的涨幅 ≥ pct；down: 相对窗口内最高价的跌幅 ≥ pct。
+    与价格预警一样只在越过阈值时触发一次，幅度回到阈值以内后重置 (rule.is_threshold_breached)。
+    """
+
+    def __init__(self, store: PriceWindowStore):
+        self.store = store  # 由 AlertProcessor 每个价格更新一次，与其他使用价格窗口的评估器共用
+        # 规则对象 -> (instId, 窗口长度毫秒, 窗口)
+        self._rule_state: Dict[int, Tuple[str, int, MonotonicWindow]] = {}
+
+    def on_rule_loaded(self, rule: AlertRule, inst_id: str):
+        if id(rule) in self._rule_state:
+            return
+        try:
+            window_ms = int(float(rule.params.get("window_seconds")) * 1000)
+            if window_ms <= 0:
+                raise ValueError(f"窗口长度必须大于0: {rule.params.get('window_seconds')}")
+        except (ValueError, TypeError) as e:
+            logger.error(f"涨跌幅规则 '{rule.name}' (ID: {rule.id}) 参数无效: {e}")
+            return
+        self._rule_state[id(rule)] = (inst_id, window_ms, self.store.acquire(inst_id, window_ms))
+
+    def on_rule_removed(self, rule: AlertRule, inst_id: str):
+        state = self._rule_state.pop(id(rule), None)
+        if state is not None:
+            self.store.release(state[0], state[1])
+
+    def check(self, data: Dict[str, Any], rule: AlertRule) -> bool:
+        if rule.rule_type != "pct_change":
+            return False
+        state = self._rule_state.get(id(rule))
+        if state is None:  # 参数无效，加载时已记录错误
+            return False
+        window = state[2]
+        price = data.get("price")
+        low, high = window.min, window.max
+        if price is None or low is None or high is None:
+            return False
+
+        try:
+            pct = float(rule.params.get("pct"))
+        except (ValueError, TypeError) as e:
+            logger.error(f"规则 '{rule.name}' (ID: {rule.id}) 参数无效: {rule.params}. 错误: {e}")
+            return False
+        direction = rule.params.get("direction", "any")
+        rise = (price - low) / low * 100 if low > 0 else 0.0
+        fall = (high - price) / high * 100 if high > 0 else 0.0
+        if direction == "up":
+            exceeded = rise >= pct
+        elif direction == "down":
+            exceeded = fall >= pct
+        elif direction == "any":
+            exceeded = rise >= pct or fall >= pct
+        else:
+            logger.warning(f"规则 '{rule.name}' (ID: {rule.id}) 包含未知方向: {direction}")
+            return False
+
+        if exceeded and not rule.is_threshold_breached:
+            rule.is_threshold_breached = True
+            return True
+        if not exceeded and rule.is_threshold_breached:
+            rule.is_threshold_breached = False  # 幅度回到阈值以内，重置
+        return False
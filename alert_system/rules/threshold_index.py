@@ -0,0 +1,83 @@
+# alert_system/rules/threshold_index.py
+import bisect
+from typing import List, Optional, Set, Tuple
+from app_models import AlertRule
+
+
+class PriceThresholdIndex:
+    """
+    单个交易对的价格预警阈值索引。
+
+    价格预警每次被评估后，is_threshold_breached 总等于 "当前价格是否越过阈值"
+    (above: price > threshold, below: price < threshold)。因此已按上一个价格评估过的规则，
+    只有阈值落在上一个价格与当前价格之间的才可能改变状态，用二分查找即可找到，每次 O(log n + k)。
+
+    以下规则的状态可能与上一个价格不一致，每次都需要完整评估，记为 pending:
+    刚加载 (尚未评估过)、因冷却/禁用/出错被跳过的规则。无法建立索引的规则 (非价格预警或参数无效) 每次都评估。
+    返回的都是规则在列表中的下标。
+    """
+
+    def __init__(self, rules: List[AlertRule]):
+        above: List[Tuple[float, int]] = []
+        below: List[Tuple[float, int]] = []
+        self.always: List[int] = []
+        for position, rule in enumerate(rules):
+            threshold = self._parse_threshold(rule)
+            condition = rule.params.get("condition") if rule.rule_type == "price_alert" else None
+            if threshold is None or condition not in ("above", "below"):
+                self.always.append(position)
+            elif condition == "above":
+                above.append((threshold, position))
+            else:
+                below.append((threshold, position))
+        above.sort()
+        below.sort()
+        self._above_thresholds = [t for t, _ in above]
+        self._above_positions = [p for _, p in above]
+        self._below_thresholds = [t for t, _ in below]
+        self._below_positions = [p for _, p in below]
+        self._indexed: Set[int] = set(self._above_positions) | set(self._below_positions)
+        self.pending: Set[int] = set(self._indexed)
+        self.last_price: Optional[float] = None
+
+    @staticmethod
+    def _parse_threshold(rule: AlertRule) -> Optional[float]:
+        if rule.rule_type != "price_alert":
+            return None
+        try:
+            return float(rule.params.get("threshold_price"))
+        except (ValueError, TypeError):
+            return None
+
+    def candidates(self, price: float) -> List[int]:
+        """返回本次价格需要评估的规则下标 (按规则原有顺序)。"""
+        last = self.last_price
+        crossed: List[int] = []
+        if last is not None and price != last:
+            low, high = (last, price) if price > last else (price, last)
+            # above: 状态在 low <= threshold < high 时改变
+            start = bisect.bisect_left(self._above_thresholds, low)
+            end = bisect.bisect_left(self._above_thresholds, high)
+            crossed.extend(self._above_positions[start:end])
+            # below: 状态在 low < threshold <= high 时改变
+            start = bisect.bisect_right(self._below_thresholds, low)
+            end = bisect.bisect_right(self._below_thresholds, high)
+            crossed.extend(self._below_positions[start:end])
+        if not crossed and not self.pending and not self.always:
+            return crossed
+        positions = set(crossed)
+        positions.update(self.pending)
+        positions.update(self.always)
+        return sorted(positions)
+
+    def settle(self, position: int, evaluated: bool):
+        """记录规则本次是否已按当前价格完成评估；被跳过的规则留到之后继续评估。"""
+        if position not in self._indexed:
+            return
+        if evaluated:
+            self.pending.discard(position)
+        else:
+            self.pending.add(position)
+
+    def advance(self, price: float):
+        self.last_price = price
@@ -0,0 +1,157 @@
+# alert_system/runtime_snapshot.py
+# 运行时状态快照: 定期把各规则的内存状态 (最后触发时间、是否已越过阈值) 与最新标记价格写入一个紧凑的 JSON 文件
+# (先写临时文件再 os.replace，崩溃时不会留下半个文件)；启动时一次性恢复，避免重启后已越过阈值的规则重复触发、冷却丢失。
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AbstractSet, Any, Dict, Optional, TYPE_CHECKING
+import db_manager
+from config import RUNTIME_SNAPSHOT_PATH, RUNTIME_SNAPSHOT_INTERVAL
+
+if TYPE_CHECKING:
+    from alert_system.alert_processor import AlertProcessor
+    from ws_util.public_channel_manager import PublicChannelManager
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def _dumps(state: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(state)
+    return json.dumps(state, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def capture_snapshot(processor: "AlertProcessor",
+                     channel_manager: Optional["PublicChannelManager"] = None) -> Dict[str, Any]:
+    """
+    收集当前的运行时状态 (在事件循环中调用，只读取内存，不做 I/O):
+      rules:  [[规则ID, 最后触发时间或 null, 是否已越过阈值 (0/1)], ...]，只包含非默认状态的规则
+      prices: {instId: [标记价格字符串, 交易所时间戳毫秒或 null]}
+    """
+    rules = [[rule_id, last_triggered, int(breached)]
+             for rule_id, (last_triggered, breached) in processor.export_rule_state().items()]
+    prices = channel_manager.export_prices() if channel_manager is not None else {}
+    return {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "rules": rules, "prices": prices}
+
+
+def save_snapshot(state: Dict[str, Any], path: str = RUNTIME_SNAPSHOT_PATH):
+    """原子写入快照: 写入同目录下的临时文件并 fsync，再 os.replace 覆盖旧文件。"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_dumps(state))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str = RUNTIME_SNAPSHOT_PATH) -> Optional[Dict[str, Any]]:
+    """读取快照，文件不存在、损坏或版本不符时返回 None。"""
+    try:
+        with open(path, "rb") as f:
+            state = _loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取运行时快照 '{path}' 失败，忽略: {e}")
+        return None
+    if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+        logger.warning(f"运行时快照 '{path}' 版本不符，忽略。")
+        return None
+    return state
+
+
+def restore_snapshot(state: Dict[str, Any], processor: "AlertProcessor",
+                     channel_manager: Optional["PublicChannelManager"] = None,
+                     rule_ids: Optional[AbstractSet[int]] = None):
+    """
+    把快照恢复到预警处理器 (规则状态) 和频道管理器 (最新价格)，应在加载规则、收到第一个价格之前调用。
+    rule_ids 为当前会加载的规则 ID，其余规则 (快照之后已删除或停用) 的状态被丢弃；None 表示不过滤。
+    """
+    rule_state = {}
+    skipped = 0
+    for entry in state.get("rules", []):
+        try:
+            rule_id, last_triggered, breached = entry
+            rule_id = int(rule_id)
+            value = (None if last_triggered is None else float(last_triggered), bool(breached))
+        except (TypeError, ValueError):
+            continue
+        if rule_ids is not None and rule_id not in rule_ids:
+            skipped += 1
+            continue
+        rule_state[rule_id] = value
+    processor.restore_rule_state(rule_state)
+    prices = state.get("prices") or {}
+    if channel_manager is not None and prices:
+        channel_manager.restore_prices(prices)
+    age = time.time() - state.get("saved_at", time.time())
+    logger.info(f"已恢复运行时快照: {len(rule_state)} 条规则状态 (丢弃 {skipped} 条已删除/停用规则), "
+                f"{len(prices)} 个价格 (快照时间 {age:.0f} 秒前)")
+
+
+class RuntimeSnapshotter:
+    """每隔 interval 秒保存一次快照 (收集在事件循环中，序列化与写文件在线程池中)，stop 时保存最后一次。"""
+
+    def __init__(self, processor: "AlertProcessor",
+                 channel_manager: Optional["PublicChannelManager"] = None,
+                 path: str = RUNTIME_SNAPSHOT_PATH,
+                 interval: float = RUNTIME_SNAPSHOT_INTERVAL):
+        self.processor = processor
+        self.channel_manager = channel_manager
+        self.path = path
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.saves = 0
+        self.last_save_ms: Optional[float] = None
+
+    def restore(self) -> bool:
+        """读取并恢复快照，返回是否恢复成功。"""
+        state = load_snapshot(self.path)
+        if state is None:
+            return False
+        restore_snapshot(state, self.processor, self.channel_manager, db_manager.get_active_alert_rule_ids())
+        return True
+
+    async def save(self):
+        state = capture_snapshot(self.processor, self.channel_manager)
+        started_at = time.perf_counter()
+        try:
+            await asyncio.to_thread(save_snapshot, state, self.path)
+        except OSError as e:
+            logger.error(f"保存运行时快照 '{self.path}' 失败: {e}")
+            return
+        self.saves += 1
+        self.last_save_ms = (time.perf_counter() - started_at) * 1000
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.error(f"保存运行时快照时出错: {e}", exc_info=True)
+
+    def start(self):
+        """启动定期保存任务 (需在事件循环中调用，可重复调用)。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.save()
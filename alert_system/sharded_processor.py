@@ -0,0 +1,472 @@
+# alert_system/sharded_processor.py
+# 多进程预警评估: 交易对按分片分配给若干工作进程，每个工作进程内运行一个 AlertProcessor。
+# 接收行情的主进程只把价格写入共享内存价格表 (按交易对槽位索引) 并唤醒对应的工作进程，
+# 工作进程评估自己分片中价格有变化的交易对，触发的通知与事件经结果队列交回主进程发送/写入。
+# 同一交易对两次评估之间到达的价格只评估最新的一个 (与批量评估模式相同)。
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app_models import AlertRule, AlertEvent
+from db_manager import get_alert_rules_for_pair, get_trading_pair_by_id
+from alert_system.alert_event_writer import AlertEventWriter
+from alert_system.notification_dispatcher import NotificationDispatcher
+from alert_system.notification_router import NotificationRouter
+from config import (ALERT_WORKER_PROCESSES, ALERT_WORKER_MAX_PAIRS, ALERT_WORKER_STATE_SYNC_INTERVAL,
+                    ALERT_WORKER_REBALANCE_RATIO, ALERT_EVENT_HISTORY)
+
+logger = logging.getLogger(__name__)
+
+# 工作进程等待唤醒的最长时间(秒)，也是命令的最大处理延迟
+_WORKER_IDLE_TIMEOUT = 0.05
+
+
+class SharedPriceTable:
+    """
+    共享内存中的价格表: 每个槽位一个 (价格, 交易所时间戳毫秒, 版本号)。
+    只有主进程写入；版本号写入前后各加一 (写入中为奇数)，读取方版本号不一致时重读，不会读到一半的更新。
+    """
+
+    def __init__(self, capacity: int, name: Optional[str] = None):
+        self.capacity = capacity
+        size = capacity * 24
+        self._shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.name = self._shm.name
+        buf = self._shm.buf
+        self._prices = buf[:capacity * 8].cast("d")
+        self._ts = buf[capacity * 8:capacity * 16].cast("q")
+        self._versions = buf[capacity * 16:capacity * 24].cast("Q")
+
+    def write(self, slot: int, price: float, ts_ms: int):
+        versions = self._versions
+        version = versions[slot]
+        versions[slot] = version + 1
+        self._prices[slot] = price
+        self._ts[slot] = ts_ms
+        versions[slot] = version + 2
+
+    def version(self, slot: int) -> int:
+        return self._versions[slot]
+
+    def read(self, slot: int) -> Tuple[float, int, int]:
+        """返回 (价格, 时间戳, 版本号)。"""
+        versions = self._versions
+        while True:
+            version = versions[slot]
+            if version & 1:
+                continue
+            price, ts_ms = self._prices[slot], self._ts[slot]
+            if versions[slot] == version:
+                return price, ts_ms, version
+
+    def close(self, unlink: bool = False):
+        for view in (self._prices, self._ts, self._versions):
+            view.release()
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+class _QueueNotifier:
+    """工作进程中的 notifier: 通知交回主进程发送。"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def __call__(self, **kwargs):
+        self.results.put(("alert", kwargs))
+
+
+class _QueueEventRecorder:
+    """工作进程中的 event_writer: 预警事件交回主进程批量写入。"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def record(self, event: AlertEvent):
+        self.results.put(("event", event.model_dump()))
+
+
+def _worker_main(worker_index: int, table_name: str, capacity: int, commands, results, wakeup,
+                 state_sync_interval: float):
+    """工作进程入口: 处理规则命令，评估分片中价格有变化的交易对，定期上报规则状态。"""
+    from alert_system.alert_processor import AlertProcessor  # 在子进程中导入
+
+    table = SharedPriceTable(capacity, name=table_name)
+    processor = AlertProcessor(notifier=_QueueNotifier(results), batch_interval=None, record_events=False)
+    processor.event_writer = _QueueEventRecorder(results)
+    slots: Dict[int, int] = {}  # pair_id -> 槽位
+    seen: Dict[int, int] = {}  # pair_id -> 已评估的版本号
+    evaluated = 0
+    processed = 0  # 已处理的命令数，随规则状态上报，主进程据此判断哪些命令已生效
+    next_sync = time.monotonic() + state_sync_interval
+    running = True
+    try:
+        while running:
+            wakeup.wait(_WORKER_IDLE_TIMEOUT)
+            wakeup.clear()
+            while True:
+                try:
+                    command = commands.get_nowait()
+                except queue.Empty:
+                    break
+                processed += 1
+                kind = command[0]
+                if kind == "set_rules":
+                    _, pair_id, inst_id, slot, rules = command
+                    processor.set_rules_for_pair(pair_id, inst_id, [AlertRule(**rule) for rule in rules])
+                    if slots.get(pair_id) != slot:
+                        slots[pair_id] = slot
+                        seen[pair_id] = table.version(slot)  # 只评估分配之后到达的价格
+                elif kind == "update_rule":
+                    processor.update_rule_in_cache(AlertRule(**command[1]))
+                elif kind == "remove":
+                    _, pair_id, handoff, slot = command
+                    state = {}
+                    if handoff:  # 迁移到其他工作进程: 带上规则状态
+                        rule_ids = {rule.id for rule in processor._active_rules_by_pair_id.get(pair_id, [])}
+                        state = {rule_id: value for rule_id, value in processor.export_rule_state().items()
+                                 if rule_id in rule_ids}
+                    processor.remove_rules_for_pair(pair_id)
+                    slots.pop(pair_id, None)
+                    seen.pop(pair_id, None)
+                    if handoff:
+                        results.put(("handoff", pair_id, state))
+                    else:  # 之后不再读取该槽位，主进程可以把它分配给其他交易对
+                        results.put(("released", slot))
+                elif kind == "restore":
+                    processor.restore_rule_state(command[1])
+                elif kind == "stop":
+                    running = False
+                    break
+
+            for pair_id, slot in slots.items():
+                if table.version(slot) != seen[pair_id]:
+                    price, ts_ms, version = table.read(slot)
+                    seen[pair_id] = version
+                    processor.process_price_data(pair_id, price, ts_ms)
+                    evaluated += 1
+
+            now = time.monotonic()
+            if now >= next_sync or not running:
+                results.put(("state", worker_index, processor.export_rule_state(), evaluated, processed))
+                next_sync = now + state_sync_interval
+    finally:
+        table.close()
+
+
+class ShardedAlertProcessor:
+    """
+    与 AlertProcessor 接口相同的多进程版本 (规则加载/更新/移除、process_price_data、start/stop、规则状态导出/恢复)。
+
+    每个交易对占用共享价格表的一个槽位，并分配给当前规则数最少的工作进程；移除交易对后若最重与最轻分片的
+    规则数之比超过 rebalance_ratio，则把交易对从最重的分片迁移到最轻的分片 (连同规则状态)。
+    通知与事件写入在主进程中进行，与 AlertProcessor 相同。
+    """
+
+    def __init__(self, workers: int = ALERT_WORKER_PROCESSES,
+                 notifier: Optional[Callable[..., Any]] = None,
+                 max_pairs: int = ALERT_WORKER_MAX_PAIRS,
+                 state_sync_interval: float = ALERT_WORKER_STATE_SYNC_INTERVAL,
+                 rebalance_ratio: float = ALERT_WORKER_REBALANCE_RATIO,
+                 record_events: bool = ALERT_EVENT_HISTORY):
+        self.notifier = notifier if notifier is not None else NotificationRouter.from_config()
+        self.event_writer = AlertEventWriter() if record_events else None
+        self.rebalance_ratio = rebalance_ratio
+        self.table = SharedPriceTable(max_pairs)
+        self._free_slots = deque(range(max_pairs))
+        self._releasing_slots = set()  # 已移除交易对的槽位，等待原工作进程确认不再读取后才放回空闲列表
+        self._slots: Dict[int, int] = {}  # pair_id -> 槽位
+        self._owner: Dict[int, int] = {}  # pair_id -> 工作进程序号 (迁移中的交易对不在其中)
+        self._in_transit: Dict[int, int] = {}  # 迁移中的 pair_id -> 目标工作进程序号
+        self._rules: Dict[int, List[AlertRule]] = {}  # 各交易对的启用规则 (发送给工作进程的权威副本)
+        self._instId_map: Dict[int, str] = {}
+        self._worker_rule_state: List[Dict[int, tuple]] = []  # 各工作进程最近上报的规则状态
+        self._restored_rule_state: Dict[int, tuple] = {}  # 恢复的规则状态中尚未发送给工作进程的部分 (规则未加载)
+        # 各工作进程: 已发送、尚未反映在其上报中的恢复状态 (规则ID -> (命令序号, 状态))
+        self._restore_in_flight: List[Dict[int, Tuple[int, tuple]]] = []
+        self._sent_commands: List[int] = []  # 发送给各工作进程的命令数
+        self._evaluated: List[int] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._stopped = False  # stop() 之后共享价格表已释放，不再接受价格与规则变更
+
+        context = multiprocessing.get_context("spawn")  # 不复制主进程的事件循环与线程
+        self._results = context.Queue()
+        self._commands = []
+        self._wakeups = []
+        self._processes = []
+        for index in range(max(1, workers)):
+            commands, wakeup = context.Queue(), context.Event()
+            process = context.Process(target=_worker_main, name=f"alert-worker-{index}", daemon=True,
+                                      args=(index, self.table.name, max_pairs, commands, self._results, wakeup,
+                                            state_sync_interval))
+            process.start()
+            self._commands.append(commands)
+            self._wakeups.append(wakeup)
+            self._processes.append(process)
+            self._worker_rule_state.append({})
+            self._restore_in_flight.append({})
+            self._sent_commands.append(0)
+            self._evaluated.append(0)
+        logger.info(f"多进程预警评估已启动: {len(self._processes)} 个工作进程, 价格表容量 {max_pairs}")
+
+    # --- 命令 ---
+    def _send(self, worker: int, *command):
+        self._sent_commands[worker] += 1
+        self._commands[worker].put(command)
+        self._wakeups[worker].set()
+
+    def _worker_loads(self) -> List[int]:
+        loads = [0] * len(self._processes)
+        for pair_id, worker in self._owner.items():
+            loads[worker] += len(self._rules.get(pair_id, []))
+        for pair_id, worker in self._in_transit.items():
+            loads[worker] += len(self._rules.get(pair_id, []))
+        return loads
+
+    def _assign(self, pair_id: int, inst_id: str):
+        """发送交易对的规则到其工作进程，新交易对分配槽位和规则数最少的工作进程。"""
+        if pair_id in self._in_transit:  # 迁移完成时会发送最新的规则
+            return
+        worker = self._owner.get(pair_id)
+        if worker is None:
+            if not self._free_slots:
+                logger.error(f"共享价格表已满 ({self.table.capacity})，无法评估交易对 {inst_id} (ID: {pair_id})。")
+                return
+            loads = self._worker_loads()
+            worker = loads.index(min(loads))
+            self._slots[pair_id] = self._free_slots.popleft()
+            self._owner[pair_id] = worker
+        self._send_restored(worker, pair_id)
+        self._send(worker, "set_rules", pair_id, inst_id, self._slots[pair_id],
+                   [rule.model_dump() for rule in self._rules[pair_id]])
+
+    def _rebalance(self):
+        """最重与最轻分片的规则数之比超过阈值时，把一个交易对从最重的分片迁移到最轻的分片。"""
+        if len(self._processes) < 2 or self._in_transit:
+            return
+        loads = self._worker_loads()
+        heaviest, lightest = loads.index(max(loads)), loads.index(min(loads))
+        if loads[heaviest] <= max(1, loads[lightest]) * self.rebalance_ratio:
+            return
+        gap = loads[heaviest] - loads[lightest]
+        # 选择迁移后最能缩小差距的交易对
+        best = None
+        for pair_id, worker in self._owner.items():
+            size = len(self._rules.get(pair_id, []))
+            if worker == heaviest and 0 < size < gap and (best is None or abs(gap - 2 * size) < best[1]):
+                best = (pair_id, abs(gap - 2 * size))
+        if best is None:
+            return
+        pair_id = best[0]
+        del self._owner[pair_id]
+        self._in_transit[pair_id] = lightest
+        self._send(heaviest, "remove", pair_id, True, self._slots[pair_id])
+        logger.info(f"交易对 {self._instId_map.get(pair_id)} 从工作进程 {heaviest} 迁移到 {lightest}")
+
+    def _complete_handoff(self, pair_id: int, state: Dict[int, tuple]):
+        worker = self._in_transit.pop(pair_id, None)
+        if worker is None:
+            return
+        if pair_id not in self._rules:  # 迁移期间已被移除，原工作进程已不再读取该槽位
+            slot = self._slots.pop(pair_id, None)
+            if slot is not None:
+                self._free_slots.append(slot)
+        else:
+            self._owner[pair_id] = worker
+            if state:
+                self._send_restore(worker, state)
+            self._assign(pair_id, self._instId_map[pair_id])
+        self._rebalance()
+
+    def _send_restore(self, worker: int, state: Dict[int, tuple]):
+        self._send(worker, "restore", state)
+        seq = self._sent_commands[worker]
+        in_flight = self._restore_in_flight[worker]
+        for rule_id, value in state.items():
+            in_flight[rule_id] = (seq, value)
+
+    def _send_restored(self, worker: int, pair_id: int):
+        """把恢复状态中属于该交易对规则的部分发送给负责的工作进程 (在规则之前发送，加载时应用)。"""
+        if not self._restored_rule_state:
+            return
+        pending = self._restored_rule_state
+        state = {rule.id: pending.pop(rule.id) for rule in self._rules.get(pair_id, []) if rule.id in pending}
+        if state:
+            self._send_restore(worker, state)
+
+    # --- 与 AlertProcessor 相同的接口 ---
+    def load_rules_for_pair(self, pair_id: int, inst_id: str):
+        """为指定的交易对加载其启用的预警规则并发送到工作进程。"""
+        if self._stopped:
+            return
+        self.set_rules_for_pair(pair_id, inst_id, get_alert_rules_for_pair(pair_id))
+        logger.info(f"为交易对 {inst_id} (ID: {pair_id}) 加载了 {len(self._rules[pair_id])} 条启用规则。")
+
+    def set_rules_for_pair(self, pair_id: int, inst_id: str, rules: List[AlertRule]):
+        if self._stopped:
+            return
+        self._rules[pair_id] = [rule for rule in rules if rule.is_enabled]
+        self._instId_map[pair_id] = inst_id
+        self._assign(pair_id, inst_id)
+
+    def remove_rules_for_pair(self, pair_id: int):
+        if self._stopped:
+            return
+        self._rules.pop(pair_id, None)
+        self._instId_map.pop(pair_id, None)
+        worker = self._owner.pop(pair_id, None)
+        if worker is not None:
+            slot = self._slots.pop(pair_id)
+            self._releasing_slots.add(slot)
+            self._send(worker, "remove", pair_id, False, slot)
+        self._rebalance()
+        logger.info(f"移除了交易对ID {pair_id} 的缓存规则。")
+
+    def update_rule_in_cache(self, rule: AlertRule):
+        if self._stopped:
+            return
+        pair_id = rule.pair_id
+        if pair_id not in self._instId_map:
+            trading_pair = get_trading_pair_by_id(pair_id)
+            if not trading_pair:
+                logger.warning(f"更新规则缓存失败：找不到pair_id {pair_id} 对应的交易对。")
+                return
+            self._instId_map[pair_id] = trading_pair.instId
+        rules = [r for r in self._rules.get(pair_id, []) if r.id != rule.id]
+        if rule.is_enabled:
+            rules.append(rule)
+        self._rules[pair_id] = rules
+        worker = self._owner.get(pair_id)
+        if worker is not None:
+            self._send_restored(worker, pair_id)
+            self._send(worker, "update_rule", rule.model_dump())
+        else:
+            self._assign(pair_id, self._instId_map[pair_id])
+
+    def process_price_data(self, pair_id: int, current_price_str: str, ts_ms: Optional[int] = None):
+        """把价格写入共享价格表并唤醒负责该交易对的工作进程。"""
+        slot = self._slots.get(pair_id)
+        if slot is None or self._stopped:
+            return
+        try:
+            price = float(current_price_str)
+        except ValueError:
+            logger.error(f"无法将价格 '{current_price_str}' 转换为浮点数，交易对ID: {pair_id}")
+            return
+        self.table.write(slot, price, ts_ms if ts_ms is not None else int(time.time() * 1000))
+        worker = self._owner.get(pair_id)
+        if worker is not None:
+            self._wakeups[worker].set()
+
+    def _reported_state(self, worker: int, rule_id: int) -> Optional[tuple]:
+        in_flight = self._restore_in_flight[worker].get(rule_id)
+        return in_flight[1] if in_flight is not None else self._worker_rule_state[worker].get(rule_id)
+
+    def export_rule_state(self) -> Dict[int, tuple]:
+        """
+        各交易对规则的状态取自负责该交易对的工作进程最近一次上报 (最多滞后 state_sync_interval 秒)，
+        迁移中的交易对取自任一上报；另加尚未发送给工作进程的恢复状态。
+        """
+        state = dict(self._restored_rule_state)
+        all_workers = range(len(self._processes))
+        for pair_id, rules in self._rules.items():
+            owner = self._owner.get(pair_id)
+            workers = all_workers if owner is None else (owner,)
+            for rule in rules:
+                for worker in workers:
+                    value = self._reported_state(worker, rule.id)
+                    if value is not None:
+                        state[rule.id] = value
+                        break
+        return state
+
+    def restore_rule_state(self, state: Dict[int, tuple]):
+        """恢复规则状态: 每个工作进程只收到自己负责的交易对的规则状态，其余的在交易对分配时发送。"""
+        self._restored_rule_state.update(state)
+        for pair_id, worker in self._owner.items():
+            self._send_restored(worker, pair_id)
+
+    # --- 结果 ---
+    def _read_results(self):
+        """在后台线程中读取结果队列，交给事件循环处理。"""
+        while True:
+            message = self._results.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._handle_result, message)
+
+    def _handle_result(self, message: tuple):
+        kind = message[0]
+        try:
+            if kind == "alert":
+                self.notifier(**message[1])
+            elif kind == "event":
+                if self.event_writer is not None:
+                    self.event_writer.record(AlertEvent(**message[1]))
+            elif kind == "state":
+                _, worker, state, evaluated, processed = message
+                self._worker_rule_state[worker] = state
+                self._evaluated[worker] = evaluated
+                in_flight = self._restore_in_flight[worker]
+                if in_flight:  # 上报之前已处理的恢复命令已包含在上报中
+                    for rule_id in [rule_id for rule_id, (seq, _) in in_flight.items() if seq <= processed]:
+                        del in_flight[rule_id]
+            elif kind == "released":
+                slot = message[1]
+                if slot in self._releasing_slots:
+                    self._releasing_slots.discard(slot)
+                    self._free_slots.append(slot)
+            elif kind == "handoff":
+                self._complete_handoff(message[1], message[2])
+        except Exception as e:
+            logger.error(f"处理工作进程结果时出错: {e}", exc_info=True)
+
+    def start(self):
+        """启动结果读取线程、通知分发协程和预警事件写入协程 (需在事件循环中调用)。"""
+        if isinstance(self.notifier, (NotificationDispatcher, NotificationRouter)):
+            self.notifier.start()
+        if self.event_writer is not None:
+            self.event_writer.start()
+        if self._reader is None:
+            self._loop = asyncio.get_running_loop()
+            self._reader = threading.Thread(target=self._read_results, name="alert-worker-results", daemon=True)
+            self._reader.start()
+
+    async def stop(self, timeout: float = 5.0):
+        """停止工作进程 (等待其上报最后的规则状态)，再发送完剩余的通知与事件。"""
+        if self._stopped:
+            return
+        self._stopped = True
+        for worker in range(len(self._processes)):
+            self._send(worker, "stop")
+        for process in self._processes:
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"工作进程 {process.name} 未能按时退出，强制终止。")
+                process.terminate()
+        if self._reader is not None:
+            self._results.put(None)
+            await asyncio.to_thread(self._reader.join, timeout)
+            self._reader = None
+            await asyncio.sleep(0)  # 处理读取线程最后交来的结果
+        if isinstance(self.notifier, (NotificationDispatcher, NotificationRouter)):
+            await self.notifier.stop()
+        if self.event_writer is not None:
+            await self.event_writer.stop()
+        self.table.close(unlink=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._processes),
+            "pairs": len(self._slots),
+            "rules_per_worker": self._worker_loads(),
+            "evaluated_per_worker": list(self._evaluated),
+            "in_transit": len(self._in_transit),
+        }
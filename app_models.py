@@ -39,4 +39,19 @@ class AlertRule(BaseModel):
 
     def update_last_triggered(self):
         """更新最后触发时间为当前时间"""
-        self.last_triggered_timestamp = time.time()
\ No newline at end of file
+        self.last_triggered_timestamp = time.time()
+
+class AlertEvent(BaseModel):
+    # 预警触发事件 (alert_events 表)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    ts: float = Field(..., description="触发时间 (Unix 时间戳，秒)")
+    rule_id: Optional[int] = Field(default=None, description="触发的规则ID")
+    pair_id: Optional[int] = Field(default=None, description="关联的TradingPair的ID")
+    instId: str = Field(..., description="交易对ID")
+    rule_name: str = Field(..., description="触发时的规则名称")
+    rule_type: str = Field(..., description="规则类型")
+    price: Optional[float] = Field(default=None, description="触发时的价格")
+    message: Optional[str] = Field(default=None, description="通知内容")
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,94 @@
+# benchmarks/bench_batch_rules.py
+# 价格预警批量评估基准: 对比逐条 PriceAlertEvaluator.check (原 process_price_data 的循环) 与 NumPy 向量化评估的每秒规则数。
+# 每轮所有交易对都有新价格，即每条规则每轮都参与评估。
+# 运行: python -m benchmarks.bench_batch_rules [规则数 ...]   (默认 10000 100000 1000000；逐条评估只测到 100000 条)
+import logging
+import random
+import sys
+import time
+from app_models import AlertRule
+from alert_system.rules.batch_price_evaluator import BatchPriceEvaluator, NUMPY_AVAILABLE, np
+from alert_system.rules.price_alert_evaluator import PriceAlertEvaluator
+
+BASELINE_MAX_RULES = 100_000
+ROUNDS = 5
+
+
+def _pair_count(rule_count: int) -> int:
+    return max(100, rule_count // 100)
+
+
+def _make_rules(rule_count: int):
+    pairs = _pair_count(rule_count)
+    rules_by_pair = {pair_id: [] for pair_id in range(pairs)}
+    for i in range(rule_count):
+        pair_id = i % pairs
+        rules_by_pair[pair_id].append(AlertRule(
+            id=i, pair_id=pair_id, name=f"rule-{i}", rule_type="price_alert", cooldown_seconds=0,
+            params={"threshold_price": random.uniform(95, 105), "condition": random.choice(["above", "below"])}))
+    return rules_by_pair
+
+
+def _make_price_rounds(pairs: int):
+    return [[random.uniform(94, 106) for _ in range(pairs)] for _ in range(ROUNDS)]
+
+
+def baseline(rules_by_pair, price_rounds) -> float:
+    """原实现: 每个交易对每个价格遍历全部规则，逐条检查冷却并调用 check。"""
+    evaluator = PriceAlertEvaluator()
+    started_at = time.perf_counter()
+    for prices in price_rounds:
+        for pair_id, rules in rules_by_pair.items():
+            data = {"price": prices[pair_id]}
+            for rule in rules:
+                if not rule.is_enabled or rule.is_in_cooldown():
+                    continue
+                if evaluator.check(data, rule):
+                    rule.update_last_triggered()
+    return time.perf_counter() - started_at
+
+
+def _make_arrays(rule_count: int):
+    pairs = _pair_count(rule_count)
+    evaluator = BatchPriceEvaluator(
+        pair_slots=np.arange(rule_count) % pairs,
+        thresholds=np.random.uniform(95, 105, rule_count),
+        is_above=np.random.rand(rule_count) < 0.5,
+        breached=np.zeros(rule_count, dtype=bool),
+        last_triggered=np.full(rule_count, np.nan),
+        cooldown_seconds=np.zeros(rule_count),
+        pair_count=pairs,
+    )
+    return evaluator, pairs
+
+
+def vectorized(evaluator: BatchPriceEvaluator, price_rounds) -> float:
+    updated = np.ones(evaluator.pair_count, dtype=bool)
+    price_arrays = [np.asarray(prices, dtype=np.float64) for prices in price_rounds]
+    started_at = time.perf_counter()
+    for prices in price_arrays:
+        evaluator.evaluate(prices, updated, time.time())
+    return time.perf_counter() - started_at
+
+
+def main():
+    if not NUMPY_AVAILABLE:
+        print("需要安装 numpy: pip install numpy")
+        return
+    logging.disable(logging.CRITICAL)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'规则数':>10} {'交易对':>8} {'逐条评估 规则/秒':>18} {'向量化 规则/秒':>16} {'加速':>8}")
+    for rule_count in sizes:
+        pairs = _pair_count(rule_count)
+        price_rounds = _make_price_rounds(pairs)
+        evaluator, _ = _make_arrays(rule_count)
+        after = rule_count * ROUNDS / vectorized(evaluator, price_rounds)
+        if rule_count <= BASELINE_MAX_RULES:
+            before = rule_count * ROUNDS / baseline(_make_rules(rule_count), price_rounds)
+            print(f"{rule_count:>10,} {pairs:>8,} {before:>18,.0f} {after:>16,.0f} {after / before:>7.1f}x")
+        else:
+            print(f"{rule_count:>10,} {pairs:>8,} {'-':>18} {after:>16,.0f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_compiled_rules.py
+# 编译后规则基准: 对比逐条评估 Pydantic AlertRule (构造行情字典 + is_in_cooldown + PriceAlertEvaluator.check)
+# 与 CompiledPriceRule.evaluate 的单价格评估耗时，以及每条规则的内存占用。
+# 每个价格评估全部规则 (规则刚加载、尚未建立索引状态时的最坏情况)。
+# 运行: python -m benchmarks.bench_compiled_rules [规则数]   (默认 100000)
+import gc
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from app_models import AlertRule
+from alert_system.rules.compiled_rule import CompiledPriceRule
+from alert_system.rules.price_alert_evaluator import PriceAlertEvaluator
+
+TICKS = 20
+
+
+def _make_rules(rule_count: int):
+    return [AlertRule(id=i, pair_id=1, name=f"rule-{i}", rule_type="price_alert", cooldown_seconds=0,
+                      params={"threshold_price": random.uniform(95, 105), "condition": random.choice(["above", "below"])})
+            for i in range(rule_count)]
+
+
+def _measure_memory(build):
+    """返回 (构建结果, 分配的字节数)。"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def baseline(rules, prices) -> float:
+    """原实现: 每条规则构造行情字典、检查冷却 (各调用一次 time.time())、check 中解析参数。"""
+    evaluator = PriceAlertEvaluator()
+    started_at = time.perf_counter()
+    for price in prices:
+        for rule in rules:
+            if not rule.is_enabled or rule.is_in_cooldown():
+                continue
+            if evaluator.check({"price": price}, rule):
+                rule.update_last_triggered()
+    return time.perf_counter() - started_at
+
+
+def compiled(records, prices) -> float:
+    started_at = time.perf_counter()
+    for price in prices:
+        now = time.time()
+        for record in records:
+            record.evaluate(price, now)
+    return time.perf_counter() - started_at
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    rule_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    prices = [random.uniform(94, 106) for _ in range(TICKS)]
+
+    rules, rules_bytes = _measure_memory(lambda: _make_rules(rule_count))
+    records, records_bytes = _measure_memory(lambda: [CompiledPriceRule.compile(rule) for rule in rules])
+
+    before = baseline(rules, prices) / TICKS
+    for rule in rules:  # 两种实现从相同的状态开始
+        rule.is_threshold_breached = False
+        rule.last_triggered_timestamp = None
+    records = [CompiledPriceRule.compile(rule) for rule in rules]
+    after = compiled(records, prices) / TICKS
+
+    print(f"规则数: {rule_count:,}，价格数: {TICKS}")
+    print(f"{'':>16} {'单价格耗时 (ms)':>16} {'规则/秒':>14} {'每条规则内存 (字节)':>20}")
+    print(f"{'AlertRule':>16} {before * 1000:>16.2f} {rule_count / before:>14,.0f} {rules_bytes / rule_count:>20.0f}")
+    print(f"{'CompiledPriceRule':>16} {after * 1000:>16.2f} {rule_count / after:>14,.0f} "
+          f"{records_bytes / rule_count:>20.0f}")
+    print(f"加速: {before / after:.1f}x (编译记录的内存为 AlertRule 之外的额外开销)")
+
+
+if __name__ == "__main__":
+    main()
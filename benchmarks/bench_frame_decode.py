@@ -0,0 +1,94 @@
+# benchmarks/bench_frame_decode.py
+# 帧解码微基准: 对比标准库 json.loads + 字典遍历 (原实现) 与 预分类 + 可插拔解码器 的每秒处理帧数。
+# 运行: python -m benchmarks.bench_frame_decode [帧数]
+import json
+import random
+import sys
+import time
+from ws_util import frame_codec
+from ws_util.frame_codec import classify_frame, FRAME_DATA, FRAME_PING
+
+
+def _make_frames(count: int):
+    frames = []
+    for i in range(count):
+        inst_id = f"COIN{i % 500}-USDT-SWAP"
+        if i % 50 == 0:
+            frames.append("ping")
+        elif i % 97 == 0:
+            frames.append(json.dumps({"event": "subscribe", "arg": {"channel": "mark-price", "instId": inst_id},
+                                      "connId": "a4d3ae55"}, separators=(",", ":")))
+        else:
+            frames.append(json.dumps({
+                "arg": {"channel": "mark-price", "instId": inst_id},
+                "data": [{"instType": "SWAP", "instId": inst_id, "markPx": f"{random.uniform(1, 70000):.2f}",
+                          "ts": str(1700000000000 + i)}],
+            }, separators=(",", ":")))
+    return frames
+
+
+def baseline(frames):
+    """原实现: 每帧 json.loads，再用多次 .get 判断事件和频道。"""
+    prices = {}
+    for raw in frames:
+        if raw == "ping":
+            continue
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        event = message.get("event")
+        arg = message.get("arg", {})
+        channel = arg.get("channel")
+        inst_id = arg.get("instId")
+        if not channel or not inst_id:
+            continue
+        if event in ("subscribe", "unsubscribe", "error"):
+            continue
+        if channel == "mark-price" and "data" in message and isinstance(message["data"], list):
+            for item in message["data"]:
+                if item.get("instId") and item.get("markPx"):
+                    prices[item["instId"]] = item["markPx"]
+    return prices
+
+
+def optimized(frames):
+    """新实现: 预分类路由后用可插拔解码器解析，数据推送走热路径。"""
+    prices = {}
+    loads = frame_codec.loads
+    for raw in frames:
+        frame_type, channel, _ = classify_frame(raw)
+        if frame_type == FRAME_PING:
+            continue
+        message = loads(raw)
+        if frame_type == FRAME_DATA and channel == "mark-price":
+            for item in message["data"]:
+                inst_id = item.get("instId")
+                mark_px = item.get("markPx")
+                if inst_id and mark_px:
+                    prices[inst_id] = mark_px
+    return prices
+
+
+def _measure(fn, frames, rounds: int = 5) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(frames)
+        best = min(best, time.perf_counter() - start)
+    return len(frames) / best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    frames = _make_frames(count)
+    assert baseline(frames) == optimized(frames)
+    before = _measure(baseline, frames)
+    after = _measure(optimized, frames)
+    print(f"帧数: {count}, 解码器: {frame_codec.DECODER_NAME}")
+    print(f"原实现 (json.loads):      {before:>12,.0f} 帧/秒")
+    print(f"预分类 + {frame_codec.DECODER_NAME:<8}:        {after:>12,.0f} 帧/秒  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
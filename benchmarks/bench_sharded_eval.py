@@ -0,0 +1,77 @@
+# benchmarks/bench_sharded_eval.py
+# 多进程评估基准: 每个交易对挂若干条组合条件规则 (CPU 密集)，主进程以最快速度写入价格，
+# 对比在主进程中逐价格评估与 ShardedAlertProcessor 在 1..N 个工作进程中评估的每秒评估价格数。
+# 工作进程只评估每个交易对的最新价格，评估数随核数增加而增加，主进程写价格的开销与规则数无关。
+# 运行: python -m benchmarks.bench_sharded_eval [最大工作进程数]   (默认 CPU 核数)
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from app_models import AlertRule
+from alert_system.alert_processor import AlertProcessor
+from alert_system.sharded_processor import ShardedAlertProcessor
+
+PAIRS = 32
+RULES_PER_PAIR = 50
+DURATION = 3.0
+
+
+def _make_rules(pair_id: int):
+    expressions = ["price > 110 and pct_change(5m) > 2", "rsi(14, 1m) < 30 or price < 90",
+                   "high(1m) - low(1m) > price * 0.05", "price > sma(20, 1m) * 1.1"]
+    return [AlertRule(id=pair_id * 1000 + i, pair_id=pair_id, name=f"rule-{pair_id}-{i}", rule_type="expression",
+                      cooldown_seconds=0, params={"expression": f"{expressions[i % 4]} and price != {i}"})
+            for i in range(RULES_PER_PAIR)]
+
+
+def _feed(processor, seconds: float) -> int:
+    """以最快速度写入随机游走价格，返回写入的价格数。"""
+    prices = {pair_id: 100.0 for pair_id in range(1, PAIRS + 1)}
+    ticks = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for pair_id in prices:
+            prices[pair_id] *= 1 + random.gauss(0, 0.001)
+            processor.process_price_data(pair_id, prices[pair_id], int(time.time() * 1000))
+        ticks += PAIRS
+    return ticks
+
+
+def bench_in_process() -> float:
+    processor = AlertProcessor(notifier=lambda **kwargs: None, record_events=False)
+    for pair_id in range(1, PAIRS + 1):
+        processor.set_rules_for_pair(pair_id, f"SIM{pair_id}-USDT-SWAP", _make_rules(pair_id))
+    return _feed(processor, DURATION) / DURATION
+
+
+async def bench_sharded(workers: int):
+    processor = ShardedAlertProcessor(workers=workers, notifier=lambda **kwargs: None, record_events=False,
+                                      state_sync_interval=0.5)
+    processor.start()
+    for pair_id in range(1, PAIRS + 1):
+        processor.set_rules_for_pair(pair_id, f"SIM{pair_id}-USDT-SWAP", _make_rules(pair_id))
+    await asyncio.sleep(2.0)  # 等待工作进程启动并加载规则
+    # 在线程中写价格，事件循环继续处理工作进程上报的计数
+    written = await asyncio.to_thread(_feed, processor, DURATION)
+    await processor.stop()
+    return written / DURATION, sum(processor.stats()["evaluated_per_worker"]) / DURATION
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    print(f"交易对: {PAIRS}，每个交易对 {RULES_PER_PAIR} 条组合条件规则，每项 {DURATION:.0f} 秒")
+    print(f"{'':>12} {'写入价格/秒':>14} {'评估价格/秒':>14}")
+    rate = bench_in_process()
+    print(f"{'主进程':>12} {rate:>14,.0f} {rate:>14,.0f}")
+    workers = 1
+    while workers <= max_workers:
+        written, evaluated = asyncio.run(bench_sharded(workers))
+        print(f"{f'{workers} 个工作进程':>12} {written:>14,.0f} {evaluated:>14,.0f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -12,4 +12,84 @@ DATABASE_URL = "sqlite:///./okx_monitor.db" # SQLite数据库文件将创建在
 LOG_LEVEL = "INFO"
 
 # K线历史数据缓冲大小 (示例，后续可根据实际需求调整)
-KLINE_BUFFER_SIZE = 200
\ No newline at end of file
+KLINE_BUFFER_SIZE = 200
+
+# WebSocket 订阅批处理: 合并窗口(秒)、单帧最大字节数 (OKX 限制单次请求总长度不超过 64KB) 及帧间最小间隔(秒, 避免触发操作频率限制)
+WS_SUBSCRIBE_BATCH_WINDOW = 0.05
+WS_SUBSCRIBE_MAX_FRAME_BYTES = 32 * 1024
+WS_SUBSCRIBE_MIN_FRAME_INTERVAL = 0.35
+
+# 公共频道连接池: 分片连接数量及各分片首次连接的错开间隔(秒)
+WS_POOL_SIZE = 1
+WS_POOL_START_STAGGER = 0.5
+
+# 行情接收队列: 容量、消费者数量、溢出策略 ('block' 阻塞读取 / 'drop_oldest' 丢弃最旧 / 'conflate' 同一频道与instId只保留最新)
+WS_INGEST_QUEUE_SIZE = 10000
+WS_INGEST_WORKERS = 4
+WS_INGEST_OVERFLOW_POLICY = "block"
+
+# WebSocket 帧 JSON 解码器: 'auto' (依次尝试 orjson、ujson、json) 或指定 'orjson' / 'ujson' / 'json'
+WS_JSON_DECODER = "auto"
+
+# WebSocket 重连退避: 首次立即重试，之后从初始延迟(秒)指数增长至最大延迟，抖动比例，以及连接保持多久(秒)后视为稳定并重置退避
+WS_RECONNECT_INITIAL_DELAY = 0.5
+WS_RECONNECT_MAX_DELAY = 30.0
+WS_RECONNECT_JITTER = 0.3
+WS_RECONNECT_STABLE_SECONDS = 10.0
+
+# 热备冗余: 每个分片同时维持两条订阅相同频道的连接，按交易所 ts 去重，单路断线时无行情缺口
+WS_REDUNDANT_FEED = False
+
+# 客户端心跳: 连接空闲多少秒后发送 ping (OKX 要求 30 秒内有数据往来)，以及等待 pong 的超时(秒)
+WS_HEARTBEAT_INTERVAL = 20.0
+WS_PONG_TIMEOUT = 5.0
+
+# 订阅操作等待交易所确认的超时(秒)，超时未确认的操作会在下次对账时重发
+WS_SUBSCRIBE_ACK_TIMEOUT = 10.0
+
+# 原始帧录制: 目录 (None 表示不录制)、单个分段文件的最大字节数、是否 gzip 压缩
+WS_RECORD_DIR = None
+WS_RECORD_SEGMENT_BYTES = 64 * 1024 * 1024
+WS_RECORD_COMPRESS = False
+
+# 预警批量评估周期(秒): 设置后按周期收集各交易对的最新价格，用 NumPy 一次性评估所有价格预警 (需安装 numpy)；None 表示每个价格到达时立即评估
+ALERT_BATCH_INTERVAL = None
+
+# 预警通知分发: 队列容量、发送协程数 (即同时进行中的请求上限)、失败重试次数、重试初始/最大延迟(秒)，以及 HTTP 请求超时(秒)
+NOTIFY_QUEUE_SIZE = 1000
+NOTIFY_WORKERS = 4
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_RETRY_INITIAL_DELAY = 1.0
+NOTIFY_RETRY_MAX_DELAY = 30.0
+NOTIFY_HTTP_TIMEOUT = 10
+
+# 钉钉机器人限流: 每分钟最多发送的消息数 (钉钉限制为 20 条/分钟)，None 表示不限流；额度用尽时合并为汇总消息，单条汇总最多包含的预警数
+DINGTALK_RATE_LIMIT_PER_MINUTE = 20
+NOTIFY_DIGEST_MAX_ITEMS = 50
+
+# 通知渠道: 名称 -> 配置。type 为 dingtalk / webhook / jsonl / stdout / smtp，其余键为该渠道的参数，
+# 例如 {"type": "webhook", "url": "http://127.0.0.1:9000/alert"}、{"type": "jsonl", "path": "alerts.jsonl"}、
+# {"type": "smtp", "host": "127.0.0.1", "port": 1025, "from_addr": "monitor@localhost", "to_addrs": ["me@localhost"]}；
+# 可选的 workers / queue_size / max_retries / rate_limit_per_minute 覆盖该渠道分发器的默认值 (只有钉钉渠道默认限流)
+NOTIFY_SINKS = {
+    "dingtalk": {"type": "dingtalk"},
+}
+# 默认发送到的渠道，以及按 instId 指定的渠道 (如 {"BTC-USDT-SWAP": ["dingtalk", "jsonl"]})；规则可在 params["sinks"] 中单独指定
+NOTIFY_DEFAULT_SINKS = ["dingtalk"]
+NOTIFY_ROUTES_BY_INST = {}
+
+# 预警事件历史: 是否把触发的预警写入 alert_events 表；写缓冲区积累到多少条或经过多少秒时批量写入
+ALERT_EVENT_HISTORY = True
+ALERT_EVENT_BATCH_SIZE = 200
+ALERT_EVENT_FLUSH_INTERVAL = 2.0
+
+# 运行时状态快照: 文件路径 (None 表示不保存/恢复) 与保存周期(秒)；保存规则的最后触发时间、阈值状态和最新标记价格，启动时恢复
+RUNTIME_SNAPSHOT_PATH = "runtime_state.json"
+RUNTIME_SNAPSHOT_INTERVAL = 30.0
+
+# 多进程预警评估: 工作进程数 (0 表示在主进程中评估)、共享内存价格表可容纳的交易对数、工作进程上报规则状态的周期(秒)，
+# 以及移除交易对后触发分片迁移的最重/最轻分片规则数之比
+ALERT_WORKER_PROCESSES = 0
+ALERT_WORKER_MAX_PAIRS = 4096
+ALERT_WORKER_STATE_SYNC_INTERVAL = 5.0
+ALERT_WORKER_REBALANCE_RATIO = 1.5
@@ -1,8 +1,8 @@
 # db_manager.py
 import sqlite3
 import json
-from typing import List, Optional, Dict, Any, TypeVar, Type
-from app_models import TradingPair, AlertRule
+from typing import List, Optional, Dict, Any, Set, TypeVar, Type
+from app_models import TradingPair, AlertRule, AlertEvent
 from config import DATABASE_URL
 
 DB_FILE = DATABASE_URL.split("sqlite:///./")[-1]
@@ -91,6 +91,23 @@ def initialize_database():
         FOREIGN KEY (pair_id) REFERENCES trading_pairs (id) ON DELETE CASCADE
     )
     """)
+    _execute_query("""
+    CREATE TABLE IF NOT EXISTS alert_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        rule_id INTEGER,
+        pair_id INTEGER,
+        instId TEXT NOT NULL,
+        rule_name TEXT NOT NULL,
+        rule_type TEXT NOT NULL,
+        price REAL,
+        message TEXT
+    )
+    """)
+    # 按时间范围、instId、规则分页查询的索引 (ts 放在最后，以便范围过滤和按时间排序都走索引)
+    _execute_query("CREATE INDEX IF NOT EXISTS idx_alert_events_ts ON alert_events (ts)")
+    _execute_query("CREATE INDEX IF NOT EXISTS idx_alert_events_inst_ts ON alert_events (instId, ts)")
+    _execute_query("CREATE INDEX IF NOT EXISTS idx_alert_events_rule_ts ON alert_events (rule_id, ts)")
     print(f"数据库表已在 '{DB_FILE}' 中检查/创建。")
     try:
         _execute_query("SELECT cooldown_seconds FROM alert_rules LIMIT 1", fetch_one=True)
@@ -166,6 +183,16 @@ def get_all_alert_rules() -> List[AlertRule]:
     return [ar for row in rows if (ar := _row_to_model(row, AlertRule)) is not None]
 
 
+def get_active_alert_rule_ids() -> Optional[Set[int]]:
+    """已启用交易对上已启用规则的 ID (恢复运行时快照时用于丢弃已删除/停用规则的状态)；查询失败时返回 None。"""
+    rows = _execute_query(
+        "SELECT alert_rules.id FROM alert_rules JOIN trading_pairs ON alert_rules.pair_id = trading_pairs.id "
+        "WHERE alert_rules.is_enabled = 1 AND trading_pairs.is_enabled = 1", fetch_all=True)
+    if rows is False or rows is None:
+        return None
+    return {row["id"] for row in rows}
+
+
 def update_alert_rule(rule_id: int, updates: Dict[str, Any]) -> bool:
     if 'params' in updates and isinstance(updates['params'], dict):
         updates['params'] = json.dumps(updates['params'])
@@ -181,4 +208,80 @@ def update_alert_rule(rule_id: int, updates: Dict[str, Any]) -> bool:
 
 
 def delete_alert_rule(rule_id: int) -> bool:
-    return _execute_query("DELETE FROM alert_rules WHERE id = ?", (rule_id,), commit=True)
\ No newline at end of file
+    return _execute_query("DELETE FROM alert_rules WHERE id = ?", (rule_id,), commit=True)
+
+
+# --- AlertEvent 操作 ---
+def add_alert_events(events: List[AlertEvent]) -> int:
+    """在一个事务中批量写入预警事件，返回写入的条数 (失败时为 0)。"""
+    if not events:
+        return 0
+    conn = _get_db_connection()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO alert_events (ts, rule_id, pair_id, instId, rule_name, rule_type, price, message) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(e.ts, e.rule_id, e.pair_id, e.instId, e.rule_name, e.rule_type, e.price, e.message) for e in events]
+            )
+        return len(events)
+    except sqlite3.Error as e:
+        print(f"批量写入预警事件失败 ({len(events)} 条): {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def _alert_event_filters(start_ts: Optional[float], end_ts: Optional[float], inst_id: Optional[str],
+                         rule_id: Optional[int]):
+    clauses, params = [], []
+    if start_ts is not None:
+        clauses.append("ts >= ?")
+        params.append(start_ts)
+    if end_ts is not None:
+        clauses.append("ts < ?")
+        params.append(end_ts)
+    if inst_id is not None:
+        clauses.append("instId = ?")
+        params.append(inst_id)
+    if rule_id is not None:
+        clauses.append("rule_id = ?")
+        params.append(rule_id)
+    return clauses, params
+
+
+def get_alert_events(start_ts: Optional[float] = None, end_ts: Optional[float] = None,
+                     inst_id: Optional[str] = None, rule_id: Optional[int] = None,
+                     limit: int = 100, before: Optional[tuple] = None) -> List[AlertEvent]:
+    """
+    按时间倒序分页查询预警事件，时间范围为 [start_ts, end_ts)。
+    before 为上一页最后一条的 (ts, id)，用于取下一页 (键集分页，翻页代价与页码无关)。
+    """
+    clauses, params = _alert_event_filters(start_ts, end_ts, inst_id, rule_id)
+    if before is not None:
+        clauses.append("(ts < ? OR (ts = ? AND id < ?))")
+        params.extend([before[0], before[0], before[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = _execute_query(f"SELECT * FROM alert_events {where} ORDER BY ts DESC, id DESC LIMIT ?",
+                          tuple(params) + (limit,), fetch_all=True)
+    return [event for row in rows or [] if (event := _row_to_model(row, AlertEvent)) is not None]
+
+
+def count_alert_events(start_ts: Optional[float] = None, end_ts: Optional[float] = None,
+                       inst_id: Optional[str] = None, rule_id: Optional[int] = None) -> int:
+    clauses, params = _alert_event_filters(start_ts, end_ts, inst_id, rule_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    row = _execute_query(f"SELECT COUNT(*) FROM alert_events {where}", tuple(params), fetch_one=True)
+    return row[0] if row else 0
+
+
+def get_alert_event_counts(start_ts: Optional[float] = None, end_ts: Optional[float] = None,
+                           group_by: str = "instId") -> Dict[Any, int]:
+    """统计时间范围内的触发次数，按 instId 或 rule_id 分组。"""
+    if group_by not in ("instId", "rule_id"):
+        raise ValueError(f"不支持的分组字段: {group_by}")
+    clauses, params = _alert_event_filters(start_ts, end_ts, None, None)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = _execute_query(f"SELECT {group_by}, COUNT(*) FROM alert_events {where} GROUP BY {group_by}",
+                          tuple(params), fetch_all=True)
+    return {row[0]: row[1] for row in rows or []}
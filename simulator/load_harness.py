@@ -0,0 +1,156 @@
+# simulator/load_harness.py
+# 端到端压测: 启动本地 OKX 模拟器，由 PublicChannelManager + AlertProcessor 订阅并评估预警，
+# 报告推送吞吐量、交易所 ts 到收到价格的延迟以及到触发预警的延迟分位数。
+# 运行: python -m simulator.load_harness [--inst-count 2000] [--tick-rate 2] [--duration 30] [--pool-size 2]
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from app_models import AlertRule
+from alert_system.alert_processor import AlertProcessor
+from ws_util.public_channel_manager import PublicChannelManager
+from simulator.okx_ws_simulator import OkxWsSimulator
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _format_latency(name: str, values: List[float]) -> str:
+    ordered = sorted(values)
+    if not ordered:
+        return f"{name}: 无样本"
+    return (f"{name} (ms, {len(ordered)} 个样本): p50 {_percentile(ordered, 50):.1f}  p90 {_percentile(ordered, 90):.1f}  "
+            f"p99 {_percentile(ordered, 99):.1f}  max {ordered[-1]:.1f}")
+
+
+class LoadRecorder:
+    """记录价格推送与预警触发，计算延迟 (交易所 ts 为毫秒精度，延迟结果同样为毫秒级)。"""
+
+    def __init__(self, pair_ids: Dict[str, int]):
+        self.processor: Optional[AlertProcessor] = None
+        self.pair_ids = pair_ids
+        self.recording = False
+        self.ticks = 0
+        self.alerts = 0
+        self.feed_latency_ms: List[float] = []
+        self.alert_latency_ms: List[float] = []
+        self._current_ts: Dict[str, Optional[int]] = {}
+
+    def reset(self):
+        self.ticks = 0
+        self.alerts = 0
+        self.feed_latency_ms.clear()
+        self.alert_latency_ms.clear()
+
+    def on_tick(self, inst_id: str, price: str, ts: Optional[int]):
+        if self.recording:
+            self.ticks += 1
+            if ts is not None:
+                self.feed_latency_ms.append(time.time() * 1000 - ts)
+        self._current_ts[inst_id] = ts
+        self.processor.process_price_data(self.pair_ids[inst_id], price, ts)
+
+    def on_alert(self, title: str, message: str, inst_id: str, rule_name: str):
+        if not self.recording:
+            return
+        self.alerts += 1
+        ts = self._current_ts.get(inst_id)
+        if ts is not None:
+            self.alert_latency_ms.append(time.time() * 1000 - ts)
+
+
+def _build_rules(pair_id: int, price: float, band: float, cooldown: int) -> List[AlertRule]:
+    """在初始价格上下各放一条阈值规则，使随机游走频繁穿越。"""
+    return [
+        AlertRule(id=pair_id * 2, pair_id=pair_id, name="harness-above", rule_type="price_alert",
+                  params={"threshold_price": price * (1 + band), "condition": "above"}, cooldown_seconds=cooldown),
+        AlertRule(id=pair_id * 2 + 1, pair_id=pair_id, name="harness-below", rule_type="price_alert",
+                  params={"threshold_price": price * (1 - band), "condition": "below"}, cooldown_seconds=cooldown),
+    ]
+
+
+async def _wait_subscribed(pcm: PublicChannelManager, inst_ids: List[str], timeout: float) -> int:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        acked = sum(1 for inst_id in inst_ids if pcm.is_subscribed(inst_id))
+        if acked == len(inst_ids):
+            return acked
+        await asyncio.sleep(0.2)
+    return sum(1 for inst_id in inst_ids if pcm.is_subscribed(inst_id))
+
+
+async def run(args: argparse.Namespace):
+    simulator = OkxWsSimulator(port=args.port, tick_rate=args.tick_rate, volatility=args.volatility,
+                               drop_interval=args.drop_interval or None, seed=args.seed)
+    await simulator.start()
+
+    inst_ids = [f"SIM{i}-USDT-SWAP" for i in range(args.inst_count)]
+    pair_ids = {inst_id: index + 1 for index, inst_id in enumerate(inst_ids)}
+    recorder = LoadRecorder(pair_ids)
+    processor = AlertProcessor(notifier=recorder.on_alert, record_events=False)
+    for inst_id, pair_id in pair_ids.items():
+        processor.set_rules_for_pair(pair_id, inst_id,
+                                     _build_rules(pair_id, simulator.initial_price, args.band, args.cooldown))
+    recorder.processor = processor
+
+    pcm = PublicChannelManager(url=simulator.url, pool_size=args.pool_size, redundant=args.redundant)
+    pcm.add_tick_listener(recorder.on_tick, conflate=False)
+    pcm.subscribe_many(inst_ids)
+    await pcm.start()
+    try:
+        acked = await _wait_subscribed(pcm, inst_ids, timeout=args.warmup_timeout)
+        print(f"已确认订阅 {acked}/{len(inst_ids)} 个 instId，开始计时 {args.duration} 秒...")
+        frames_before = simulator.frames_sent
+        recorder.reset()
+        recorder.recording = True
+        started_at = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        recorder.recording = False
+        elapsed = time.perf_counter() - started_at
+        frames_sent = simulator.frames_sent - frames_before
+
+        stats = pcm.get_stats()
+        ingest = stats.get("ingest", {})
+        print(f"instId: {len(inst_ids)}, 每个 instId {args.tick_rate}/秒, 连接池分片: {args.pool_size}"
+              f"{' (双路热备)' if args.redundant else ''}, 时长 {elapsed:.1f} 秒")
+        print(f"模拟器发送帧: {frames_sent} ({frames_sent / elapsed:,.0f}/秒)")
+        print(f"收到价格: {recorder.ticks} ({recorder.ticks / elapsed:,.0f}/秒), 触发预警: {recorder.alerts} "
+              f"({recorder.alerts / elapsed:,.1f}/秒)")
+        print(_format_latency("推送延迟 (交易所 ts -> 收到价格)", recorder.feed_latency_ms))
+        print(_format_latency("预警延迟 (交易所 ts -> 发出通知)", recorder.alert_latency_ms))
+        print(f"接收队列: {ingest}")
+        print(f"模拟器: {simulator.stats()}")
+    finally:
+        await pcm.stop()
+        await simulator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟器端到端压测")
+    parser.add_argument("--inst-count", type=int, default=2000)
+    parser.add_argument("--tick-rate", type=float, default=2.0, help="每个 instId 每秒推送次数")
+    parser.add_argument("--duration", type=float, default=30.0, help="计时时长 (秒)")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--redundant", action="store_true", help="每个分片使用双路热备连接")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--volatility", type=float, default=0.001)
+    parser.add_argument("--band", type=float, default=0.002, help="阈值距初始价格的比例")
+    parser.add_argument("--cooldown", type=int, default=0, help="规则冷却时间 (秒)")
+    parser.add_argument("--drop-interval", type=float, default=0.0, help="每隔多少秒注入一次断线 (0 表示不断线)")
+    parser.add_argument("--warmup-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+                        datefmt='%H:%M:%S')
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# simulator/okx_ws_simulator.py
+# 本地 OKX 公共频道 WebSocket 模拟器: 支持 subscribe/unsubscribe 确认、mark-price 推送、ping/pong 以及注入断线，
+# 为任意数量的 instId 生成随机游走价格，用于离线联调和压测。
+# 单独运行: python -m simulator.okx_ws_simulator [--port 8765] [--tick-rate 1] [--drop-interval 0]
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+import websockets
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_CHANNELS = {"mark-price"}
+
+
+class _Session:
+    """一个客户端连接及其订阅。"""
+
+    def __init__(self, websocket: Any):
+        self.websocket = websocket
+        self.conn_id = uuid.uuid4().hex[:8]
+        self.subscriptions: Dict[str, Set[str]] = {channel: set() for channel in SUPPORTED_CHANNELS}  # channel -> instId
+
+
+class OkxWsSimulator:
+    """
+    OKX 公共频道模拟服务器。
+    所有连接共享同一组价格，每个推送周期对被订阅的 instId 走一步几何随机游走，
+    再按各连接的订阅推送 mark-price 数据，ts 为生成时刻的毫秒时间戳，可用于测量端到端延迟。
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8765,
+                 tick_rate: float = 1.0,
+                 volatility: float = 0.001,
+                 initial_price: float = 100.0,
+                 drop_interval: Optional[float] = None,
+                 seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate  # 每个 instId 每秒推送次数
+        self.volatility = volatility  # 每步对数收益率的标准差
+        self.initial_price = initial_price
+        self.drop_interval = drop_interval  # 每隔多少秒强制断开所有连接，None 或 0 表示不断线
+        self._random = random.Random(seed)
+        self._prices: Dict[str, float] = {}
+        self._sessions: Set[_Session] = set()
+        self._server: Any = None
+        self._tasks: List[asyncio.Task] = []
+        # 统计
+        self.connections_accepted = 0
+        self.frames_sent = 0
+        self.pings_received = 0
+        self.subscribe_ops = 0
+        self.drops_injected = 0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port, max_queue=None)
+        self._tasks.append(asyncio.create_task(self._push_loop()))
+        if self.drop_interval:
+            self._tasks.append(asyncio.create_task(self._drop_loop()))
+        logger.info(f"OKX 模拟器已启动: {self.url} (每个 instId {self.tick_rate}/秒)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._sessions.clear()
+        logger.info("OKX 模拟器已停止。")
+
+    def price_of(self, inst_id: str) -> float:
+        return self._prices.get(inst_id, self.initial_price)
+
+    async def drop_connections(self, abrupt: bool = True):
+        """断开所有客户端连接。abrupt 为 True 时直接中止 TCP 连接 (不发送关闭帧)，模拟网络故障。"""
+        sessions = list(self._sessions)
+        for session in sessions:
+            transport = getattr(session.websocket, "transport", None)
+            if abrupt and transport is not None:
+                transport.abort()
+            else:
+                await session.websocket.close(code=1011, reason="simulated disconnect")
+        self.drops_injected += 1
+        logger.info(f"已注入断线，断开 {len(sessions)} 个连接。")
+
+    async def _drop_loop(self):
+        while True:
+            await asyncio.sleep(self.drop_interval)
+            await self.drop_connections()
+
+    async def _handle(self, websocket: Any, path: Optional[str] = None):  # 旧版 websockets 会传入 path
+        session = _Session(websocket)
+        self._sessions.add(session)
+        self.connections_accepted += 1
+        try:
+            async for message in websocket:
+                if message == "ping":
+                    self.pings_received += 1
+                    await websocket.send("pong")
+                    continue
+                await self._handle_request(session, message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._sessions.discard(session)
+
+    async def _handle_request(self, session: _Session, message: str):
+        try:
+            request = json.loads(message)
+            op = request["op"]
+            args = request["args"]
+        except (ValueError, KeyError, TypeError):
+            await self._send(session, {"event": "error", "code": "60012",
+                                       "msg": f"Invalid request: {message}", "connId": session.conn_id})
+            return
+        if op not in ("subscribe", "unsubscribe"):
+            await self._send(session, {"event": "error", "code": "60012",
+                                       "msg": f"Invalid request: {message}", "connId": session.conn_id})
+            return
+        self.subscribe_ops += 1
+        for arg in args:
+            channel, inst_id = arg.get("channel"), arg.get("instId")
+            if channel not in SUPPORTED_CHANNELS or not inst_id:
+                await self._send(session, {"event": "error", "code": "60018",
+                                           "msg": f"Wrong URL or channel:{channel},instId:{inst_id} doesn't exist.",
+                                           "connId": session.conn_id})
+                continue
+            if op == "subscribe":
+                session.subscriptions[channel].add(inst_id)
+                self._prices.setdefault(inst_id, self.initial_price)
+            else:
+                session.subscriptions[channel].discard(inst_id)
+            await self._send(session, {"event": op, "arg": {"channel": channel, "instId": inst_id},
+                                       "connId": session.conn_id})
+
+    async def _send(self, session: _Session, payload: Dict[str, Any]):
+        await session.websocket.send(json.dumps(payload, separators=(",", ":")))
+        self.frames_sent += 1
+
+    def _step_prices(self, inst_ids: Set[str]):
+        gauss = self._random.gauss
+        sigma = self.volatility
+        for inst_id in inst_ids:
+            self._prices[inst_id] = self._prices.get(inst_id, self.initial_price) * math.exp(gauss(0.0, sigma))
+
+    async def _push_loop(self):
+        interval = 1.0 / self.tick_rate
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while True:
+            next_at += interval
+            subscribed: Set[str] = set()
+            for session in self._sessions:
+                subscribed.update(session.subscriptions["mark-price"])
+            self._step_prices(subscribed)
+            ts = str(int(time.time() * 1000))
+            for session in list(self._sessions):
+                try:
+                    for inst_id in list(session.subscriptions["mark-price"]):
+                        await session.websocket.send(
+                            '{"arg":{"channel":"mark-price","instId":"%s"},"data":[{"instType":"SWAP","instId":"%s",'
+                            '"markPx":"%.8g","ts":"%s"}]}' % (inst_id, inst_id, self._prices[inst_id], ts))
+                        self.frames_sent += 1
+                except websockets.exceptions.ConnectionClosed:
+                    self._sessions.discard(session)
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:  # 推送跟不上设定频率时不追赶，避免持续突发
+                next_at = loop.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self._sessions),
+            "connections_accepted": self.connections_accepted,
+            "subscriptions": sum(len(s.subscriptions["mark-price"]) for s in self._sessions),
+            "frames_sent": self.frames_sent,
+            "pings_received": self.pings_received,
+            "subscribe_ops": self.subscribe_ops,
+            "drops_injected": self.drops_injected,
+        }
+
+
+async def _serve_forever(args: argparse.Namespace):
+    simulator = OkxWsSimulator(host=args.host, port=args.port, tick_rate=args.tick_rate,
+                               volatility=args.volatility, drop_interval=args.drop_interval or None)
+    await simulator.start()
+    try:
+        while True:
+            await asyncio.sleep(10)
+            logger.info(f"模拟器统计: {simulator.stats()}")
+    finally:
+        await simulator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OKX 公共频道 WebSocket 模拟器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tick-rate", type=float, default=1.0, help="每个 instId 每秒推送次数")
+    parser.add_argument("--volatility", type=float, default=0.001, help="每步对数收益率标准差")
+    parser.add_argument("--drop-interval", type=float, default=0.0, help="每隔多少秒断开所有连接 (0 表示不断线)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+                        datefmt='%H:%M:%S')
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        logger.info("模拟器被用户中断。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# simulator/replay_feed.py
+# 回放录制的原始帧 (config.WS_RECORD_DIR 或 PublicChannelManager(record_dir=...) 录制)，
+# 经 PublicChannelManager._on_message 走完整的分发路径，报告回放速率与收到的价格数。
+# 运行: python -m simulator.replay_feed <分段文件或目录> [--speed 1]   (--speed 0 表示尽快回放)
+import argparse
+import asyncio
+import logging
+from typing import Optional
+from ws_util.frame_recorder import FrameReplayer
+from ws_util.public_channel_manager import PublicChannelManager
+
+
+async def run(path: str, speed: float):
+    pcm = PublicChannelManager(record_dir=None)
+    ticks = 0
+
+    def on_tick(inst_id: str, price: str, ts: Optional[int]):
+        nonlocal ticks
+        ticks += 1
+
+    pcm.add_tick_listener(on_tick, conflate=False)
+    replayer = FrameReplayer(pcm._on_message, speed=speed)
+    result = await replayer.replay(path)
+    print(f"回放 {result['frames']} 帧，用时 {result['elapsed']:.2f} 秒 ({result['frames_per_second']:,.0f} 帧/秒)，"
+          f"价格更新 {ticks} 次，instId {len(pcm._prices)} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的公共频道原始帧")
+    parser.add_argument("path", help="分段文件或录制目录")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示尽快回放")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+                        datefmt='%H:%M:%S')
+    asyncio.run(run(args.path, args.speed))
+
+
+if __name__ == "__main__":
+    main()
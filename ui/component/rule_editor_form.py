@@ -2,6 +2,33 @@
 from nicegui import ui
 from typing import Dict, Any, Callable, Optional, Awaitable
 from app_models import AlertRule
+from config import NOTIFY_SINKS
+from alert_system.kline_engine import TIMEFRAME_MS
+from alert_system.rules.kline_alert_evaluator import KLINE_PATTERNS, describe_kline_rule
+from alert_system.rules.indicator_alert_evaluator import describe_indicator_rule
+from alert_system.rules.pct_change_alert_evaluator import DIRECTION_TEXT, describe_pct_change_rule
+from alert_system.rules.expression import ExpressionError, validate_expression
+
+# 预警类型选项
+RULE_TYPE_OPTIONS = {
+    'price_alert': '价格预警',
+    'kline_pattern': 'K线形态',
+    'pct_change': '时间窗口涨跌幅',
+    'ma_cross': '均线交叉',
+    'rsi': 'RSI',
+    'bollinger': '布林带突破',
+    'atr': 'ATR 波幅',
+    'expression': '组合条件 (表达式)',
+}
+
+# 技术指标预警类型
+INDICATOR_RULE_TYPES = ('ma_cross', 'rsi', 'bollinger', 'atr')
+
+# 指标穿越方向选项
+CROSS_OPTIONS = {
+    'above': '上穿',
+    'below': '下穿'
+}
 
 # 预警条件选项
 CONDITION_OPTIONS = {
@@ -35,27 +62,163 @@ class RuleEditorForm:
                     value=rule_to_edit.name if rule_to_edit else f"{self.inst_id} 价格预警"
                 ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
 
-                self.threshold_price_input = ui.number(
-                    label="阈值价格 (USDT)",
-                    value=float(rule_to_edit.params.get("threshold_price",
-                                                        0.0)) if rule_to_edit and rule_to_edit.params else None,
-                    step='any'       # <-- 允许输入任意浮点数
-                ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                initial_rule_type = rule_to_edit.rule_type if rule_to_edit else 'price_alert'
+                self.rule_type_select = ui.select(
+                    options=RULE_TYPE_OPTIONS,
+                    label="预警类型",
+                    value=initial_rule_type if initial_rule_type in RULE_TYPE_OPTIONS else 'price_alert'
+                ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+                if rule_to_edit:  # 已有规则不允许修改类型
+                    self.rule_type_select.disable()
+                price_params = rule_to_edit.params if rule_to_edit and rule_to_edit.rule_type == 'price_alert' else {}
+                kline_params = rule_to_edit.params if rule_to_edit and rule_to_edit.rule_type == 'kline_pattern' else {}
+                expression_params = rule_to_edit.params \
+                    if rule_to_edit and rule_to_edit.rule_type == 'expression' else {}
+                pct_params = rule_to_edit.params if rule_to_edit and rule_to_edit.rule_type == 'pct_change' else {}
+                indicator_params = rule_to_edit.params \
+                    if rule_to_edit and rule_to_edit.rule_type in INDICATOR_RULE_TYPES else {}
+
+                with ui.column().classes('w-full gap-0') \
+                        .bind_visibility_from(self.rule_type_select, 'value', value='price_alert'):
+                    self.threshold_price_input = ui.number(
+                        label="阈值价格 (USDT)",
+                        value=float(price_params.get("threshold_price", 0.0)) if price_params else None,
+                        step='any'       # <-- 允许输入任意浮点数
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+
+                    initial_condition = 'above'
+                    if price_params:
+                        loaded_condition = price_params.get("condition")
+                        if loaded_condition in CONDITION_OPTIONS:
+                            initial_condition = loaded_condition
+                        else:
+                            print(
+                                f"[WARN] RuleEditorForm: Invalid condition '{loaded_condition}' loaded for rule '{rule_to_edit.name if rule_to_edit else 'new rule'}'. Defaulting to 'above'.")
 
-                initial_condition = 'above'
-                if rule_to_edit and rule_to_edit.params:
-                    loaded_condition = rule_to_edit.params.get("condition")
-                    if loaded_condition in CONDITION_OPTIONS:
-                        initial_condition = loaded_condition
-                    else:
-                        print(
-                            f"[WARN] RuleEditorForm: Invalid condition '{loaded_condition}' loaded for rule '{rule_to_edit.name if rule_to_edit else 'new rule'}'. Defaulting to 'above'.")
-
-                self.condition_select = ui.select(
-                    options=CONDITION_OPTIONS,  # 使用原始字典
-                    label="触发条件",
-                    value=initial_condition
-                ).props('outlined dense map-options hide-bottom-space')
+                    self.condition_select = ui.select(
+                        options=CONDITION_OPTIONS,  # 使用原始字典
+                        label="触发条件",
+                        value=initial_condition
+                    ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+
+                with ui.column().classes('w-full gap-0') \
+                        .bind_visibility_from(self.rule_type_select, 'value', value='kline_pattern'):
+                    self.timeframe_select = ui.select(
+                        options=list(TIMEFRAME_MS),
+                        label="K线周期",
+                        value=kline_params.get("timeframe", "1m")
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                    self.pattern_select = ui.select(
+                        options={name: spec[0] for name, spec in KLINE_PATTERNS.items()},
+                        label="K线形态",
+                        value=kline_params.get("pattern", "bullish_engulfing")
+                    ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+                    self.pattern_count_input = ui.number(
+                        label="K线数量 (连续阳线/阴线)",
+                        value=kline_params.get("count", 3),
+                        min=1,
+                        step=1
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2') \
+                        .bind_visibility_from(self.pattern_select, 'value',
+                                              backward=lambda v: v in ('consecutive_up', 'consecutive_down'))
+                    self.min_body_pct_input = ui.number(
+                        label="最小实体涨跌幅 (%)",
+                        value=kline_params.get("min_body_pct", 1.0),
+                        step='any'
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2') \
+                        .bind_visibility_from(self.pattern_select, 'value', value='big_candle')
+
+                self.expression_input = ui.textarea(
+                    label="条件表达式",
+                    placeholder="例如: price > 70000 and pct_change(5m) > 2 or rsi(14, 1m) < 30",
+                    value=expression_params.get("expression", "")
+                ).props('outlined dense autogrow hide-bottom-space').classes('w-full mb-2') \
+                    .bind_visibility_from(self.rule_type_select, 'value', value='expression')
+
+                with ui.column().classes('w-full gap-0') \
+                        .bind_visibility_from(self.rule_type_select, 'value', value='pct_change'):
+                    self.window_seconds_input = ui.number(
+                        label="时间窗口 (秒)",
+                        value=pct_params.get("window_seconds", 60),
+                        min=1,
+                        step=1
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                    self.pct_input = ui.number(
+                        label="涨跌幅 (%)",
+                        value=pct_params.get("pct", 1.0),
+                        step='any'
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                    self.direction_select = ui.select(
+                        options=DIRECTION_TEXT,
+                        label="方向",
+                        value=pct_params.get("direction", "any")
+                    ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+
+                with ui.column().classes('w-full gap-0') \
+                        .bind_visibility_from(self.rule_type_select, 'value',
+                                              backward=lambda v: v in INDICATOR_RULE_TYPES):
+                    self.indicator_timeframe_select = ui.select(
+                        options=list(TIMEFRAME_MS),
+                        label="K线周期",
+                        value=indicator_params.get("timeframe", "1m")
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                    with ui.column().classes('w-full gap-0') \
+                            .bind_visibility_from(self.rule_type_select, 'value', value='ma_cross'):
+                        self.ma_type_select = ui.select(
+                            options={'ema': 'EMA', 'sma': 'SMA'},
+                            label="均线类型",
+                            value=indicator_params.get("ma_type", "ema")
+                        ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+                        with ui.row().classes('w-full no-wrap gap-2'):
+                            self.ma_fast_input = ui.number(
+                                label="快线周期", value=indicator_params.get("fast", 9), min=1, step=1
+                            ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                            self.ma_slow_input = ui.number(
+                                label="慢线周期", value=indicator_params.get("slow", 21), min=2, step=1
+                            ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                        self.ma_direction_select = ui.select(
+                            options={'golden': '金叉 (快线上穿慢线)', 'death': '死叉 (快线下穿慢线)'},
+                            label="交叉方向",
+                            value=indicator_params.get("direction", "golden")
+                        ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+                    self.indicator_period_input = ui.number(
+                        label="指标周期",
+                        value=indicator_params.get("period", 20 if initial_rule_type == 'bollinger' else 14),
+                        min=1,
+                        step=1
+                    ).props('outlined dense hide-bottom-space').classes('w-full mb-2') \
+                        .bind_visibility_from(self.rule_type_select, 'value',
+                                              backward=lambda v: v in ('rsi', 'bollinger', 'atr'))
+                    with ui.column().classes('w-full gap-0') \
+                            .bind_visibility_from(self.rule_type_select, 'value', value='bollinger'):
+                        self.std_dev_input = ui.number(
+                            label="标准差倍数", value=indicator_params.get("std_dev", 2.0), step='any'
+                        ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+                        self.band_select = ui.select(
+                            options={'upper': '突破上轨', 'lower': '跌破下轨'},
+                            label="触发条件",
+                            value=indicator_params.get("band", "upper")
+                        ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+                    with ui.column().classes('w-full gap-0') \
+                            .bind_visibility_from(self.rule_type_select, 'value',
+                                                  backward=lambda v: v in ('rsi', 'atr')):
+                        self.indicator_condition_select = ui.select(
+                            options=CROSS_OPTIONS,
+                            label="触发条件",
+                            value=indicator_params.get("condition", "above")
+                        ).props('outlined dense map-options hide-bottom-space').classes('w-full mb-2')
+                        self.indicator_threshold_input = ui.number(
+                            label="指标阈值",
+                            value=indicator_params.get("threshold", 70),
+                            step='any'
+                        ).props('outlined dense hide-bottom-space').classes('w-full mb-2')
+
+                self.sinks_select = ui.select(
+                    options=list(NOTIFY_SINKS),
+                    label="通知渠道 (留空使用默认渠道)",
+                    value=list(rule_to_edit.params.get("sinks", [])) if rule_to_edit else [],
+                    multiple=True
+                ).props('outlined dense use-chips hide-bottom-space').classes('w-full mb-2')
 
                 self.cooldown_input = ui.number(
                     label="冷却时间 (秒)",
@@ -80,13 +243,112 @@ class RuleEditorForm:
         # <-- 修改了格式化，以显示完整的浮点数
         return f"{condition_text} {threshold}"
 
+    def _build_kline_params(self) -> Optional[Dict[str, Any]]:
+        timeframe_val = self.timeframe_select.value
+        pattern_val = self.pattern_select.value
+        if timeframe_val not in TIMEFRAME_MS or pattern_val not in KLINE_PATTERNS:
+            ui.notify("请选择K线周期和形态！", type='warning')
+            return None
+        params_dict: Dict[str, Any] = {"timeframe": timeframe_val, "pattern": pattern_val}
+        try:
+            if pattern_val in ("consecutive_up", "consecutive_down"):
+                params_dict["count"] = int(self.pattern_count_input.value)
+            elif pattern_val == "big_candle":
+                params_dict["min_body_pct"] = float(self.min_body_pct_input.value)
+        except (TypeError, ValueError):
+            ui.notify("K线参数格式不正确！", type='warning')
+            return None
+        return params_dict
+
+    def _build_expression_params(self) -> Optional[Dict[str, Any]]:
+        expression_val = (self.expression_input.value or "").strip()
+        if not expression_val:
+            ui.notify("请输入条件表达式！", type='warning')
+            return None
+        try:
+            validate_expression(expression_val)
+        except ExpressionError as e:
+            ui.notify(f"表达式无效: {e}", type='warning')
+            return None
+        return {"expression": expression_val}
+
+    def _build_pct_change_params(self) -> Optional[Dict[str, Any]]:
+        try:
+            window_seconds = int(self.window_seconds_input.value)
+            pct = float(self.pct_input.value)
+        except (TypeError, ValueError):
+            ui.notify("时间窗口或涨跌幅格式不正确！", type='warning')
+            return None
+        if window_seconds < 1 or pct <= 0:
+            ui.notify("时间窗口和涨跌幅必须大于0！", type='warning')
+            return None
+        return {"window_seconds": window_seconds, "pct": pct, "direction": self.direction_select.value}
+
+    def _build_indicator_params(self, rule_type: str) -> Optional[Dict[str, Any]]:
+        timeframe_val = self.indicator_timeframe_select.value
+        if timeframe_val not in TIMEFRAME_MS:
+            ui.notify("请选择K线周期！", type='warning')
+            return None
+        params_dict: Dict[str, Any] = {"timeframe": timeframe_val}
+        try:
+            if rule_type == 'ma_cross':
+                params_dict.update(ma_type=self.ma_type_select.value, fast=int(self.ma_fast_input.value),
+                                   slow=int(self.ma_slow_input.value), direction=self.ma_direction_select.value)
+                if params_dict["fast"] >= params_dict["slow"]:
+                    ui.notify("快线周期必须小于慢线周期！", type='warning')
+                    return None
+                return params_dict
+            params_dict["period"] = int(self.indicator_period_input.value)
+            if rule_type == 'bollinger':
+                params_dict.update(std_dev=float(self.std_dev_input.value), band=self.band_select.value)
+            else:
+                params_dict.update(condition=self.indicator_condition_select.value,
+                                   threshold=float(self.indicator_threshold_input.value))
+        except (TypeError, ValueError):
+            ui.notify("指标参数格式不正确！", type='warning')
+            return None
+        if params_dict["period"] < 1:
+            ui.notify("指标周期必须大于等于1！", type='warning')
+            return None
+        return params_dict
+
     async def save_rule(self):
         name_val = self.rule_name_input.value
+        rule_type_val = self.rule_type_select.value
         threshold_val = self.threshold_price_input.value
         condition_val = self.condition_select.value
         cooldown_val = self.cooldown_input.value
         enabled_val = self.is_enabled_switch.value
 
+        if rule_type_val != 'price_alert':
+            if not name_val or cooldown_val is None:
+                ui.notify("所有字段均为必填项！", type='warning')
+                return
+            try:
+                cooldown = int(cooldown_val)
+            except ValueError:
+                ui.notify("冷却时间格式不正确！", type='warning')
+                return
+            if cooldown < 1:
+                ui.notify("冷却时间必须大于等于1秒！", type='warning')
+                return
+            if rule_type_val == 'kline_pattern':
+                params_dict = self._build_kline_params()
+                human_readable = describe_kline_rule(params_dict) if params_dict else ""
+            elif rule_type_val == 'expression':
+                params_dict = self._build_expression_params()
+                human_readable = f"满足 {params_dict['expression']}" if params_dict else ""
+            elif rule_type_val == 'pct_change':
+                params_dict = self._build_pct_change_params()
+                human_readable = describe_pct_change_rule(params_dict) if params_dict else ""
+            else:
+                params_dict = self._build_indicator_params(rule_type_val)
+                human_readable = describe_indicator_rule(rule_type_val, params_dict) if params_dict else ""
+            if params_dict is None:
+                return
+            await self._save(name_val, rule_type_val, params_dict, cooldown, enabled_val, human_readable)
+            return
+
         if not name_val or threshold_val is None or condition_val is None or cooldown_val is None:
             ui.notify("所有字段均为必填项！", type='warning')
             return
@@ -113,7 +375,13 @@ class RuleEditorForm:
         }
 
         human_readable = self._generate_human_readable_condition(threshold, condition_val)
+        await self._save(name_val, "price_alert", params_dict, cooldown, enabled_val, human_readable)
 
+    async def _save(self, name_val: str, rule_type: str, params_dict: Dict[str, Any], cooldown: int,
+                    enabled_val: bool, human_readable: str):
+        sinks_val = [name for name in (self.sinks_select.value or []) if name in NOTIFY_SINKS]
+        if sinks_val:
+            params_dict["sinks"] = sinks_val
         if self.rule_to_edit:
             self.rule_to_edit.name = name_val
             self.rule_to_edit.params = params_dict
@@ -125,7 +393,7 @@ class RuleEditorForm:
             rule_data = AlertRule(
                 pair_id=self.trading_pair_id,
                 name=name_val,
-                rule_type="price_alert",
+                rule_type=rule_type,
                 params=params_dict,
                 is_enabled=enabled_val,
                 cooldown_seconds=cooldown,
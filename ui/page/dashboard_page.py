@@ -4,34 +4,44 @@ import logging
 from nicegui import ui, app
 from typing import cast, List, Optional
 from ws_util.public_channel_manager import PublicChannelManager
+from ws_util.price_dispatcher import PriceConsumer
 from ui.component.trading_pair_card import TradingPairCard
 from ui.component.rule_editor_form import RuleEditorForm
 import db_manager
 from app_models import TradingPair, AlertRule
 from alert_system.alert_processor import AlertProcessor
+from alert_system.sharded_processor import ShardedAlertProcessor
+from alert_system.runtime_snapshot import RuntimeSnapshotter
+from config import RUNTIME_SNAPSHOT_PATH, ALERT_WORKER_PROCESSES
 
 logger = logging.getLogger(__name__)
 
 # --- 全局变量 ---
 pcm_instance: PublicChannelManager | None = None
-alert_processor_instance: AlertProcessor | None = None
+alert_processor_instance: AlertProcessor | ShardedAlertProcessor | None = None
+snapshotter_instance: RuntimeSnapshotter | None = None
+alert_tick_listener: PriceConsumer | None = None
 trading_pair_cards: dict[str, TradingPairCard] = {}
 cards_container: ui.grid | None = None
 
 
-def price_update_handler_factory(pair_id: int, inst_id: str):
-    """为指定instId创建价格更新回调处理函数。"""
+def price_update_handler_factory(inst_id: str):
+    """为指定instId创建界面价格更新回调处理函数 (以 conflate 方式注册，卡片只显示最新价格)。"""
 
     async def handler(price: str):
         if inst_id in trading_pair_cards and trading_pair_cards[inst_id].is_enabled:
             trading_pair_cards[inst_id].update_price(price)
 
-        if alert_processor_instance and trading_pair_cards[inst_id].is_enabled:
-            alert_processor_instance.process_price_data(pair_id, price)
-
     return handler
 
 
+def alert_tick_handler(inst_id: str, price: str, ts: Optional[int]):
+    """所有交易对的标记价格 (无损投递)，交给预警处理器评估。"""
+    card = trading_pair_cards.get(inst_id)
+    if alert_processor_instance and card and card.is_enabled:
+        alert_processor_instance.process_price_data(card.pair_id, price, ts)
+
+
 # --- 预警规则管理回调函数 ---
 async def _handle_save_alert_rule(rule_data: AlertRule, card_inst_id_to_refresh: str):
     """处理保存 (添加或更新) 预警规则"""
@@ -158,7 +168,7 @@ async def _update_single_pair_monitoring_status(
         if pcm_instance:
             logger.debug(f"PCM: 订阅 {inst_id}")
             await pcm_instance.subscribe_mark_price(inst_id, resubscribe_check=False)
-            pcm_instance.register_price_update_callback(inst_id, price_update_handler_factory(pair_id, inst_id))
+            pcm_instance.register_price_update_callback(inst_id, price_update_handler_factory(inst_id), conflate=True)
         if alert_processor_instance:
             logger.debug(f"AlertProcessor: 加载规则 for {inst_id} (PairID: {pair_id})")
             alert_processor_instance.load_rules_for_pair(pair_id, inst_id)
@@ -249,8 +259,9 @@ async def setup_page_content():
             current_cards_container = cards_container
 
         if pcm_instance:
-            for inst_id_old in list(trading_pair_cards.keys()):
-                await pcm_instance.unsubscribe_mark_price(inst_id_old)
+            old_inst_ids = list(trading_pair_cards.keys())
+            pcm_instance.unsubscribe_many(old_inst_ids)  # 合并为少量多参数帧发送
+            for inst_id_old in old_inst_ids:
                 pcm_instance.unregister_price_update_callback(inst_id_old)
         if alert_processor_instance:
             # 从 AlertProcessor 的内部状态 _instId_map 获取 pair_id 列表进行清理
@@ -263,6 +274,7 @@ async def setup_page_content():
         db_pairs = db_manager.get_all_trading_pairs()
         logger.info(f"从数据库加载到 {len(db_pairs)} 个交易对用于显示。")
 
+        inst_ids_to_subscribe: List[str] = []
         with current_cards_container:
             for pair_model in db_pairs:
                 if not pair_model.id: continue
@@ -283,13 +295,16 @@ async def setup_page_content():
 
                 if pair_model.is_enabled:
                     if pcm_instance:
-                        await pcm_instance.subscribe_mark_price(pair_model.instId, resubscribe_check=False)
+                        inst_ids_to_subscribe.append(pair_model.instId)
                         pcm_instance.register_price_update_callback(
-                            pair_model.instId, price_update_handler_factory(pair_model.id, pair_model.instId)
+                            pair_model.instId, price_update_handler_factory(pair_model.instId), conflate=True
                         )
                     if alert_processor_instance:
                         alert_processor_instance.load_rules_for_pair(pair_model.id, pair_model.instId)
 
+        if pcm_instance and inst_ids_to_subscribe:
+            pcm_instance.subscribe_many(inst_ids_to_subscribe)
+
         with ui.row(wrap=False).classes('mt-8 items-center gap-x-2'):
             new_inst_id_input = ui.input(label="添加交易对 (例如 BTC-USDT-SWAP)", placeholder="ETH-USDT-SWAP") \
                 .props('outlined dense clearable').classes('flex-grow')
@@ -318,7 +333,7 @@ async def setup_page_content():
                     if pcm_instance:
                         await pcm_instance.subscribe_mark_price(inst_id, resubscribe_check=False)
                         pcm_instance.register_price_update_callback(
-                            inst_id, price_update_handler_factory(pair_db_id, inst_id)
+                            inst_id, price_update_handler_factory(inst_id), conflate=True
                         )
                     if alert_processor_instance:
                         alert_processor_instance.load_rules_for_pair(pair_db_id, inst_id)
@@ -330,29 +345,52 @@ async def setup_page_content():
 
 
 async def on_app_startup():
-    global pcm_instance, alert_processor_instance
+    global pcm_instance, alert_processor_instance, snapshotter_instance, alert_tick_listener
     logger.info("应用启动...")
     db_manager.initialize_database()
     if not db_manager.get_all_trading_pairs(): #
         db_manager.add_trading_pair(TradingPair(instId="BTC-USDT-SWAP", is_enabled=True)) #
         logger.info("已添加默认交易对 BTC-USDT-SWAP。") #
 
-    if pcm_instance is None: pcm_instance = PublicChannelManager()
-    if alert_processor_instance is None: alert_processor_instance = AlertProcessor()
+    if pcm_instance is None:
+        pcm_instance = PublicChannelManager()
+        alert_tick_listener = pcm_instance.add_tick_listener(alert_tick_handler, conflate=False)  # 预警评估需要每一个价格
+    if alert_processor_instance is None:
+        # 配置了工作进程时规则在进程池中评估，主进程只写共享价格表
+        alert_processor_instance = ShardedAlertProcessor() if ALERT_WORKER_PROCESSES else AlertProcessor()
+    if RUNTIME_SNAPSHOT_PATH and snapshotter_instance is None:
+        # 在加载规则、收到第一个价格之前恢复规则状态与最新价格，重启后已越过阈值的规则不会重复触发
+        snapshotter_instance = RuntimeSnapshotter(alert_processor_instance, pcm_instance)
+        snapshotter_instance.restore()
+    alert_processor_instance.start()  # 批量评估模式下启动周期评估任务
+    if snapshotter_instance:
+        snapshotter_instance.start()
     asyncio.create_task(pcm_instance.start())
 
 
 async def on_app_shutdown():
-    global pcm_instance, alert_processor_instance
+    global pcm_instance, alert_processor_instance, snapshotter_instance, alert_tick_listener
     logger.info("应用关闭...")
+    inst_ids = list(trading_pair_cards.keys())
+    # 先停止行情: 之后不再有价格进入预警处理器 (停止后的处理器不再评估，通知也不会重新启动发送协程)
     if pcm_instance:
-        for inst_id in list(trading_pair_cards.keys()):
-            card = trading_pair_cards.get(inst_id)
-            if card and card.pair_id and alert_processor_instance:
-                alert_processor_instance.remove_rules_for_pair(card.pair_id)
-            await pcm_instance.unsubscribe_mark_price(inst_id)
+        if alert_tick_listener is not None:
+            pcm_instance.remove_tick_listener(alert_tick_listener)
+            alert_tick_listener = None
+        for inst_id in inst_ids:
             pcm_instance.unregister_price_update_callback(inst_id)
+        pcm_instance.unsubscribe_many(inst_ids)
         await pcm_instance.stop()
+    if alert_processor_instance:
+        await alert_processor_instance.stop()
+    if snapshotter_instance:
+        await snapshotter_instance.stop()  # 在移除规则缓存之前保存最后一次快照
+        snapshotter_instance = None
+    if alert_processor_instance:
+        for inst_id in inst_ids:
+            card = trading_pair_cards.get(inst_id)
+            if card and card.pair_id:
+                alert_processor_instance.remove_rules_for_pair(card.pair_id)
     trading_pair_cards.clear()
 
 
@@ -1,12 +1,25 @@
 import asyncio
 import logging
 import ssl
+import time
+from typing import Optional
 
 import certifi
 import websockets
 
 logger = logging.getLogger(__name__)
 
+_ssl_context: Optional[ssl.SSLContext] = None
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """返回进程内共享的 SSL 上下文，证书包只在第一次调用时读取。"""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+        _ssl_context.load_verify_locations(certifi.where())
+    return _ssl_context
+
 
 class WebSocketFactory:
 
@@ -14,15 +27,19 @@ class WebSocketFactory:
         self.url = url
         self.websocket = None
         self.loop = asyncio.get_event_loop()
+        self.last_connect_duration: Optional[float] = None  # 最近一次建连耗时（秒）
 
     async def connect(self):
-        ssl_context = ssl.create_default_context()
-        ssl_context.load_verify_locations(certifi.where())
+        # 本地模拟器等 ws:// 地址不使用 TLS
+        ssl_context = get_ssl_context() if self.url.startswith("wss://") else None
+        started_at = time.perf_counter()
         try:
             self.websocket = await websockets.connect(self.url, ssl=ssl_context)
-            logger.info("WebSocket connection established.")
+            self.last_connect_duration = time.perf_counter() - started_at
+            logger.info(f"WebSocket connection established in {self.last_connect_duration * 1000:.0f} ms.")
             return self.websocket
         except Exception as e:
+            self.last_connect_duration = time.perf_counter() - started_at
             logger.error(f"Error connecting to WebSocket: {e}")
             return None
 
@@ -0,0 +1,34 @@
+# ws_util/backoff.py
+import random
+from config import WS_RECONNECT_INITIAL_DELAY, WS_RECONNECT_MAX_DELAY, WS_RECONNECT_JITTER
+
+
+class ExponentialBackoff:
+    """
+    带抖动的指数退避。
+    第一次重试立即进行 (延迟为 0)，之后按 initial * multiplier^n 增长并以 maximum 封顶；
+    抖动把延迟随机缩小最多 jitter 比例，避免多个连接同时重连。
+    """
+
+    def __init__(self,
+                 initial: float = WS_RECONNECT_INITIAL_DELAY,
+                 maximum: float = WS_RECONNECT_MAX_DELAY,
+                 multiplier: float = 2.0,
+                 jitter: float = WS_RECONNECT_JITTER):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        """返回下一次重试前应等待的秒数。"""
+        attempt = self.attempt
+        self.attempt += 1
+        if attempt == 0:
+            return 0.0
+        delay = min(self.maximum, self.initial * (self.multiplier ** (attempt - 1)))
+        return delay * (1 - random.uniform(0, self.jitter))
+
+    def reset(self):
+        self.attempt = 0
@@ -0,0 +1,182 @@
+# ws_util/connection_pool.py
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from ws_util.ws_client_public import PublicConnectionManager
+from ws_util.ingest_queue import IngestQueue
+from ws_util.frame_codec import decode_frame
+from ws_util.redundant_connection import RedundantConnectionManager
+from ws_util.frame_recorder import FrameRecorder
+from config import WS_POOL_SIZE, WS_POOL_START_STAGGER, WS_REDUNDANT_FEED
+
+logger = logging.getLogger(__name__)
+
+
+def _shard_score(shard_id: int, inst_id: str) -> int:
+    """rendezvous 哈希得分，与进程、运行次数无关 (不使用内置 hash)。"""
+    digest = hashlib.blake2b(f"{shard_id}:{inst_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def pick_shard(inst_id: str, pool_size: int) -> int:
+    """为 instId 选择分片。池大小变化时只有得分最高分片发生变化的 instId 会被迁移。"""
+    return max(range(pool_size), key=lambda shard_id: _shard_score(shard_id, inst_id))
+
+
+class PublicConnectionPool:
+    """
+    公共频道连接池。
+    按稳定哈希把 instId 分散到多个 PublicConnectionManager 上，每个分片独立连接、独立重连。
+    redundant=True 时每个分片为一组热备冗余连接 (RedundantConnectionManager)。
+    """
+
+    def __init__(self, url: str, size: int = WS_POOL_SIZE,
+                 connection_factory: Optional[Callable[..., PublicConnectionManager]] = None,
+                 redundant: bool = WS_REDUNDANT_FEED,
+                 recorder: Optional[FrameRecorder] = None):
+        self.url = url
+        self.recorder = recorder  # 所有分片共用的原始帧录制器 (可选)
+        if connection_factory is None:
+            connection_factory = RedundantConnectionManager if redundant else PublicConnectionManager
+        self._connection_factory = connection_factory
+        self._size = max(1, size)
+        self.shards: Dict[int, PublicConnectionManager] = {}
+        self._shard_tasks: Dict[int, asyncio.Task] = {}
+        self._shard_cache: Dict[str, int] = {}  # instId -> 分片ID 缓存
+        self.message_callback: Optional[Callable[[Any], None]] = None
+        self.status_callback: Optional[Callable[[int, bool], Awaitable[None]]] = None  # (分片ID, 是否已连接)
+        self._running = False
+        # 所有分片共用一个有界接收队列，同一 instId 的消息总由同一消费者处理
+        self.ingest_queue = IngestQueue(self._deliver_message)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def set_message_callback(self, callback: Callable[[Any], None]):
+        """设置所有分片共用的消息回调 (由共用接收队列的消费者调用)。"""
+        self.message_callback = callback
+
+    def set_connection_status_callback(self, callback: Callable[[int, bool], Awaitable[None]]):
+        """设置分片连接状态回调，回调参数为 (分片ID, 是否已连接)。"""
+        self.status_callback = callback
+
+    def shard_for(self, inst_id: str) -> int:
+        shard_id = self._shard_cache.get(inst_id)
+        if shard_id is None:
+            shard_id = pick_shard(inst_id, self._size)
+            self._shard_cache[inst_id] = shard_id
+        return shard_id
+
+    def is_connected(self, shard_id: int) -> bool:
+        shard = self.shards.get(shard_id)
+        return bool(shard and shard.websocket)
+
+    async def _deliver_message(self, message: Any):
+        if self.message_callback:
+            data = decode_frame(message)
+            if asyncio.iscoroutinefunction(self.message_callback):
+                await self.message_callback(data)
+            else:
+                self.message_callback(data)
+
+    def _make_status_callback(self, shard_id: int):
+        async def on_status(is_connected: bool):
+            if self.status_callback:
+                await self.status_callback(shard_id, is_connected)
+        return on_status
+
+    def _create_shard(self, shard_id: int) -> PublicConnectionManager:
+        shard = self._connection_factory(self.url, ingest_queue=self.ingest_queue)
+        shard.recorder = self.recorder
+        shard.set_connection_status_callback(self._make_status_callback(shard_id))
+        self.shards[shard_id] = shard
+        return shard
+
+    async def _run_shard(self, shard_id: int, delay: float):
+        # 错开各分片的首次连接，避免同时建连/重连
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.shards[shard_id].start()
+
+    def _start_shard(self, shard_id: int, delay: float = 0.0):
+        self._shard_tasks[shard_id] = asyncio.create_task(self._run_shard(shard_id, delay))
+
+    async def start(self):
+        """启动所有分片连接，直到全部停止后返回。"""
+        if self._running:
+            logger.warning("连接池已在运行中。")
+            return
+        self._running = True
+        logger.info(f"PublicConnectionPool: 正在启动 {self._size} 个分片连接...")
+        self.ingest_queue.start()
+        for shard_id in range(self._size):
+            if shard_id not in self.shards:
+                self._create_shard(shard_id)
+            self._start_shard(shard_id, shard_id * WS_POOL_START_STAGGER)
+        while self._running and self._shard_tasks:
+            await asyncio.gather(*list(self._shard_tasks.values()), return_exceptions=True)
+            # 若期间有分片被重新创建 (resize)，继续等待新的任务
+            if all(task.done() for task in self._shard_tasks.values()):
+                break
+        logger.info("PublicConnectionPool: 已停止。")
+
+    async def send_json_payload(self, shard_id: int, payload: Any) -> bool:
+        shard = self.shards.get(shard_id)
+        if shard is None:
+            shard = self._create_shard(shard_id)
+        return await shard.send_json_payload(payload)
+
+    async def resize(self, new_size: int, inst_ids: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+        """
+        调整分片数量。
+
+        返回:
+            Dict[str, Tuple[int, int]]: 需要迁移的 instId -> (旧分片ID, 新分片ID)。
+                                        调用方负责在旧分片取消订阅、在新分片订阅。
+        """
+        new_size = max(1, new_size)
+        if new_size == self._size:
+            return {}
+        moves: Dict[str, Tuple[int, int]] = {}
+        for inst_id in inst_ids:
+            old_shard = self.shard_for(inst_id)
+            new_shard = pick_shard(inst_id, new_size)
+            if old_shard != new_shard:
+                moves[inst_id] = (old_shard, new_shard)
+
+        old_size, self._size = self._size, new_size
+        self._shard_cache.clear()
+        logger.info(f"连接池由 {old_size} 调整为 {new_size} 个分片，迁移 {len(moves)} 个 instId。")
+
+        for shard_id in range(old_size, new_size):
+            if shard_id not in self.shards:
+                self._create_shard(shard_id)
+            if self._running:
+                self._start_shard(shard_id)
+        for shard_id in range(new_size, old_size):
+            shard = self.shards.pop(shard_id, None)
+            self._shard_tasks.pop(shard_id, None)
+            if shard:
+                await shard.stop()
+        return moves
+
+    async def stop(self):
+        self._running = False
+        shards: List[PublicConnectionManager] = list(self.shards.values())
+        await asyncio.gather(*(shard.stop() for shard in shards), return_exceptions=True)
+        self._shard_tasks.clear()
+        await self.ingest_queue.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """接收队列深度等计数器，以及各分片的连接统计。"""
+        stats = {
+            "ingest": self.ingest_queue.stats(),
+            "shards": {shard_id: shard.get_stats() for shard_id, shard in self.shards.items()},
+        }
+        if self.recorder is not None:
+            stats["recorder"] = self.recorder.stats()
+        return stats
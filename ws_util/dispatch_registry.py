@@ -0,0 +1,132 @@
+# ws_util/dispatch_registry.py
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from ws_util.price_dispatcher import PriceConsumer
+
+logger = logging.getLogger(__name__)
+
+SubscriptionKey = Tuple[str, str]  # (channel, instId)
+
+
+def _mark_price_value(item: Dict[str, Any]) -> Any:
+    return item.get("markPx")
+
+
+def _raw_item(item: Any) -> Any:
+    return item
+
+
+# 各频道推送给订阅者的值: mark-price 为价格字符串 (兼容原有回调)，其余频道为 data 中的原始条目
+# (tickers/trades/books 等为字典，candle 为 [ts, o, h, l, c, ...] 列表)
+CHANNEL_VALUE_EXTRACTORS: Dict[str, Callable[[Any], Any]] = {
+    "mark-price": _mark_price_value,
+    "tickers": _raw_item,
+    "trades": _raw_item,
+    "books": _raw_item,
+    "books5": _raw_item,
+    "bbo-tbt": _raw_item,
+    "index-tickers": _raw_item,
+    "funding-rate": _raw_item,
+    "open-interest": _raw_item,
+    "price-limit": _raw_item,
+}
+
+
+class SubscriptionHandle:
+    """订阅者句柄，用于取消订阅。"""
+
+    __slots__ = ("channel", "inst_id", "consumer")
+
+    def __init__(self, channel: str, inst_id: str, consumer: PriceConsumer):
+        self.channel = channel
+        self.inst_id = inst_id
+        self.consumer = consumer
+
+    @property
+    def key(self) -> SubscriptionKey:
+        return self.channel, self.inst_id
+
+
+class DispatchRegistry:
+    """
+    按 (channel, instId) 分发频道数据的注册表。
+    同一 key 可以有多个订阅者，引用计数归零 (且未被固定) 时才需要在交易所取消订阅；
+    每条消息只做一次字典查找即可找到全部订阅者。
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[SubscriptionKey, List[SubscriptionHandle]] = {}
+        self._pinned: Set[SubscriptionKey] = set()  # 无回调但需要保持订阅的 key (subscribe_many)
+        self._extractor_cache: Dict[str, Callable[[Any], Any]] = {}
+
+    def is_desired(self, key: SubscriptionKey) -> bool:
+        return key in self._subscribers or key in self._pinned
+
+    def subscriber_count(self, channel: str, inst_id: str) -> int:
+        return len(self._subscribers.get((channel, inst_id), ()))
+
+    def add(self, channel: str, inst_id: str, callback: Callable[[Any], Any],
+            conflate: bool = False) -> Tuple[SubscriptionHandle, bool]:
+        """添加订阅者，返回 (句柄, 该 key 是否由此变为需要订阅)。"""
+        key = (channel, inst_id)
+        newly_desired = not self.is_desired(key)
+        consumer = PriceConsumer(callback, conflate=conflate,
+                                 name=f"{channel}:{inst_id}:{getattr(callback, '__name__', 'callback')}")
+        handle = SubscriptionHandle(channel, inst_id, consumer)
+        self._subscribers.setdefault(key, []).append(handle)
+        return handle, newly_desired
+
+    def remove(self, handle: SubscriptionHandle) -> bool:
+        """移除订阅者，返回该 key 是否由此变为不再需要订阅。"""
+        key = handle.key
+        handles = self._subscribers.get(key)
+        if not handles or handle not in handles:
+            return False
+        handles.remove(handle)
+        handle.consumer.cancel()
+        if not handles:
+            del self._subscribers[key]
+        return not self.is_desired(key)
+
+    def pin(self, key: SubscriptionKey) -> bool:
+        newly_desired = not self.is_desired(key)
+        self._pinned.add(key)
+        return newly_desired
+
+    def unpin(self, key: SubscriptionKey) -> bool:
+        if key not in self._pinned:
+            return False
+        self._pinned.discard(key)
+        return not self.is_desired(key)
+
+    def handles_for(self, channel: str, inst_id: str) -> List[SubscriptionHandle]:
+        return list(self._subscribers.get((channel, inst_id), ()))
+
+    def _extractor_for(self, channel: str) -> Callable[[Any], Any]:
+        extractor = self._extractor_cache.get(channel)
+        if extractor is None:
+            extractor = CHANNEL_VALUE_EXTRACTORS.get(channel, _raw_item)  # candle1m、candle1H 等同样为原始条目
+            self._extractor_cache[channel] = extractor
+        return extractor
+
+    def dispatch(self, channel: Optional[str], inst_id: Optional[str], items: List[Any]):
+        handles = self._subscribers.get((channel, inst_id))
+        if not handles:
+            return
+        extract = self._extractor_for(channel)
+        for item in items:
+            value = extract(item)
+            if value is None:
+                continue
+            for handle in handles:
+                handle.consumer.offer(inst_id, (value,))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [handle.consumer.stats() for handles in self._subscribers.values() for handle in handles]
+
+    def clear(self):
+        for handles in self._subscribers.values():
+            for handle in handles:
+                handle.consumer.cancel()
+        self._subscribers.clear()
+        self._pinned.clear()
@@ -0,0 +1,102 @@
+# ws_util/frame_codec.py
+# WebSocket 帧解码: 优先使用已安装的高性能 JSON 库 (orjson / ujson)，否则回退到标准库 json；
+# 并提供不做完整解析的帧预分类，用于在接收循环中快速路由。
+import json
+import logging
+from typing import Any, Callable, Optional, Tuple
+from config import WS_JSON_DECODER
+
+logger = logging.getLogger(__name__)
+
+# 帧类型
+FRAME_PING = "ping"
+FRAME_PONG = "pong"
+FRAME_DATA = "data"  # 频道数据推送 {"arg": {...}, "data": [...]}
+FRAME_EVENT = "event"  # 订阅确认、错误等 {"event": ..., ...}
+FRAME_UNKNOWN = "unknown"  # 无法预分类，需要完整解析
+
+
+def _load_decoder(name: str) -> Optional[Callable[[Any], Any]]:
+    if name == "orjson":
+        try:
+            import orjson
+            return orjson.loads
+        except ImportError:
+            return None
+    if name == "ujson":
+        try:
+            import ujson
+            return ujson.loads
+        except ImportError:
+            return None
+    if name == "json":
+        return json.loads
+    raise ValueError(f"未知的 JSON 解码器: {name}")
+
+
+def select_decoder(preferred: str = WS_JSON_DECODER) -> Tuple[str, Callable[[Any], Any]]:
+    """按偏好选择解码器。'auto' 时依次尝试 orjson、ujson、json。"""
+    candidates = ("orjson", "ujson", "json") if preferred == "auto" else (preferred, "json")
+    for name in candidates:
+        decoder = _load_decoder(name)
+        if decoder is not None:
+            return name, decoder
+    return "json", json.loads
+
+
+DECODER_NAME, loads = select_decoder()
+logger.debug(f"WebSocket 帧解码器: {DECODER_NAME}")
+
+
+def decode_frame(raw: Any) -> Any:
+    """解析帧为 Python 对象；非 JSON 内容原样返回。"""
+    try:
+        return loads(raw)
+    except ValueError:  # json.JSONDecodeError / orjson.JSONDecodeError 均继承自 ValueError
+        return raw
+
+
+_ARG_PREFIX = '{"arg":{'
+_CHANNEL_FIELD = '"channel":"'
+_INST_ID_FIELD = '"instId":"'
+
+
+def _extract_field(raw: str, field: str, start: int, end: int) -> Optional[str]:
+    pos = raw.find(field, start, end)
+    if pos < 0:
+        return None
+    pos += len(field)
+    stop = raw.find('"', pos, end)
+    return raw[pos:stop] if stop > 0 else None
+
+
+def classify_frame(raw: Any) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    不做完整 JSON 解析，根据帧开头的字节判断帧类型。
+
+    返回:
+        Tuple[str, Optional[str], Optional[str]]: (帧类型, channel, instId)。
+        对于数据推送，从 "arg" 对象中截取 channel 与 instId 以便路由；其余类型可能为 None。
+    """
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8", "replace")
+    if raw == "ping":
+        return FRAME_PING, None, None
+    if raw == "pong":
+        return FRAME_PONG, None, None
+    if raw.startswith(_ARG_PREFIX):
+        arg_end = raw.find("}", len(_ARG_PREFIX))
+        if arg_end > 0:
+            channel = _extract_field(raw, _CHANNEL_FIELD, len(_ARG_PREFIX) - 1, arg_end)
+            inst_id = _extract_field(raw, _INST_ID_FIELD, len(_ARG_PREFIX) - 1, arg_end)
+            if '"data":' in raw[arg_end:arg_end + 16]:
+                return FRAME_DATA, channel, inst_id
+            return FRAME_UNKNOWN, channel, inst_id
+    if raw.startswith('{"event":'):
+        arg_start = raw.find('"arg":{')
+        if arg_start > 0:
+            arg_end = raw.find("}", arg_start)
+            return (FRAME_EVENT, _extract_field(raw, _CHANNEL_FIELD, arg_start, arg_end),
+                    _extract_field(raw, _INST_ID_FIELD, arg_start, arg_end))
+        return FRAME_EVENT, None, None
+    return FRAME_UNKNOWN, None, None
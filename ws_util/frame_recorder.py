@@ -0,0 +1,150 @@
+# ws_util/frame_recorder.py
+import asyncio
+import gzip
+import logging
+import os
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from ws_util.frame_codec import classify_frame, decode_frame, FRAME_PING, FRAME_PONG
+from config import WS_RECORD_SEGMENT_BYTES, WS_RECORD_COMPRESS
+
+logger = logging.getLogger(__name__)
+
+# 每条记录: 头部 (接收时间戳秒 float64, 帧长度 uint32，小端) + UTF-8 帧内容
+_RECORD_HEADER = struct.Struct("<dI")
+_SEGMENT_PREFIX = "frames-"
+_SEGMENT_SUFFIX = ".seg"
+
+
+class FrameRecorder:
+    """
+    原始帧录制器。
+    把收到的每一帧 (进入接收队列的帧以及 ping/pong 心跳帧) 连同接收时间戳追加写入分段文件，单个分段超过 segment_max_bytes (未压缩字节) 后切换新文件；
+    compress=True 时分段以 gzip 写入。写入经过缓冲，调用开销只是一次内存拷贝。
+    """
+
+    def __init__(self, directory: str,
+                 segment_max_bytes: int = WS_RECORD_SEGMENT_BYTES,
+                 compress: bool = WS_RECORD_COMPRESS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.compress = compress
+        self._file: Any = None
+        self._segment_bytes = 0
+        self._segment_seq = 0
+        self.segment_path: Optional[str] = None
+        self.frames_recorded = 0
+        self.bytes_recorded = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self):
+        self.close()
+        self._segment_seq += 1
+        name = f"{_SEGMENT_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{self._segment_seq:04d}{_SEGMENT_SUFFIX}"
+        if self.compress:
+            name += ".gz"
+        self.segment_path = os.path.join(self.directory, name)
+        if self.compress:
+            self._file = gzip.open(self.segment_path, "ab", compresslevel=1)
+        else:
+            self._file = open(self.segment_path, "ab", buffering=1024 * 1024)
+        self._segment_bytes = 0
+        logger.info(f"帧录制: 写入新分段 {self.segment_path}")
+
+    def record(self, raw: Any, recv_ts: Optional[float] = None):
+        """追加一帧。recv_ts 为接收时的 time.time()，默认取当前时间。"""
+        data = raw.encode("utf-8") if isinstance(raw, str) else bytes(raw)
+        if self._file is None or self._segment_bytes >= self.segment_max_bytes:
+            self._open_segment()
+        self._file.write(_RECORD_HEADER.pack(time.time() if recv_ts is None else recv_ts, len(data)))
+        self._file.write(data)
+        size = _RECORD_HEADER.size + len(data)
+        self._segment_bytes += size
+        self.bytes_recorded += size
+        self.frames_recorded += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "segment": self.segment_path,
+            "frames_recorded": self.frames_recorded,
+            "bytes_recorded": self.bytes_recorded,
+        }
+
+
+def list_segments(path: str) -> List[str]:
+    """path 为目录时按文件名 (即录制顺序) 返回其中的所有分段，为文件时返回该文件。"""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if name.startswith(_SEGMENT_PREFIX) and (name.endswith(_SEGMENT_SUFFIX) or name.endswith(_SEGMENT_SUFFIX + ".gz")))
+
+
+def iter_frames(path: str) -> Iterator[Tuple[float, str]]:
+    """依次读出 (接收时间戳, 原始帧)。末尾不完整的记录 (录制进程异常退出) 会被忽略。"""
+    for segment in list_segments(path):
+        opener = gzip.open if segment.endswith(".gz") else open
+        with opener(segment, "rb") as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    break
+                recv_ts, length = _RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    logger.warning(f"分段 {segment} 末尾记录不完整，已忽略。")
+                    break
+                yield recv_ts, data.decode("utf-8")
+
+
+class FrameReplayer:
+    """
+    按录制时的时间间隔回放帧。speed 为回放倍速 (1 为原速，N 为 N 倍速)，0 表示不等待、尽快回放。
+    ping/pong 帧保留在录制中用于分析心跳时序，回放时不交给 on_message；其余帧解析后交给 on_message
+    (通常为 PublicChannelManager._on_message)。
+    """
+
+    def __init__(self, on_message: Callable[[Any], Awaitable[None]], speed: float = 1.0):
+        self.on_message = on_message
+        self.speed = speed
+        self.frames_replayed = 0
+        self.heartbeat_frames = 0  # 录制中的 ping/pong 帧数
+
+    async def replay(self, path: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        first_ts: Optional[float] = None
+        last_yield = started_at
+        for recv_ts, raw in iter_frames(path):
+            frame_type, _, _ = classify_frame(raw)
+            if frame_type in (FRAME_PING, FRAME_PONG):
+                self.heartbeat_frames += 1
+                continue
+            if first_ts is None:
+                first_ts = recv_ts
+            if self.speed > 0:
+                wait = started_at + (recv_ts - first_ts) / self.speed - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await self.on_message(decode_frame(raw))
+            self.frames_replayed += 1
+            now = loop.time()
+            if now - last_yield > 0.05:  # 全速回放时定期让出事件循环，以便回调中创建的任务得到执行
+                last_yield = now
+                await asyncio.sleep(0)
+        elapsed = loop.time() - started_at
+        return {
+            "frames": self.frames_replayed,
+            "heartbeat_frames": self.heartbeat_frames,
+            "elapsed": elapsed,
+            "frames_per_second": self.frames_replayed / elapsed if elapsed > 0 else float("inf"),
+        }
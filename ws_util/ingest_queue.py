@@ -0,0 +1,154 @@
+# ws_util/ingest_queue.py
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+from config import WS_INGEST_QUEUE_SIZE, WS_INGEST_WORKERS, WS_INGEST_OVERFLOW_POLICY
+
+logger = logging.getLogger(__name__)
+
+# 溢出策略
+OVERFLOW_BLOCK = "block"  # 队列满时阻塞生产者 (反压到 socket 读取)
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃该通道中最旧的一条
+OVERFLOW_CONFLATE = "conflate"  # 用新值覆盖同一 key 尚未处理的旧值，无可覆盖项时丢弃最旧的一条
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_CONFLATE)
+
+
+class _Lane:
+    """单个消费者的通道。同一 route_key 总是进入同一通道，从而保证按 instId 有序。"""
+
+    __slots__ = ("items", "pending_by_key", "capacity", "not_empty", "not_full")
+
+    def __init__(self, capacity: int):
+        self.items: Deque[List[Any]] = deque()  # 条目: [conflate_key, payload]
+        self.pending_by_key: Dict[Hashable, List[Any]] = {}  # conflate_key -> 尚未处理的条目
+        self.capacity = capacity
+        self.not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+
+
+class IngestQueue:
+    """
+    有界行情接收队列。
+    由固定数量的消费者协程处理，取代"每帧一个 task"的做法；队列满时按溢出策略处理。
+    """
+
+    def __init__(self,
+                 handler: Callable[[Any], Awaitable[None]],
+                 maxsize: int = WS_INGEST_QUEUE_SIZE,
+                 workers: int = WS_INGEST_WORKERS,
+                 overflow_policy: str = WS_INGEST_OVERFLOW_POLICY):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow_policy}，可选: {OVERFLOW_POLICIES}")
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._maxsize = max(self._workers, maxsize)
+        self.overflow_policy = overflow_policy
+        self._lanes: List[_Lane] = []
+        self._worker_tasks: List[asyncio.Task] = []
+
+        # 计数器
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked = 0  # 生产者因队列满而等待的次数
+        self.high_watermark = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._worker_tasks)
+
+    def start(self):
+        """启动消费者协程 (可重复调用)。"""
+        if self._worker_tasks:
+            return
+        per_lane = self._maxsize // self._workers
+        self._lanes = [_Lane(per_lane) for _ in range(self._workers)]
+        self._worker_tasks = [asyncio.create_task(self._worker(lane)) for lane in self._lanes]
+        logger.info(f"行情接收队列已启动: {self._workers} 个消费者, 容量 {self._maxsize}, 溢出策略 {self.overflow_policy}")
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._lanes = []
+
+    def depth(self) -> int:
+        return sum(len(lane.items) for lane in self._lanes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth(),
+            "lane_depths": [len(lane.items) for lane in self._lanes],
+            "capacity": self._maxsize,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "blocked": self.blocked,
+            "high_watermark": self.high_watermark,
+        }
+
+    async def put(self, route_key: Optional[Hashable], payload: Any, conflate_key: Optional[Hashable] = None):
+        """
+        放入一条消息。
+
+        参数:
+            route_key: 路由键 (通常为 instId)，相同路由键的消息按到达顺序处理。
+            payload: 交给 handler 的消息。
+            conflate_key: 可被合并的消息的键 (如 (channel, instId) 的数据推送)，None 表示不可合并。
+        """
+        if not self._lanes:
+            self.start()
+        lane = self._lanes[hash(route_key) % self._workers if route_key is not None else 0]
+
+        if len(lane.items) >= lane.capacity:
+            if self.overflow_policy == OVERFLOW_CONFLATE and conflate_key is not None:
+                pending = lane.pending_by_key.get(conflate_key)
+                if pending is not None:
+                    pending[1] = payload  # 原位覆盖为最新值
+                    self.conflated += 1
+                    return
+            if self.overflow_policy == OVERFLOW_BLOCK:
+                self.blocked += 1
+                while len(lane.items) >= lane.capacity:
+                    lane.not_full.clear()
+                    await lane.not_full.wait()
+            else:
+                self._drop_oldest(lane)
+
+        entry = [conflate_key, payload]
+        lane.items.append(entry)
+        if conflate_key is not None:
+            lane.pending_by_key[conflate_key] = entry
+        lane.not_empty.set()
+        self.enqueued += 1
+        depth = len(lane.items)
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+
+    def _drop_oldest(self, lane: _Lane):
+        entry = lane.items.popleft()
+        if entry[0] is not None and lane.pending_by_key.get(entry[0]) is entry:
+            del lane.pending_by_key[entry[0]]
+        self.dropped += 1
+
+    async def _worker(self, lane: _Lane):
+        while True:
+            if not lane.items:
+                lane.not_empty.clear()
+                await lane.not_empty.wait()
+                continue
+            entry = lane.items.popleft()
+            conflate_key = entry[0]
+            if conflate_key is not None and lane.pending_by_key.get(conflate_key) is entry:
+                del lane.pending_by_key[conflate_key]
+            lane.not_full.set()
+            try:
+                await self._handler(entry[1])
+            except Exception as e:
+                logger.error(f"行情接收队列处理消息时发生错误: {e}", exc_info=True)
+            self.processed += 1
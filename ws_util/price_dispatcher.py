@@ -0,0 +1,86 @@
+# ws_util/price_dispatcher.py
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PriceConsumer:
+    """
+    价格消费者的分发器。
+    conflate=True 时每个 key (instId) 只保留一个"最新待处理"槽位，消费者空闲后只收到最新值，
+    适用于界面显示；conflate=False 时按顺序无损投递每一条，适用于预警评估。
+    """
+
+    def __init__(self, callback: Callable[..., Any], conflate: bool = False, name: Optional[str] = None):
+        self.callback = callback
+        self.conflate = conflate
+        self.name = name or getattr(callback, "__name__", "consumer")
+        self._is_coroutine = asyncio.iscoroutinefunction(callback)
+        self._latest: Dict[Hashable, Tuple[Any, ...]] = {}  # conflate 模式: key -> 最新参数
+        self._queue: Deque[Tuple[Any, ...]] = deque()  # 无损模式: 按到达顺序的参数
+        self._drain_task: Optional[asyncio.Task] = None
+        self.delivered = 0
+        self.conflated = 0
+
+    @property
+    def busy(self) -> bool:
+        return self._drain_task is not None and not self._drain_task.done()
+
+    def pending(self) -> int:
+        return len(self._latest) if self.conflate else len(self._queue)
+
+    def offer(self, key: Hashable, args: Tuple[Any, ...]):
+        """投递一条更新，不会阻塞调用方。"""
+        if not self._is_coroutine and not self.busy:
+            # 同步回调且没有积压时直接调用，无需排队
+            self._invoke_sync(args)
+            return
+        if self.conflate:
+            if key in self._latest:
+                self.conflated += 1
+            self._latest[key] = args
+        else:
+            self._queue.append(args)
+        if not self.busy:
+            self._drain_task = asyncio.create_task(self._drain())
+
+    def _invoke_sync(self, args: Tuple[Any, ...]):
+        try:
+            self.callback(*args)
+        except Exception as e:
+            logger.error(f"价格消费者 {self.name} 执行回调时发生错误: {e}", exc_info=True)
+        self.delivered += 1
+
+    def _next(self) -> Optional[Tuple[Any, ...]]:
+        if self.conflate:
+            if not self._latest:
+                return None
+            key = next(iter(self._latest))
+            return self._latest.pop(key)
+        return self._queue.popleft() if self._queue else None
+
+    async def _drain(self):
+        while (args := self._next()) is not None:
+            if self._is_coroutine:
+                try:
+                    await self.callback(*args)
+                except Exception as e:
+                    logger.error(f"价格消费者 {self.name} 执行回调时发生错误: {e}", exc_info=True)
+                self.delivered += 1
+            else:
+                self._invoke_sync(args)
+
+    def cancel(self):
+        """丢弃积压并停止投递。"""
+        self._latest.clear()
+        self._queue.clear()
+        if self.busy:
+            self._drain_task.cancel()
+        self._drain_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "conflate": self.conflate, "pending": self.pending(),
+                "delivered": self.delivered, "conflated": self.conflated}
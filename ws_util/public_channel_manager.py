@@ -1,30 +1,64 @@
 # ws_util/public_channel_manager.py
 import asyncio # 新增导入
 import logging
-from typing import Dict, Callable, Any, Set, Optional
-from ws_util.ws_client_public import PublicConnectionManager
-from config import OKX_WS_URL
+from typing import Dict, Callable, Any, Optional, Iterable, List
+from ws_util.connection_pool import PublicConnectionPool
+from ws_util.subscription_batcher import SubscriptionBatcher
+from ws_util.subscription_reconciler import SubscriptionReconciler
+from ws_util.price_dispatcher import PriceConsumer
+from ws_util.dispatch_registry import DispatchRegistry, SubscriptionHandle
+from ws_util.frame_recorder import FrameRecorder
+from config import OKX_WS_URL, WS_POOL_SIZE, WS_REDUNDANT_FEED, WS_RECORD_DIR
 
 logger = logging.getLogger(__name__)
 
 
 class PublicChannelManager:
-    def __init__(self):
-        # 初始化WebSocket客户端并设置回调
-        self.client = PublicConnectionManager(OKX_WS_URL)
-        self.client.set_message_callback(self._on_message) # _on_message 本身是同步方法
-        self.client.set_connection_status_callback(self._on_connection_status)
+    def __init__(self, url: str = OKX_WS_URL, pool_size: int = WS_POOL_SIZE, redundant: bool = WS_REDUNDANT_FEED,
+                 record_dir: Optional[str] = WS_RECORD_DIR):
+        # 初始化WebSocket连接池并设置回调，instId 按稳定哈希路由到各分片连接 (可选每个分片双路热备)
+        # record_dir 不为空时把收到的原始帧录制到该目录，可用 simulator.replay_feed 回放
+        recorder = FrameRecorder(record_dir) if record_dir else None
+        self.pool = PublicConnectionPool(url, size=pool_size, redundant=redundant, recorder=recorder)
+        self.pool.set_message_callback(self._on_message) # 由接收队列的消费者依次调用
+        self.pool.set_connection_status_callback(self._on_connection_status)
 
         self._prices: Dict[str, str] = {}
-        self._price_update_callbacks: Dict[str, Callable[[str], Any]] = {} # 修改类型提示以接受协程或普通函数
-        self._active_subscriptions: Set[str] = set()
+        self._price_ts: Dict[str, Optional[int]] = {}  # 最新标记价格的交易所时间戳 (毫秒)
+        # 按 (channel, instId) 分发数据的注册表，同一 key 可有多个订阅者，最后一个订阅者离开时才取消交易所订阅
+        self._registry = DispatchRegistry()
+        self._legacy_handles: Dict[str, List[SubscriptionHandle]] = {}  # register_price_update_callback 注册的句柄
+        self._tick_listeners: List[PriceConsumer] = []  # 接收所有 instId 价格更新的消费者, 回调参数 (instId, 价格, ts)
+        # 每个分片一个对账器 (内含批处理器)，维护期望订阅与交易所已确认订阅，只发送净操作
+        self._reconcilers: Dict[int, SubscriptionReconciler] = {}
 
-    def _on_message(self, message: Any): # _on_message 是一个同步回调
-        logger.debug(f"频道管理器收到: {message}")
+    def _reconciler_for(self, shard_id: int) -> SubscriptionReconciler:
+        reconciler = self._reconcilers.get(shard_id)
+        if reconciler is None:
+            async def send_to_shard(payload: Any) -> bool:
+                return await self.pool.send_json_payload(shard_id, payload)
+            reconciler = SubscriptionReconciler(SubscriptionBatcher(send_to_shard))
+            reconciler.connected = self.pool.is_connected(shard_id)
+            self._reconcilers[shard_id] = reconciler
+        return reconciler
+
+    async def _on_message(self, message: Any): # 在接收队列消费者中执行，同一 instId 的消息按顺序处理
         if not isinstance(message, dict):
-            logger.debug(f"频道管理器收到原始/非字典消息: {message}")
+            logger.debug("频道管理器收到原始/非字典消息: %s", message)
+            return
+
+        # 热路径: 数据推送直接处理，避免对每一帧做事件判断和格式化日志
+        data = message.get("data")
+        if data is not None:
+            if isinstance(data, list):
+                arg = message.get("arg") or {}
+                channel = arg.get("channel")
+                if channel == "mark-price":
+                    self._handle_mark_price(data)
+                self._registry.dispatch(channel, arg.get("instId"), data)
             return
 
+        logger.debug("频道管理器收到: %s", message)
         event = message.get("event")
         arg = message.get("arg", {})
         channel = arg.get("channel")
@@ -36,92 +70,196 @@ class PublicChannelManager:
                 logger.error(f"操作错误: {message.get('msg')} (代码: {message.get('code')}) 原始消息: {message}")
             return
 
-        subscription_key = f"{channel}:{inst_id_from_arg}"
-
         if event == "subscribe":
             logger.info(f"成功订阅频道 '{channel}' instId '{inst_id_from_arg}'")
-            self._active_subscriptions.add(subscription_key)
+            self._reconciler_for(self.pool.shard_for(inst_id_from_arg)).on_ack(event, (channel, inst_id_from_arg))
         elif event == "unsubscribe":
             logger.info(f"成功取消订阅频道 '{channel}' instId '{inst_id_from_arg}'")
-            self._active_subscriptions.discard(subscription_key)
+            self._reconciler_for(self.pool.shard_for(inst_id_from_arg)).on_ack(event, (channel, inst_id_from_arg))
         elif event == "error":
             logger.error(f"订阅/操作错误: {message.get('msg')} (代码: {message.get('code')}) 参数: {arg}")
-        elif channel == "mark-price" and "data" in message and isinstance(message["data"], list):
-            for item in message["data"]:
-                price_inst_id = item.get("instId")
-                mark_px = item.get("markPx")
-                if price_inst_id and mark_px:
-                    self._prices[price_inst_id] = mark_px
-                    logger.debug(f"标记价格更新 for {price_inst_id}: {mark_px}")
-                    if price_inst_id in self._price_update_callbacks:
-                        callback_fn = self._price_update_callbacks[price_inst_id]
-                        # 检查回调是否是协程函数
-                        if asyncio.iscoroutinefunction(callback_fn):
-                            asyncio.create_task(callback_fn(mark_px)) # <--- 修改点：使用 asyncio.create_task
-                        else:
-                            callback_fn(mark_px) # 如果不是协程，则直接调用
-
-    async def _on_connection_status(self, is_connected: bool):
-        logger.info(f"频道管理器: 连接状态: {'已连接' if is_connected else '已断开'}")
+
+    def _handle_mark_price(self, items: List[Dict[str, Any]]):
+        for item in items:
+            price_inst_id = item.get("instId")
+            mark_px = item.get("markPx")
+            if price_inst_id and mark_px:
+                ts = int(item["ts"]) if item.get("ts") else None
+                self._prices[price_inst_id] = mark_px
+                self._price_ts[price_inst_id] = ts
+                logger.debug("标记价格更新 for %s: %s", price_inst_id, mark_px)
+                # 交给各消费者的分发器: 落后的 conflate 消费者只会收到最新价格, 不阻塞接收
+                for listener in self._tick_listeners:
+                    listener.offer(price_inst_id, (price_inst_id, mark_px, ts))
+
+    async def _on_connection_status(self, shard_id: int, is_connected: bool):
+        logger.info(f"频道管理器: 分片 {shard_id} 连接状态: {'已连接' if is_connected else '已断开'}")
+        reconciler = self._reconciler_for(shard_id)
         if is_connected:
-            logger.info(f"连接成功，将根据当前UI需求订阅/恢复订阅...")
-            desired_inst_ids = list(self._price_update_callbacks.keys())
-            self._active_subscriptions.clear()
+            # 新连接上没有任何订阅，对账器只发送该分片期望集合对应的订阅，其他分片不受影响
+            logger.info(f"分片 {shard_id} 连接成功，将恢复 {len(reconciler.desired)} 个订阅。")
+            reconciler.on_connected()
+            await reconciler.flush()  # 立即发送而不等待合并窗口
+        else:
+            reconciler.on_disconnected()
+
+    def _group_by_shard(self, inst_ids: Iterable[str]) -> Dict[int, List[str]]:
+        groups: Dict[int, List[str]] = {}
+        for inst_id in inst_ids:
+            groups.setdefault(self.pool.shard_for(inst_id), []).append(inst_id)
+        return groups
+
+    def subscribe_many(self, inst_ids: Iterable[str], channel: str = "mark-price"):
+        """
+        批量订阅 (不带回调，保持订阅直到 unsubscribe_many)，操作按分片路由，
+        并在合并窗口内与其他请求合并为多参数帧发送。
+        """
+        newly = [inst_id for inst_id in inst_ids if self._registry.pin((channel, inst_id))]
+        for shard_id, shard_inst_ids in self._group_by_shard(newly).items():
+            self._reconciler_for(shard_id).want((channel, inst_id) for inst_id in shard_inst_ids)
+
+    def unsubscribe_many(self, inst_ids: Iterable[str], channel: str = "mark-price"):
+        """批量取消 subscribe_many 的订阅；仍有回调订阅者的 key 保持订阅。"""
+        released = [inst_id for inst_id in inst_ids if self._registry.unpin((channel, inst_id))]
+        for shard_id, shard_inst_ids in self._group_by_shard(released).items():
+            self._reconciler_for(shard_id).unwant((channel, inst_id) for inst_id in shard_inst_ids)
+
+    def subscribe(self, channel: str, inst_id: str, callback: Callable[[Any], Any],
+                  conflate: bool = False) -> SubscriptionHandle:
+        """
+        订阅 (channel, instId) 的数据推送，同一 key 可有多个订阅者，第一个订阅者加入时才向交易所订阅。
 
-            if not desired_inst_ids:
-                logger.info("当前没有UI请求的交易对需要订阅。")
-            else:
-                logger.info(f"将为 {len(desired_inst_ids)} 个交易对发起/确认标记价格订阅: {desired_inst_ids}")
+        回调参数: mark-price 为价格字符串，其余频道为 data 中的单条原始数据。
+        参数:
+            conflate (bool): True 时回调来不及处理的中间数据会被合并，只投递最新一条 (适用于界面显示)。
+        返回:
+            SubscriptionHandle: 传给 unsubscribe 以取消订阅。
+        """
+        handle, newly_desired = self._registry.add(channel, inst_id, callback, conflate=conflate)
+        if newly_desired:
+            self._reconciler_for(self.pool.shard_for(inst_id)).want([(channel, inst_id)])
+        if channel == "mark-price":
+            current_price = self.get_price(inst_id)
+            if current_price: # 如果已有价格，立即使用当前价格回调一次
+                handle.consumer.offer(inst_id, (current_price,))
+        return handle
 
-            for inst_id in desired_inst_ids:
-                await self.subscribe_mark_price(inst_id, resubscribe_check=False)
+    def unsubscribe(self, handle: SubscriptionHandle):
+        """移除订阅者，最后一个订阅者离开时才向交易所取消订阅。"""
+        if self._registry.remove(handle):
+            self._reconciler_for(self.pool.shard_for(handle.inst_id)).unwant([handle.key])
 
-    async def _send_subscription_op(self, op_type: str, channel: str, inst_id: str) -> bool:
-        op_payload = {"op": op_type, "args": [{"channel": channel, "instId": inst_id}]}
-        success = await self.client.send_json_payload(op_payload)
-        logger.debug(
-            f"尝试 {op_type.capitalize()} channel '{channel}' on {inst_id}. 发送状态: {'成功' if success else '失败/排队'}")
-        return success
+    def subscriber_count(self, inst_id: str, channel: str = "mark-price") -> int:
+        return self._registry.subscriber_count(channel, inst_id)
+
+    def is_subscribed(self, inst_id: str, channel: str = "mark-price") -> bool:
+        """交易所是否已确认该订阅。"""
+        return self._reconciler_for(self.pool.shard_for(inst_id)).is_acked((channel, inst_id))
+
+    async def resize_pool(self, new_size: int):
+        """调整连接池分片数量，只迁移分片发生变化的 instId。"""
+        desired_by_inst: Dict[str, List[str]] = {}
+        for reconciler in self._reconcilers.values():
+            for channel, inst_id in reconciler.desired:
+                desired_by_inst.setdefault(inst_id, []).append(channel)
+        moves = await self.pool.resize(new_size, list(desired_by_inst))
+        for inst_id, (old_shard, new_shard) in moves.items():
+            keys = [(channel, inst_id) for channel in desired_by_inst[inst_id]]
+            if old_shard < self.pool.size:  # 旧分片仍存在时才需要在旧连接上取消订阅
+                self._reconciler_for(old_shard).unwant(keys)
+            self._reconciler_for(new_shard).want(keys)
+        for shard_id in [s for s in self._reconcilers if s >= self.pool.size]:
+            self._reconcilers.pop(shard_id).clear()
 
     async def subscribe_mark_price(self, inst_id: str, resubscribe_check: bool = True):
-        subscription_key = f"mark-price:{inst_id}"
-        if resubscribe_check and subscription_key in self._active_subscriptions:
-            logger.info(f"已经订阅 {subscription_key}, 无需重复发送订阅请求。")
-            return
+        # resubscribe_check 保留以兼容旧调用: 对账器本身保证已确认的订阅不会重复发送
         logger.info(f"请求订阅标记价格 for {inst_id}")
-        await self._send_subscription_op("subscribe", "mark-price", inst_id)
+        self.subscribe_many([inst_id])
 
     async def unsubscribe_mark_price(self, inst_id: str):
-        subscription_key = f"mark-price:{inst_id}"
-        if inst_id not in self._price_update_callbacks:
-            logger.info(f"InstId {inst_id} 已无UI回调, 可能无需取消订阅或已被处理。")
-        if subscription_key not in self._active_subscriptions and inst_id not in self._price_update_callbacks:
-            logger.info(f"似乎未订阅 {subscription_key} 或UI不关心, 无需发送取消订阅请求。")
+        if self._registry.subscriber_count("mark-price", inst_id):
+            logger.info(f"InstId {inst_id} 仍有回调订阅者, 交易所订阅将保持到最后一个订阅者离开。")
         logger.info(f"请求取消订阅标记价格 for {inst_id}")
-        await self._send_subscription_op("unsubscribe", "mark-price", inst_id)
-        self._active_subscriptions.discard(subscription_key)
+        self.unsubscribe_many([inst_id])
 
     def get_price(self, inst_id: str) -> Optional[str]:
         return self._prices.get(inst_id)
 
-    def register_price_update_callback(self, inst_id: str, callback: Callable[[str], Any]): # 修改类型提示
-        self._price_update_callbacks[inst_id] = callback
-        current_price = self.get_price(inst_id)
-        if current_price: # 如果已有价格，立即使用当前价格回调一次
-            if asyncio.iscoroutinefunction(callback):
-                asyncio.create_task(callback(current_price))
-            else:
-                callback(current_price)
+    def export_prices(self) -> Dict[str, list]:
+        """最新标记价格: instId -> [价格字符串, 交易所时间戳毫秒或 None] (用于运行时快照)。"""
+        price_ts = self._price_ts
+        return {inst_id: [price, price_ts.get(inst_id)] for inst_id, price in self._prices.items()}
+
+    def restore_prices(self, prices: Dict[str, list]):
+        """从快照恢复最新标记价格，已收到实时价格的 instId 不覆盖；格式不对的条目跳过。"""
+        if not isinstance(prices, dict):
+            logger.warning("运行时快照中的价格格式无效，忽略。")
+            return
+        for inst_id, entry in prices.items():
+            try:
+                price, ts = entry
+                if not isinstance(price, str) or not (ts is None or isinstance(ts, int)):
+                    raise TypeError
+                float(price)  # 价格以字符串保存，与实时推送一致
+            except (TypeError, ValueError):
+                logger.warning(f"运行时快照中 {inst_id} 的价格条目无效，跳过: {entry!r}")
+                continue
+            if inst_id not in self._prices:
+                self._prices[inst_id] = price
+                self._price_ts[inst_id] = ts
 
+    def register_price_update_callback(self, inst_id: str, callback: Callable[[str], Any],
+                                       conflate: bool = False) -> SubscriptionHandle:
+        """
+        注册 instId 的标记价格回调 (兼容旧接口，等同于 subscribe("mark-price", ...))。
+        多次注册会同时生效，不再相互覆盖。
 
-    def unregister_price_update_callback(self, inst_id: str):
-        self._price_update_callbacks.pop(inst_id, None)
+        参数:
+            conflate (bool): True 时回调来不及处理的中间价格会被合并，只投递最新价格 (适用于界面显示)。
+        """
+        handle = self.subscribe("mark-price", inst_id, callback, conflate=conflate)
+        self._legacy_handles.setdefault(inst_id, []).append(handle)
+        return handle
+
+    def unregister_price_update_callback(self, inst_id: str, handle: Optional[SubscriptionHandle] = None):
+        """取消指定句柄；未指定时取消该 instId 通过 register_price_update_callback 注册的全部回调。"""
+        handles = self._legacy_handles.get(inst_id, [])
+        targets = [handle] if handle is not None else list(handles)
+        for target in targets:
+            if target in handles:
+                handles.remove(target)
+            self.unsubscribe(target)
+        if not handles:
+            self._legacy_handles.pop(inst_id, None)
+
+    def add_tick_listener(self, callback: Callable[[str, str, Optional[int]], Any], conflate: bool = False) -> PriceConsumer:
+        """注册接收所有 instId 标记价格的消费者，回调参数为 (instId, 价格, 交易所时间戳毫秒)。"""
+        listener = PriceConsumer(callback, conflate=conflate)
+        self._tick_listeners.append(listener)
+        return listener
+
+    def remove_tick_listener(self, listener: PriceConsumer):
+        if listener in self._tick_listeners:
+            self._tick_listeners.remove(listener)
+            listener.cancel()
 
     async def start(self):
-        logger.info("PublicChannelManager: 正在启动底层WebSocket客户端...")
-        asyncio.create_task(self.client.start())
+        logger.info("PublicChannelManager: 正在启动底层WebSocket连接池...")
+        asyncio.create_task(self.pool.start())
 
     async def stop(self):
         logger.info("PublicChannelManager: 正在停止...")
-        await self.client.stop()
-        logger.info("PublicChannelManager: 已停止。")
\ No newline at end of file
+        for reconciler in self._reconcilers.values():
+            await reconciler.flush()  # 发出尚在合并窗口中的操作 (如关闭前的取消订阅)
+            reconciler.clear()
+        self._registry.clear()
+        self._legacy_handles.clear()
+        await self.pool.stop()
+        logger.info("PublicChannelManager: 已停止。")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回接收队列深度、丢弃/合并次数及各消费者的积压情况。"""
+        stats = self.pool.stats()
+        stats["consumers"] = self._registry.stats() + \
+                             [listener.stats() for listener in self._tick_listeners]
+        return stats
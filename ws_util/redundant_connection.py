@@ -0,0 +1,217 @@
+# ws_util/redundant_connection.py
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from ws_util.ws_client_public import PublicConnectionManager
+from ws_util.ingest_queue import IngestQueue
+from ws_util.subscription_batcher import SubscriptionBatcher
+from ws_util.frame_codec import decode_frame
+from ws_util.frame_recorder import FrameRecorder
+
+logger = logging.getLogger(__name__)
+
+_TS_FIELD = '"ts":"'
+
+
+def _extract_ts(raw: str) -> Optional[int]:
+    pos = raw.find(_TS_FIELD)
+    if pos < 0:
+        return None
+    pos += len(_TS_FIELD)
+    end = raw.find('"', pos)
+    try:
+        return int(raw[pos:end])
+    except ValueError:
+        return None
+
+
+class FrameDeduplicator:
+    """
+    按 (channel, instId) 和交易所 ts 对两路相同订阅的数据推送去重。
+    比已投递的 ts 更旧的帧直接丢弃；ts 相同时按帧内容区分，以免误删同一毫秒内的多笔成交。
+    """
+
+    def __init__(self):
+        self._last: Dict[Tuple[Optional[str], Optional[str]], Tuple[int, Set[int]]] = {}
+        self.passed = 0
+        self.duplicates = 0
+
+    def accept(self, raw: Any, channel: Optional[str], inst_id: Optional[str]) -> bool:
+        if not isinstance(raw, str):
+            return True
+        ts = _extract_ts(raw)
+        if ts is None:  # 无法去重的帧直接放行
+            self.passed += 1
+            return True
+        key = (channel, inst_id)
+        last = self._last.get(key)
+        if last is not None:
+            last_ts, digests = last
+            if ts < last_ts:
+                self.duplicates += 1
+                return False
+            if ts == last_ts:
+                digest = hash(raw)
+                if digest in digests:
+                    self.duplicates += 1
+                    return False
+                digests.add(digest)
+                self.passed += 1
+                return True
+        self._last[key] = (ts, {hash(raw)})
+        self.passed += 1
+        return True
+
+    def forget(self, inst_id: str):
+        for key in [k for k in self._last if k[1] == inst_id]:
+            del self._last[key]
+
+
+class RedundantConnectionManager:
+    """
+    热备冗余连接。
+    同时维持两条订阅相同频道的连接，数据推送去重后合为一路。任一连接断开时另一路继续推送，
+    断开的连接在后台重连并由本类自动补发订阅；只有两路都断开时才向上层报告断线。
+    对外提供与 PublicConnectionManager 相同的接口，可直接作为连接池的分片使用。
+    """
+
+    def __init__(self, url: str, ingest_queue: Optional[IngestQueue] = None, legs: int = 2):
+        self.url = url
+        self.message_callback: Optional[Callable[[Any], None]] = None
+        self.status_callback: Optional[Callable[[bool], None]] = None
+        self._owns_ingest = ingest_queue is None
+        self.ingest_queue = ingest_queue or IngestQueue(self._deliver_message)
+        self.deduplicator = FrameDeduplicator()
+        self.legs: List[PublicConnectionManager] = []
+        self._leg_up: List[bool] = []
+        self._leg_batchers: List[SubscriptionBatcher] = []
+        for index in range(max(2, legs)):
+            leg = PublicConnectionManager(url, ingest_queue=self.ingest_queue)
+            leg.frame_filter = self.deduplicator.accept
+            leg.set_connection_status_callback(self._make_leg_status_callback(index))
+            self.legs.append(leg)
+            self._leg_up.append(False)
+            self._leg_batchers.append(SubscriptionBatcher(leg.send_json_payload, min_frame_interval=0.0))
+        self._subscribed_args: Dict[Tuple[str, str], Dict[str, str]] = {}  # 当前应订阅的参数，用于补发给重连的连接
+
+    @property
+    def websocket(self):
+        """任一可用连接的 websocket，全部断开时为 None。"""
+        for leg, up in zip(self.legs, self._leg_up):
+            if up and leg.websocket:
+                return leg.websocket
+        return None
+
+    @property
+    def recorder(self) -> Optional[FrameRecorder]:
+        return self.legs[0].recorder
+
+    @recorder.setter
+    def recorder(self, recorder: Optional[FrameRecorder]):
+        # 各路在去重之后录制，同一帧只会被记录一次
+        for leg in self.legs:
+            leg.recorder = recorder
+
+    def set_message_callback(self, callback: Callable[[Any], None]):
+        """两路连接共用接收队列，消息由队列消费者统一交给该回调。"""
+        self.message_callback = callback
+
+    def set_connection_status_callback(self, callback: Callable[[bool], None]):
+        self.status_callback = callback
+
+    def _make_leg_status_callback(self, index: int):
+        async def on_leg_status(is_connected: bool):
+            was_any_up = any(self._leg_up)
+            if self._leg_up[index] == is_connected:
+                return
+            self._leg_up[index] = is_connected
+            is_any_up = any(self._leg_up)
+            logger.info(f"冗余连接 {index} {'已连接' if is_connected else '已断开'}，当前可用连接数: {sum(self._leg_up)}")
+            if is_connected and was_any_up:
+                # 另一路仍在推送: 只为刚重连的这一路补发订阅，上层无感知
+                await self._replay_subscriptions(index)
+            elif was_any_up != is_any_up:
+                await self._notify_status(is_any_up)
+        return on_leg_status
+
+    async def _notify_status(self, is_connected: bool):
+        if not self.status_callback:
+            return
+        try:
+            if asyncio.iscoroutinefunction(self.status_callback):
+                await self.status_callback(is_connected)
+            else:
+                self.status_callback(is_connected)
+        except Exception as e:
+            logger.error(f"执行连接状态回调时发生错误: {e}", exc_info=True)
+
+    async def _replay_subscriptions(self, index: int):
+        if not self._subscribed_args:
+            return
+        logger.info(f"为冗余连接 {index} 补发 {len(self._subscribed_args)} 个订阅。")
+        batcher = self._leg_batchers[index]
+        batcher.add("subscribe", list(self._subscribed_args.values()))
+        await batcher.flush()
+
+    def _track_payload(self, payload: Any):
+        """记录上层发出的订阅/取消订阅，以便补发给重连的连接。"""
+        if isinstance(payload, str):
+            if not payload.startswith("{"):
+                return
+            try:
+                payload = json.loads(payload)
+            except json.JSONDecodeError:
+                return
+        if not isinstance(payload, dict):
+            return
+        op = payload.get("op")
+        for arg in payload.get("args", []):
+            key = (arg.get("channel"), arg.get("instId"))
+            if op == "subscribe":
+                self._subscribed_args[key] = arg
+            elif op == "unsubscribe":
+                self._subscribed_args.pop(key, None)
+                self.deduplicator.forget(arg.get("instId"))
+
+    async def send_json_payload(self, payload: Any) -> bool:
+        """发送到所有已连接的连接；未连接的连接会在重连后补发订阅。"""
+        self._track_payload(payload)
+        live_legs = [leg for leg, up in zip(self.legs, self._leg_up) if up]
+        if not live_legs:
+            return False
+        results = await asyncio.gather(*(leg.send_json_payload(payload) for leg in live_legs))
+        return any(results)
+
+    async def _deliver_message(self, message: Any):
+        """本类自建接收队列时的消费者回调: 解析原始帧并交给消息回调。"""
+        if self.message_callback:
+            data = decode_frame(message)
+            if asyncio.iscoroutinefunction(self.message_callback):
+                await self.message_callback(data)
+            else:
+                self.message_callback(data)
+
+    async def start(self):
+        logger.info(f"RedundantConnectionManager: 正在启动 {len(self.legs)} 路冗余连接...")
+        self.ingest_queue.start()
+        await asyncio.gather(*(leg.start() for leg in self.legs), return_exceptions=True)
+
+    async def stop(self):
+        await asyncio.gather(*(leg.stop() for leg in self.legs), return_exceptions=True)
+        for batcher in self._leg_batchers:
+            batcher.clear()
+        for index in range(len(self._leg_up)):
+            self._leg_up[index] = False
+        if self._owns_ingest:
+            await self.ingest_queue.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "connected": self.websocket is not None,
+            "live_legs": sum(self._leg_up),
+            "dedup_passed": self.deduplicator.passed,
+            "dedup_duplicates": self.deduplicator.duplicates,
+            "legs": [leg.get_stats() for leg in self.legs],
+        }
@@ -0,0 +1,112 @@
+# ws_util/subscription_batcher.py
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from config import WS_SUBSCRIBE_BATCH_WINDOW, WS_SUBSCRIBE_MAX_FRAME_BYTES, WS_SUBSCRIBE_MIN_FRAME_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SubscriptionKey = Tuple[str, str]  # (channel, instId)
+
+
+class SubscriptionBatcher:
+    """
+    订阅操作批处理器。
+    在一个短时间窗口内收集 subscribe/unsubscribe 请求，合并为多参数帧发送，
+    并按最大帧字节数切分。同一 (channel, instId) 在窗口内的多次操作只保留最后一次。
+    """
+
+    def __init__(self,
+                 send_payload: Callable[[Dict[str, Any]], Awaitable[bool]],
+                 window: float = WS_SUBSCRIBE_BATCH_WINDOW,
+                 max_frame_bytes: int = WS_SUBSCRIBE_MAX_FRAME_BYTES,
+                 min_frame_interval: float = WS_SUBSCRIBE_MIN_FRAME_INTERVAL):
+        self._send_payload = send_payload  # 实际发送单个帧的协程函数
+        self._window = window
+        self._max_frame_bytes = max_frame_bytes
+        self._min_frame_interval = min_frame_interval
+        self._pending: Dict[SubscriptionKey, str] = {}  # (channel, instId) -> op，保持插入顺序
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._last_frame_at = 0.0
+
+    def add(self, op: str, args: Iterable[Dict[str, str]]):
+        """加入待发送操作，并在窗口结束后自动发送。"""
+        count = 0
+        for arg in args:
+            key = (arg["channel"], arg["instId"])
+            # 后到的操作覆盖先前的操作，并移动到队尾以保持发送顺序
+            self._pending.pop(key, None)
+            self._pending[key] = op
+            count += 1
+        if count and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+
+    def discard(self, key: SubscriptionKey) -> bool:
+        """撤回尚未发出的操作，返回是否撤回成功 (已发出的操作无法撤回)。"""
+        return self._pending.pop(key, None) is not None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def _flush_after_window(self):
+        # 发送期间可能有新的操作加入，循环直到全部发出
+        while self._pending:
+            await asyncio.sleep(self._window)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """立即发送所有待发送操作，返回发送的帧数。"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+
+            frames = self._build_frames(pending)
+            for frame in frames:
+                await self._wait_frame_slot()
+                success = await self._send_payload(frame)
+                logger.debug(f"批量 {frame['op']} {len(frame['args'])} 个参数. 发送状态: {'成功' if success else '失败'}")
+            if frames:
+                logger.info(f"已合并 {len(pending)} 个订阅操作为 {len(frames)} 帧发送。")
+            return len(frames)
+
+    async def _wait_frame_slot(self):
+        """保证相邻两帧之间至少间隔 min_frame_interval 秒。"""
+        loop = asyncio.get_running_loop()
+        wait = self._last_frame_at + self._min_frame_interval - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._last_frame_at = loop.time()
+
+    def _build_frames(self, pending: Dict[SubscriptionKey, str]) -> List[Dict[str, Any]]:
+        """把待发送操作按 op 分组，并按最大帧字节数切分为多个帧。"""
+        args_by_op: Dict[str, List[Dict[str, str]]] = {}
+        for (channel, inst_id), op in pending.items():
+            args_by_op.setdefault(op, []).append({"channel": channel, "instId": inst_id})
+
+        frames: List[Dict[str, Any]] = []
+        # 先取消订阅再订阅，避免短时间内超过单连接的订阅数量上限
+        for op in sorted(args_by_op, key=lambda o: o != "unsubscribe"):
+            base_size = len(json.dumps({"op": op, "args": []}))
+            chunk: List[Dict[str, str]] = []
+            chunk_size = base_size
+            for arg in args_by_op[op]:
+                arg_size = len(json.dumps(arg)) + 2  # 加上分隔符 ", "
+                if chunk and chunk_size + arg_size > self._max_frame_bytes:
+                    frames.append({"op": op, "args": chunk})
+                    chunk, chunk_size = [], base_size
+                chunk.append(arg)
+                chunk_size += arg_size
+            if chunk:
+                frames.append({"op": op, "args": chunk})
+        return frames
+
+    def clear(self):
+        """丢弃所有待发送操作。"""
+        self._pending.clear()
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
@@ -0,0 +1,146 @@
+# ws_util/subscription_reconciler.py
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+from ws_util.subscription_batcher import SubscriptionBatcher
+from config import WS_SUBSCRIBE_ACK_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+SubscriptionKey = Tuple[str, str]  # (channel, instId)
+
+OP_SUBSCRIBE = "subscribe"
+OP_UNSUBSCRIBE = "unsubscribe"
+
+
+class SubscriptionReconciler:
+    """
+    单个连接的订阅对账器。
+    维护期望集合 (desired) 与交易所已确认集合 (acked)，连接建立或期望变化时只发送两者差异对应的净操作；
+    未连接时只记录期望，不缓存任何待发送帧，因此断线重连不会重放过期或相互抵消的操作。
+    已发送的操作超过 ack_timeout 秒未确认时由定时检查视为丢失并重新对账 (重发)，不依赖之后的期望变化。
+    """
+
+    def __init__(self, batcher: SubscriptionBatcher, ack_timeout: float = WS_SUBSCRIBE_ACK_TIMEOUT):
+        self._batcher = batcher
+        self._ack_timeout = ack_timeout
+        self.desired: Set[SubscriptionKey] = set()
+        self.acked: Set[SubscriptionKey] = set()
+        self._inflight: Dict[SubscriptionKey, Tuple[str, float]] = {}  # 已发送未确认: key -> (op, 发送时间)
+        self.connected = False
+        self._sweep_handle: Optional[asyncio.TimerHandle] = None  # 确认超时检查的定时器
+
+    def want(self, keys: Iterable[SubscriptionKey]):
+        keys = list(keys)
+        self.desired.update(keys)
+        self._reconcile(keys)
+
+    def unwant(self, keys: Iterable[SubscriptionKey]):
+        keys = list(keys)
+        self.desired.difference_update(keys)
+        self._reconcile(keys)
+
+    def is_acked(self, key: SubscriptionKey) -> bool:
+        return key in self.acked
+
+    def _pending_op(self, key: SubscriptionKey, now: float) -> Optional[str]:
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            return None
+        op, sent_at = inflight
+        if now - sent_at > self._ack_timeout:  # 超时未确认，视为丢失，允许重发
+            del self._inflight[key]
+            return None
+        return op
+
+    def _reconcile(self, keys: Iterable[SubscriptionKey]):
+        """计算给定 key 的净操作并交给批处理器。"""
+        if not self.connected:
+            return
+        now = time.monotonic()
+        to_subscribe, to_unsubscribe = [], []
+        for key in keys:
+            target = key in self.desired
+            pending = self._pending_op(key, now)
+            if pending is not None and (pending == OP_SUBSCRIBE) != target and self._batcher.discard(key):
+                # 相反的操作还在合并窗口中未发出: 直接撤回，两者相互抵消
+                del self._inflight[key]
+                pending = None
+            effective = (pending == OP_SUBSCRIBE) if pending is not None else (key in self.acked)
+            if effective == target:
+                continue
+            op = OP_SUBSCRIBE if target else OP_UNSUBSCRIBE
+            self._inflight[key] = (op, now)
+            (to_subscribe if target else to_unsubscribe).append({"channel": key[0], "instId": key[1]})
+        if to_unsubscribe:
+            self._batcher.add(OP_UNSUBSCRIBE, to_unsubscribe)
+        if to_subscribe:
+            self._batcher.add(OP_SUBSCRIBE, to_subscribe)
+        self._schedule_sweep()
+
+    def _schedule_sweep(self):
+        """在最早的未确认操作到期时检查一次 (需在事件循环中；已有定时器或没有未确认操作时不重复安排)。"""
+        if self._sweep_handle is not None or not self._inflight:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        oldest = min(sent_at for _, sent_at in self._inflight.values())
+        delay = max(0.0, oldest + self._ack_timeout - time.monotonic()) + 0.01
+        self._sweep_handle = loop.call_later(delay, self._sweep_expired)
+
+    def _cancel_sweep(self):
+        if self._sweep_handle is not None:
+            self._sweep_handle.cancel()
+            self._sweep_handle = None
+
+    def _sweep_expired(self):
+        """确认超时的操作视为丢失，重新对账这些 key。"""
+        self._sweep_handle = None
+        now = time.monotonic()
+        expired = [key for key, (_, sent_at) in self._inflight.items() if now - sent_at > self._ack_timeout]
+        if expired:
+            logger.warning(f"对账: {len(expired)} 个订阅操作在 {self._ack_timeout} 秒内未确认，重新发送。")
+            self._reconcile(expired)
+        self._schedule_sweep()
+
+    def reconcile_all(self):
+        self._reconcile(self.desired | self.acked | set(self._inflight))
+
+    def on_connected(self):
+        """新连接上没有任何订阅: 丢弃旧状态，只发送期望集合。"""
+        self.connected = True
+        self.acked.clear()
+        self._inflight.clear()
+        self._batcher.clear()
+        if self.desired:
+            logger.info(f"对账: 新连接需订阅 {len(self.desired)} 个频道。")
+        self.reconcile_all()
+
+    def on_disconnected(self):
+        self.connected = False
+        self._cancel_sweep()
+        self.acked.clear()
+        self._inflight.clear()
+        self._batcher.clear()  # 不把操作留到下一条连接上
+
+    def on_ack(self, op: str, key: SubscriptionKey):
+        if op == OP_SUBSCRIBE:
+            self.acked.add(key)
+        elif op == OP_UNSUBSCRIBE:
+            self.acked.discard(key)
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] == op:
+            del self._inflight[key]
+        # 确认到达时期望可能已经改变 (如订阅途中又被取消)，需要再对账一次
+        if (key in self.desired) != (key in self.acked) and key not in self._inflight:
+            self._reconcile([key])
+
+    async def flush(self):
+        await self._batcher.flush()
+
+    def clear(self):
+        self.desired.clear()
+        self.on_disconnected()
@@ -1,25 +1,60 @@
 import asyncio
 import json
 import logging
+import time
+from collections import deque
 import websockets
 from websockets.exceptions import ConnectionClosed, ConnectionClosedOK, ConnectionClosedError
-from typing import Callable, Any, List, Optional
+from typing import Callable, Any, Optional, Deque, Dict
 from ws_util.WebSocketFactory import WebSocketFactory
-from config import OKX_WS_URL
+from ws_util.ingest_queue import IngestQueue
+from ws_util.frame_codec import classify_frame, decode_frame, FRAME_PING, FRAME_PONG, FRAME_DATA
+from ws_util.backoff import ExponentialBackoff
+from ws_util.frame_recorder import FrameRecorder
+from config import OKX_WS_URL, WS_RECONNECT_MAX_DELAY, WS_RECONNECT_STABLE_SECONDS, WS_HEARTBEAT_INTERVAL, \
+    WS_PONG_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
 
 class PublicConnectionManager:
-    def __init__(self, url: str, reconnect_delay: int = 5):
+    def __init__(self, url: str, reconnect_delay: float = WS_RECONNECT_MAX_DELAY, ingest_queue: Optional[IngestQueue] = None):
         self.url = url  # WebSocket URL
         self.factory = WebSocketFactory(url)
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None  # 当前的WebSocket连接实例
         self.message_callback: Optional[Callable[[Any], None]] = None  # 收到消息时的回调函数
         self.status_callback: Optional[Callable[[bool], None]] = None  # 连接状态变化时的回调 (True:已连接, False:已断开)
         self._running = False  # 控制客户端运行状态的标志
-        self._reconnect_delay = reconnect_delay  # 重连延迟（秒）
-        self._pending_sends: List[str] = []  # 存储因未连接而挂起的待发送JSON字符串
+        self._backoff = ExponentialBackoff(maximum=reconnect_delay)  # 重连退避，reconnect_delay 为最大延迟（秒）
+        # 建连耗时与断线到重新连上的间隔统计
+        self._connected_at: Optional[float] = None
+        self._disconnected_at: Optional[float] = None
+        self._connect_attempts = 0
+        self._connect_failures = 0
+        self._recent_attempts: Deque[Dict[str, Any]] = deque(maxlen=50)
+        # 客户端心跳: 空闲超过 interval 秒发送 "ping"，pong_timeout 秒内未收到 "pong" 视为连接已失效
+        self._heartbeat_interval = WS_HEARTBEAT_INTERVAL
+        self._pong_timeout = WS_PONG_TIMEOUT
+        self._last_recv_at = time.monotonic()
+        self._ping_sent_at: Optional[float] = None
+        self._ping_stalled = False  # 等待 pong 期间读取曾因接收队列反压而暂停，该次 RTT 不可信
+        # 读取协程正阻塞在接收队列的 put 上 (反压): 此时 pong 可能排在未读取的帧之后，不能据此判定连接失效
+        self._enqueue_blocked = False
+        self._pings_sent = 0
+        self._pongs_received = 0
+        self._missed_pongs = 0
+        self._rtt_last: Optional[float] = None
+        self._rtt_min: Optional[float] = None
+        self._rtt_max: Optional[float] = None
+        self._rtt_avg: Optional[float] = None  # 指数加权平均
+        self._max_idle = 0.0
+        # 有界接收队列，由固定数量的消费者按 instId 有序处理消息；连接池中多个连接可共用一个队列
+        self._owns_ingest = ingest_queue is None
+        self.ingest_queue = ingest_queue or IngestQueue(self._deliver_message)
+        # 数据推送入队前的过滤器 (原始帧, channel, instId) -> 是否保留，冗余连接用它去重
+        self.frame_filter: Optional[Callable[[Any, Optional[str], Optional[str]], bool]] = None
+        # 可选的原始帧录制器，记录收到的每一帧 (数据帧为去重之后，包括 ping/pong 心跳帧)，用于事故复现与回放压测
+        self.recorder: Optional[FrameRecorder] = None
 
     def set_message_callback(self, callback: Callable[[Any], None]):  #
         """设置当收到WebSocket消息时的回调函数。"""
@@ -32,24 +67,19 @@ class PublicConnectionManager:
     async def _connect(self) -> bool:
         """尝试建立WebSocket连接。"""
         logger.debug(f"尝试连接到 {self.url}...")
+        self._connect_attempts += 1
         try:
             self.websocket = await self.factory.connect()  #
+            self._record_attempt(self.websocket is not None)
             if self.websocket:
                 logger.info(f"已连接到 {self.url}")
+                # 订阅由上层的对账器在收到连接状态回调后按期望集合重新发送，这里不缓存/重放任何帧
                 if self.status_callback:
                     asyncio.create_task(self._safe_callback(self.status_callback, True))
-                # 连接成功后，发送之前挂起的操作
-                if self._pending_sends:
-                    logger.info(f"重新发送 {len(self._pending_sends)} 个挂起的操作。")
-                    for payload_str in list(self._pending_sends):  # 遍历副本发送
-                        if await self.send_json_payload(payload_str, from_pending=True):  #
-                            if payload_str in self._pending_sends:  # 再次检查以防并发修改
-                                self._pending_sends.remove(payload_str)
-                    if self._pending_sends:
-                        logger.warning(f"{len(self._pending_sends)} 个操作在重连后仍发送失败。")
                 return True
         except Exception as e:
             logger.error(f"连接到 {self.url} 失败: {e}")
+            self._record_attempt(False)
 
         # 连接失败或发生异常
         self.websocket = None
@@ -63,17 +93,36 @@ class PublicConnectionManager:
             return
         try:
             async for message in self.websocket:
-                if isinstance(message, str) and message == "ping":  # OKX ping 是字符串 "ping"
+                now = time.monotonic()
+                idle = now - self._last_recv_at
+                if idle > self._max_idle:
+                    self._max_idle = idle
+                self._last_recv_at = now
+
+                # 只看帧开头做预分类，完整的 JSON 解析推迟到接收队列的消费者中进行
+                frame_type, channel, inst_id = classify_frame(message)
+                if self.recorder is not None and frame_type in (FRAME_PING, FRAME_PONG):
+                    self.recorder.record(message)  # 心跳帧也录制，回放时可还原心跳时序
+                if frame_type == FRAME_PING:  # OKX ping 是字符串 "ping"
                     logger.debug("收到 ping, 发送 pong")
                     await self.send_json_payload("pong")  # OKX 要求回复 "pong" 字符串
                     continue
+                if frame_type == FRAME_PONG:
+                    self._on_pong(now)
+                    continue
 
-                if self.message_callback:
-                    try:
-                        data = json.loads(message)  # 尝试解析JSON
-                    except json.JSONDecodeError:
-                        data = message  # 非JSON则原始传递
-                    asyncio.create_task(self._safe_callback(self.message_callback, data))
+                conflate_key = None
+                if frame_type == FRAME_DATA:
+                    if self.frame_filter is not None and not self.frame_filter(message, channel, inst_id):
+                        continue
+                    conflate_key = (channel, inst_id)
+                if self.recorder is not None:
+                    self.recorder.record(message)
+                self._enqueue_blocked = True
+                try:
+                    await self.ingest_queue.put(inst_id, message, conflate_key)  # 队列满时按溢出策略处理 (默认阻塞读取)
+                finally:
+                    self._enqueue_blocked = False
         except (ConnectionClosed, ConnectionClosedOK, ConnectionClosedError) as e:
             logger.warning(f"WebSocket 连接关闭: {e}")  #
         except Exception as e:
@@ -94,6 +143,7 @@ class PublicConnectionManager:
             return
         self._running = True
         logger.info("PublicConnectionManager: 正在启动...")  #
+        self.ingest_queue.start()
 
         while self._running:
             # 检查 self.websocket 是否存在，以及其 .closed 状态 (websockets库用 .closed 表示连接已关闭的 future)
@@ -102,12 +152,19 @@ class PublicConnectionManager:
             if not self.websocket:
                 if not await self._connect():
                     if self._running:
-                        logger.info(f"PublicConnectionManager: {self._reconnect_delay}秒后尝试重连。")  #
-                        await asyncio.sleep(self._reconnect_delay)
+                        delay = self._backoff.next_delay()
+                        logger.info(f"PublicConnectionManager: {delay:.2f}秒后尝试重连。")  #
+                        await asyncio.sleep(delay)
                     continue
 
             if self.websocket:  # 如果连接成功
+                heartbeat_task = asyncio.create_task(self._heartbeat_loop())
                 await self._message_handler_loop()  # 此循环会阻塞直到连接断开
+                heartbeat_task.cancel()
+                self._disconnected_at = time.monotonic()
+                # 连接保持足够久才重置退避，避免连上即断时频繁重连
+                if self._connected_at and self._disconnected_at - self._connected_at >= WS_RECONNECT_STABLE_SECONDS:
+                    self._backoff.reset()
 
             # _message_handler_loop 结束后表示连接已断开
             if self._running:  # 如果仍在运行状态，则准备重连
@@ -116,12 +173,15 @@ class PublicConnectionManager:
                 if self.websocket is not None:  # 可能在_message_handler_loop的finally中已处理
                     await self.factory.close()
                     self.websocket = None
-                await asyncio.sleep(self._reconnect_delay / 2)  # 短暂等待
+                delay = self._backoff.next_delay()  # 首次重试立即进行
+                if delay > 0:
+                    logger.info(f"PublicConnectionManager: {delay:.2f}秒后尝试重连。")
+                    await asyncio.sleep(delay)
 
         logger.info("PublicConnectionManager: 已停止。")  #
 
-    async def send_json_payload(self, payload_dict_or_str: Any, from_pending: bool = False) -> bool:  #
-        """发送JSON序列化的数据。payload可以是字典或已经是JSON字符串。"""
+    async def send_json_payload(self, payload_dict_or_str: Any) -> bool:  #
+        """发送JSON序列化的数据。payload可以是字典或已经是JSON字符串。未连接或发送失败时返回 False，不做暂存。"""
         json_str: str
         if isinstance(payload_dict_or_str, str):
             json_str = payload_dict_or_str
@@ -144,12 +204,8 @@ class PublicConnectionManager:
                     asyncio.create_task(self._safe_callback(self.status_callback, False))
             except Exception as e:  # 其他发送错误
                 logger.error(f"发送消息失败: {e} - 消息: {json_str[:100]}...")
-
-        # 如果未连接或发送失败，且不是来自暂存队列的重试，则暂存
-        if not from_pending:
-            if json_str not in self._pending_sends:  # 避免重复添加
-                self._pending_sends.append(json_str)
-            logger.warning(f"WebSocket未连接或发送失败，操作已暂存: {json_str[:100]}...")  #
+        else:
+            logger.debug(f"WebSocket未连接，未发送: {json_str[:100]}...")
         return False
 
     async def stop(self):  #
@@ -159,9 +215,125 @@ class PublicConnectionManager:
         if self.websocket:
             await self.factory.close()  # 使用factory关闭
         self.websocket = None
-        self._pending_sends.clear()  # 清空待发送队列
+        if self._owns_ingest:
+            await self.ingest_queue.stop()
         logger.info("PublicConnectionManager: WebSocket已清理。")
 
+    async def _heartbeat_loop(self):
+        """空闲时发送 ping 并测量 RTT；pong 超时则强制断开，由 start 中的循环重连。"""
+        self._last_recv_at = time.monotonic()
+        self._ping_sent_at = None
+        try:
+            while self.websocket is not None:
+                now = time.monotonic()
+                if self._enqueue_blocked:
+                    # 反压导致的读取暂停不是连接失效: 暂停 pong 计时与空闲计时，读取恢复后重新开始
+                    if self._ping_sent_at is not None:
+                        self._ping_sent_at = now
+                        self._ping_stalled = True
+                    self._last_recv_at = now
+                    await asyncio.sleep(min(1.0, self._pong_timeout))
+                    continue
+                if self._ping_sent_at is not None:
+                    remaining = self._ping_sent_at + self._pong_timeout - now
+                    if remaining <= 0:
+                        self._missed_pongs += 1
+                        logger.warning(f"{self._pong_timeout}秒内未收到 pong，判定连接失效，强制重连: {self.url}")
+                        self._abort_connection()
+                        return
+                    await asyncio.sleep(remaining)
+                    continue
+                idle = now - self._last_recv_at
+                if idle >= self._heartbeat_interval:
+                    self._ping_sent_at = now
+                    self._ping_stalled = False
+                    self._pings_sent += 1
+                    if not await self.send_json_payload("ping"):
+                        return
+                    continue
+                await asyncio.sleep(self._heartbeat_interval - idle)
+        except asyncio.CancelledError:
+            pass
+
+    def _on_pong(self, now: float):
+        if self._ping_sent_at is None:
+            return
+        rtt = now - self._ping_sent_at
+        self._ping_sent_at = None
+        self._pongs_received += 1
+        if self._ping_stalled:  # RTT 中包含了反压暂停的时间，不计入统计
+            self._ping_stalled = False
+            return
+        self._rtt_last = rtt
+        self._rtt_min = rtt if self._rtt_min is None else min(self._rtt_min, rtt)
+        self._rtt_max = rtt if self._rtt_max is None else max(self._rtt_max, rtt)
+        self._rtt_avg = rtt if self._rtt_avg is None else self._rtt_avg * 0.8 + rtt * 0.2
+        logger.debug(f"收到 pong, RTT {rtt * 1000:.1f} ms")
+
+    def _abort_connection(self):
+        """直接中断底层传输。半开连接上的正常关闭握手可能长时间阻塞。"""
+        transport = getattr(self.websocket, "transport", None)
+        if transport is not None:
+            transport.abort()
+        elif self.websocket is not None:
+            asyncio.create_task(self.factory.close())
+
+    def get_heartbeat_stats(self) -> Dict[str, Any]:
+        """返回心跳 RTT 及空闲时间统计 (毫秒/秒)。"""
+        def to_ms(value: Optional[float]) -> Optional[float]:
+            return value * 1000 if value is not None else None
+
+        return {
+            "rtt_last_ms": to_ms(self._rtt_last),
+            "rtt_avg_ms": to_ms(self._rtt_avg),
+            "rtt_min_ms": to_ms(self._rtt_min),
+            "rtt_max_ms": to_ms(self._rtt_max),
+            "pings_sent": self._pings_sent,
+            "pongs_received": self._pongs_received,
+            "missed_pongs": self._missed_pongs,
+            "idle_seconds": time.monotonic() - self._last_recv_at,
+            "max_idle_seconds": self._max_idle,
+        }
+
+    def _record_attempt(self, success: bool):
+        """记录一次建连尝试的耗时，以及断线后重新连上所用的间隔。"""
+        now = time.monotonic()
+        attempt: Dict[str, Any] = {
+            "at": time.time(),
+            "success": success,
+            "connect_ms": (self.factory.last_connect_duration or 0.0) * 1000,
+        }
+        if success:
+            self._connected_at = now
+            if self._disconnected_at is not None:
+                attempt["reconnect_gap_ms"] = (now - self._disconnected_at) * 1000
+                logger.info(f"断线 {attempt['reconnect_gap_ms']:.0f} ms 后重新连上 {self.url}")
+                self._disconnected_at = None
+        else:
+            self._connect_failures += 1
+        self._recent_attempts.append(attempt)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回建连次数、耗时及断线重连间隔统计。"""
+        connect_times = [a["connect_ms"] for a in self._recent_attempts if a["success"]]
+        gaps = [a["reconnect_gap_ms"] for a in self._recent_attempts if "reconnect_gap_ms" in a]
+        return {
+            "url": self.url,
+            "connected": self.websocket is not None,
+            "connect_attempts": self._connect_attempts,
+            "connect_failures": self._connect_failures,
+            "avg_connect_ms": sum(connect_times) / len(connect_times) if connect_times else None,
+            "last_reconnect_gap_ms": gaps[-1] if gaps else None,
+            "max_reconnect_gap_ms": max(gaps) if gaps else None,
+            "recent_attempts": list(self._recent_attempts),
+            "heartbeat": self.get_heartbeat_stats(),
+        }
+
+    async def _deliver_message(self, message: Any):
+        """接收队列消费者调用: 解析原始帧并交给消息回调。"""
+        if self.message_callback:
+            await self._safe_callback(self.message_callback, decode_frame(message))
+
     async def _safe_callback(self, callback: Callable, *args):
         """安全地执行回调函数，捕获任何异常。"""
         try: